@@ -1,21 +1,15 @@
 import aiohttp
-from ultralytics import YOLO
 from deep_translator import GoogleTranslator
 import tempfile
 import os
 import nltk
 from nltk.corpus import wordnet
 
-device = 'cpu'
+from registry import get_yolo
 
 # Initialisation du traducteur
 translator = GoogleTranslator(source='en', target='fr')
 
-# Chargement du modèle YOLO avec le dispositif spécifié
-model = YOLO('yolov11x.pt')
-model.to(device) 
-print(f"[INFO] Modèle YOLO chargé sur : {device}")
-
 # Fonction pour télécharger une image depuis une URL
 async def download_image_from_url(image_url: str) -> str:
     async with aiohttp.ClientSession() as session:
@@ -32,7 +26,8 @@ async def download_image_from_url(image_url: str) -> str:
 
 # Détecter les objets avec YOLO
 def detect_objects_yolo(image_path: str) -> set:
-    # Effectuer la détection avec YOLO sur le dispositif spécifié
+    # Modèle configuré par detection_backend (YOLO_VARIANT, YOLO_RUNTIME...), chargé au premier usage
+    model, device = get_yolo()
     results = model(image_path, device=device)
     detected_objects = set()
     for result in results:
@@ -0,0 +1,109 @@
+"""
+Compare des combinaisons taille / runtime / précision de YOLO à la référence yolov8x PyTorch FP32,
+sur un jeu d'images fixe : latence (image par image), débit (par lots) et concordance des détections.
+
+La concordance est mesurée par image contre la référence : F1 des boîtes appariées
+(même classe, IoU >= --iou) et proportion d'images dont le décompte par classe est identique.
+
+Usage (depuis pdf_api/) :
+    python -m benchmarks.bench_backends x:onnx:fp32 x:openvino:int8 s:torch n:openvino:fp16
+"""
+import argparse
+import statistics
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks.bench_inference import load_images
+from detection_backend import DetectionBackend, parse_spec
+from objects import load_image_array
+
+BASELINE = "yolov8x.pt:torch:fp32"
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_f1(reference, candidate, iou_threshold: float) -> float:
+    """F1 d'un appariement glouton des boîtes de même classe."""
+    ref_boxes, ref_cls = reference
+    cand_boxes, cand_cls = candidate
+    if not len(ref_cls) and not len(cand_cls):
+        return 1.0
+    matched = 0
+    for cls in set(ref_cls.tolist()) & set(cand_cls.tolist()):
+        ious = iou_matrix(ref_boxes[ref_cls == cls], cand_boxes[cand_cls == cls])
+        while ious.size and ious.max() >= iou_threshold:
+            i, j = np.unravel_index(ious.argmax(), ious.shape)
+            matched += 1
+            ious[i, :] = -1
+            ious[:, j] = -1
+    return 2 * matched / (len(ref_cls) + len(cand_cls))
+
+
+def run_backend(backend: DetectionBackend, arrays: list, batch_size: int, repeat: int) -> dict:
+    model, device = backend.load()
+    predict = lambda images: model(images, device=device, imgsz=backend.imgsz, verbose=False)
+    predict(arrays[:1])  # préchauffage
+
+    latencies = []
+    detections = []
+    for _ in range(repeat):
+        for array in arrays:
+            started = time.perf_counter()
+            result = predict([array])[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+            if len(detections) < len(arrays):
+                detections.append((result.boxes.xyxy.cpu().numpy(), result.boxes.cls.cpu().numpy().astype(int)))
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(arrays), batch_size):
+            predict(arrays[i:i + batch_size])
+    throughput = repeat * len(arrays) / (time.perf_counter() - started)
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "throughput": throughput,
+        "detections": detections,
+    }
+
+
+def agreement(reference: list, candidate: list, iou_threshold: float) -> dict:
+    f1 = [match_f1(r, c, iou_threshold) for r, c in zip(reference, candidate)]
+    same_counts = [Counter(r[1].tolist()) == Counter(c[1].tolist()) for r, c in zip(reference, candidate)]
+    return {"box_f1": statistics.mean(f1), "same_counts": sum(same_counts) / len(same_counts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("specs", nargs="+", help="taille[:runtime[:précision]], ex. x:onnx:int8 ou yolo11s:openvino")
+    parser.add_argument("--images", help="Dossier d'images (par défaut : images d'exemple d'ultralytics)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    arrays = [load_image_array(path) for path in load_images(args.images)]
+    reference = run_backend(parse_spec(BASELINE), arrays, args.batch_size, args.repeat)
+
+    print(f"Images : {len(arrays)} | lots de {args.batch_size} | {args.repeat} passes")
+    print(f"{'modèle':32s} {'p50 ms':>8s} {'p95 ms':>8s} {'img/s':>7s} {'F1 boîtes':>10s} {'décomptes':>10s}")
+    rows = [(BASELINE, reference)] + [(spec, run_backend(parse_spec(spec), arrays, args.batch_size, args.repeat)) for spec in args.specs]
+    for spec, result in rows:
+        agree = agreement(reference["detections"], result["detections"], args.iou)
+        print(f"{spec:32s} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {result['throughput']:7.2f} "
+              f"{agree['box_f1']:10.3f} {agree['same_counts']:10.1%}")
+
+
+if __name__ == "__main__":
+    main()
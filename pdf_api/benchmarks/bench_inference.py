@@ -0,0 +1,79 @@
+"""
+Compare le débit YOLO image par image (chemin actuel) et via le moteur de micro-lots.
+
+Usage (depuis pdf_api/) :
+    python -m benchmarks.bench_inference --requests 64 --concurrency 16
+"""
+import argparse
+import asyncio
+import glob
+import os
+import time
+
+from objects import detect_objects_yolo, load_image_array
+from inference import InferenceEngine
+
+
+def load_images(image_dir: str = None) -> list:
+    if image_dir:
+        paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.png")))
+    else:
+        from ultralytics.utils import ASSETS
+        paths = sorted(str(p) for p in ASSETS.glob("*.jpg"))
+    if not paths:
+        raise SystemExit("Aucune image trouvée pour le benchmark")
+    return paths
+
+
+def bench_sequential(paths: list, n_requests: int) -> float:
+    """Chemin historique : une passe YOLO par image, lue depuis le disque."""
+    started = time.perf_counter()
+    for i in range(n_requests):
+        detect_objects_yolo(paths[i % len(paths)])
+    return time.perf_counter() - started
+
+
+async def bench_batched(arrays: list, n_requests: int, concurrency: int, max_batch_size: int, max_wait_ms: float):
+    engine = InferenceEngine(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    await engine.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await engine.detect(arrays[i % len(arrays)])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - started
+    stats = engine.get_stats(last=0)
+    await engine.stop()
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Dossier d'images (par défaut : images d'exemple d'ultralytics)")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=15)
+    args = parser.parse_args()
+
+    paths = load_images(args.images)
+    arrays = [load_image_array(p) for p in paths]
+
+    # Préchauffage : la première passe inclut l'initialisation du prédicteur
+    detect_objects_yolo(paths[0])
+
+    sequential = bench_sequential(paths, args.requests)
+    batched, stats = asyncio.run(bench_batched(arrays, args.requests, args.concurrency, args.max_batch_size, args.max_wait_ms))
+
+    print(f"Requêtes : {args.requests} | concurrence : {args.concurrency} | images distinctes : {len(paths)}")
+    print(f"Image par image : {sequential:.2f} s ({args.requests / sequential:.2f} img/s)")
+    print(f"Micro-lots      : {batched:.2f} s ({args.requests / batched:.2f} img/s)")
+    print(f"Lots : {stats['batches']} | taille moyenne : {stats['avg_batch_size']} | inférence moyenne par lot : {stats['avg_inference_ms']} ms")
+    print(f"Accélération : x{sequential / batched:.2f}")
+
+
+if __name__ == "__main__":
+    main()
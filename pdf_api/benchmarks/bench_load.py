@@ -0,0 +1,278 @@
+"""
+Test de charge reproductible de l'API, sans Ollama, Google Translate ni hébergeur réels.
+
+Le script construit (ou réutilise) le corpus fixe (benchmarks.corpus), démarre le faux
+Ollama et l'hébergeur d'images (benchmarks.fakes), lance l'API avec
+TRANSLATION_BACKEND=local et un DATA_DIR temporaire, puis joue chaque scénario à chaque
+niveau de concurrence : latence p50/p95/p99, débit, erreurs et refus 429.
+
+Chaque scénario existe en deux variantes :
+- cold (défaut) : chaque requête porte des octets ou un texte uniques, ce qui écarte les
+  caches de détections et de résultats LLM (l'image servie reçoit quelques octets après
+  la fin du JPEG, les pixels sont identiques) ; le magasin de documents est désactivé,
+  sans quoi les pages inchangées des PDF seraient reprises ;
+- warm : les mêmes entrées sont rejouées, les caches répondent.
+
+Usage (depuis pdf_api/) :
+    python -m benchmarks.bench_load --scenarios analyze describe resumer translate --concurrency 1 4 16
+    python -m benchmarks.bench_load --workers 5 --inference-mode server --json resultats.json
+    # API déjà démarrée et configurée vers les faux services (OLLAMA_HOST/PORT, TRANSLATION_BACKEND=local)
+    python -m benchmarks.bench_load --target http://localhost:8000 --fakes-host 127.0.0.1
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from benchmarks import corpus as corpus_module
+from benchmarks.fakes import FakeOllama, add_arguments as add_fake_arguments, image_host_app, start_site
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Context:
+    def __init__(self, manifest: Dict, files_url: str, cache: str, text_size: str, run_id: str):
+        self.manifest = manifest
+        self.files_url = files_url
+        self.cold = cache == "cold"
+        self.text_size = text_size
+        self.run_id = run_id
+
+    def file_url(self, name: str, i: int) -> str:
+        url = f"{self.files_url}/{name}"
+        return f"{url}?v={self.run_id}-{i}" if self.cold else url
+
+    def image(self, i: int) -> str:
+        images = self.manifest["images"]
+        return self.file_url(images[i % len(images)], i)
+
+    def text(self, lang: str, i: int) -> str:
+        text = self.manifest["text"][lang][self.text_size]
+        if not self.cold:
+            return text
+        # Un marqueur par paragraphe : chaque segment de traduction et chaque morceau de résumé change
+        tag = f"({self.run_id}-{i})"
+        return "\n".join(f"{line} {tag}" for line in text.split("\n"))
+
+
+# Scénario : (méthode, chemin, construction du corps, réponse streamée en NDJSON)
+Scenario = Tuple[str, str, Callable[[Context, int], Dict], bool]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "analyze": ("POST", "/analyze", lambda ctx, i: {"image_url": ctx.image(i), "text": ctx.text("fr", i)}, False),
+    "analyze_batch": ("POST", "/analyze/batch", lambda ctx, i: {
+        "image_urls": [ctx.image(i * 8 + k) for k in range(8)], "text": ctx.text("fr", i)
+    }, False),
+    "describe": ("POST", "/describe", lambda ctx, i: {"image_url": ctx.image(i), "objects": ["bus", "personne", "cravate"]}, False),
+    "resumer": ("POST", "/resumer", lambda ctx, i: {"text": ctx.text("fr", i)}, False),
+    "translate": ("POST", "/translate", lambda ctx, i: {"text": ctx.text("en", i)}, False),
+    "pdf": ("POST", "/pdf/process", lambda ctx, i: {
+        "pdf_url": ctx.file_url(ctx.manifest["pdfs"][i % len(ctx.manifest["pdfs"])], i), "detect_objects": True
+    }, True),
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Centile par rang le plus proche (valeurs déjà triées)."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_level(session: aiohttp.ClientSession, target: str, scenario: Scenario, ctx: Context,
+                    concurrency: int, n_requests: int, offset: int, timeout: float) -> Dict:
+    method, path, build, streamed = scenario
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = 0
+
+    async def one(i: int):
+        started = time.perf_counter()
+        try:
+            async with session.request(method, target + path, json=build(ctx, offset + i),
+                                       timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if streamed:
+                    async for _ in response.content:
+                        pass
+                else:
+                    await response.read()
+                status = str(response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = type(e).__name__
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == "200":
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async def worker():
+        nonlocal next_index
+        while next_index < n_requests:
+            i = next_index
+            next_index += 1
+            await one(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "ok": len(latencies),
+        "rejected_429": statuses.get("429", 0),
+        "errors": n_requests - len(latencies) - statuses.get("429", 0),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        **{f"p{q}_ms": round(percentile(latencies, q), 1) if latencies else None for q in (50, 95, 99)},
+    }
+
+
+async def wait_ready(url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    deadline = time.time() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.time() < deadline:
+            if process is not None and process.poll() is not None:
+                raise SystemExit(f"L'API s'est arrêtée au démarrage (code {process.returncode})")
+            try:
+                async with session.get(url + "/ready", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                    if response.status == 200:
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"{url}/ready n'a pas répondu 200 en {timeout:.0f} s")
+
+
+def start_api(args, data_dir: str) -> List[subprocess.Popen]:
+    env = dict(
+        os.environ,
+        OLLAMA_HOST=args.fakes_host,
+        OLLAMA_PORT=str(args.ollama_port),
+        TRANSLATION_BACKEND="local",
+        TRANSLATION_LOCAL_LATENCY_MS=str(args.translate_latency_ms),
+        DATA_DIR=data_dir,
+        INFERENCE_MODE=args.inference_mode,
+        INFERENCE_SOCKET=os.path.join(data_dir, "inference.sock"),
+        PYTHONUNBUFFERED="1",
+    )
+    if args.cache == "cold":
+        env["DOCUMENT_STORE_DB"] = ""
+    processes = []
+    if args.inference_mode == "server":
+        processes.append(subprocess.Popen([sys.executable, "inference_server.py"], cwd=HERE, env=env))
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=HERE, env=env
+    ))
+    return processes
+
+
+HEADER = (f"{'scénario':14s} {'conc.':>5s} {'ok':>6s} {'429':>5s} {'err':>5s} {'req/s':>8s} "
+          f"{'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+
+
+def format_row(result: Dict) -> str:
+    cells = [f"{result[k]:9.1f}" if result[k] is not None else f"{'-':>9s}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+    return (f"{result['scenario']:14s} {result['concurrency']:5d} {result['ok']:6d} {result['rejected_429']:5d} "
+            f"{result['errors']:5d} {result['throughput_rps']:8.2f} {' '.join(cells)}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> List[Dict]:
+    manifest = corpus_module.load(args.corpus)
+    fakes = []
+    if not args.no_fakes:
+        ollama = FakeOllama(args.load_ms, args.tokens_per_second, args.tokens)
+        fakes.append(await start_site(ollama.app(), args.fakes_host, args.ollama_port))
+        fakes.append(await start_site(image_host_app(args.corpus, args.host_latency_ms), args.fakes_host, args.host_port))
+
+    processes = []
+    data_dir = tempfile.mkdtemp(prefix="docvision-bench-")
+    target = args.target
+    try:
+        if target is None:
+            processes = start_api(args, data_dir)
+            target = f"http://127.0.0.1:{args.port}"
+        await wait_ready(target, args.startup_timeout, processes[-1] if processes else None)
+
+        ctx = Context(manifest, f"http://{args.fakes_host}:{args.host_port}/files", args.cache, args.text_size,
+                      run_id=str(int(time.time())))
+        results = []
+        print(HEADER)
+        connector = aiohttp.TCPConnector(limit=max(args.concurrency))
+        async with aiohttp.ClientSession(connector=connector) as session:
+            offset = 0
+            for name in args.scenarios:
+                for concurrency in args.concurrency:
+                    n_requests = max(args.requests, concurrency * 2)
+                    if args.warmup:
+                        await run_level(session, target, SCENARIOS[name], ctx, concurrency, concurrency, offset, args.timeout)
+                        offset += concurrency
+                    result = await run_level(session, target, SCENARIOS[name], ctx, concurrency, n_requests, offset, args.timeout)
+                    offset += n_requests
+                    result["scenario"] = name
+                    results.append(result)
+                    print(format_row(result), flush=True)
+        return results
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for runner in fakes:
+            await runner.cleanup()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["analyze", "describe", "resumer", "translate"], choices=sorted(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=50, help="requêtes mesurées par niveau (au moins 2 x concurrence)")
+    parser.add_argument("--cache", choices=["cold", "warm"], default="cold")
+    parser.add_argument("--text-size", choices=sorted(corpus_module.TEXT_SIZES), default="medium")
+    parser.add_argument("--warmup", action="store_true", help="une vague non mesurée avant chaque niveau")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "docvision-corpus"))
+    parser.add_argument("--target", help="URL d'une API déjà démarrée (sinon lancée par le script)")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--inference-mode", choices=["local", "server"], default="local")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--fakes-host", default="127.0.0.1")
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--host-port", type=int, default=8765)
+    parser.add_argument("--no-fakes", action="store_true", help="faux services déjà lancés (python -m benchmarks.fakes)")
+    parser.add_argument("--translate-latency-ms", type=float, default=150, help="latence du traducteur local par segment")
+    parser.add_argument("--json", help="fichier de sortie des résultats (comparaison entre révisions)")
+    add_fake_arguments(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"revision": git_revision(), "args": vars(args), "results": results}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
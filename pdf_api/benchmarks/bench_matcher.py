@@ -0,0 +1,108 @@
+"""
+Compare le comptage naïf (str.count par synonyme) au matcher compilé en une passe.
+
+Usage (depuis pdf_api/) :
+    python -m benchmarks.bench_matcher --size-mb 5 --objects 20
+"""
+import argparse
+import random
+import time
+
+from matcher import MentionMatcher
+
+# Vocabulaire de remplissage et synonymes français représentatifs des classes COCO
+FILLER = (
+    "le la les un une des et ou dans sur sous avec pour par document rapport page section "
+    "analyse résultat achat chatte voitureur tableau figure image données étude projet"
+).split()
+SYNONYMS = {
+    "cat": ["chat", "félin", "minet"],
+    "dog": ["chien", "toutou", "canidé"],
+    "car": ["voiture", "automobile", "auto"],
+    "bicycle": ["vélo", "bicyclette"],
+    "person": ["personne", "individu"],
+    "traffic light": ["feu de circulation", "feu"],
+    "horse": ["cheval", "équidé"],
+    "bird": ["oiseau", "volatile"],
+    "boat": ["bateau", "navire", "embarcation"],
+    "chair": ["chaise", "siège"],
+    "bottle": ["bouteille", "flacon"],
+    "cup": ["tasse", "coupe"],
+    "laptop": ["ordinateur portable", "portable"],
+    "book": ["livre", "ouvrage"],
+    "clock": ["horloge", "pendule"],
+    "airplane": ["avion", "aéronef"],
+    "train": ["train", "rame"],
+    "truck": ["camion", "poids lourd"],
+    "umbrella": ["parapluie", "ombrelle"],
+    "apple": ["pomme"],
+}
+
+
+def naive_count(text: str, obj_to_synonyms: dict) -> dict:
+    """Implémentation historique de count_mentions_in_text."""
+    text_full = text.lower()
+    counts = {obj: 0 for obj in obj_to_synonyms}
+    for obj, synonyms in obj_to_synonyms.items():
+        for synonym in synonyms:
+            counts[obj] += text_full.count(synonym)
+    return counts
+
+
+def synthetic_text(size_mb: float, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    vocabulary = FILLER * 8 + [s for syns in SYNONYMS.values() for s in syns]
+    words, size, target = [], 0, int(size_mb * 1024 * 1024)
+    while size < target:
+        word = rng.choice(vocabulary)
+        if rng.random() < 0.05:
+            word = word.capitalize()
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def timed(fn, *args, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=2)
+    parser.add_argument("--objects", type=int, default=len(SYNONYMS))
+    parser.add_argument("--extra-synonyms", type=int, default=0,
+                        help="Synonymes fictifs ajoutés par objet pour simuler un lexique complet")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    obj_to_synonyms = dict(list(SYNONYMS.items())[: args.objects])
+    rng = random.Random(0)
+    for obj in obj_to_synonyms:
+        obj_to_synonyms[obj] = obj_to_synonyms[obj] + [
+            "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10)))
+            for _ in range(args.extra_synonyms)
+        ]
+    text = synthetic_text(args.size_mb)
+
+    build_time, matcher = timed(MentionMatcher, obj_to_synonyms, repeat=1)
+    naive_time, naive = timed(naive_count, text, obj_to_synonyms, repeat=args.repeat)
+    matcher_time, counts = timed(matcher.count, text, repeat=args.repeat)
+
+    print(f"Texte : {len(text) / 1e6:.1f} M caractères | objets : {len(obj_to_synonyms)} | "
+          f"synonymes : {sum(len(s) for s in obj_to_synonyms.values())}")
+    print(f"Construction du matcher : {build_time * 1000:.1f} ms")
+    print(f"str.count naïf : {naive_time * 1000:.1f} ms")
+    print(f"Matcher 1 passe : {matcher_time * 1000:.1f} ms")
+    print("Écarts (naïf -> matcher, dus aux sous-chaînes, accents et pluriels) :")
+    for obj in obj_to_synonyms:
+        if naive[obj] != counts[obj]:
+            print(f"  {obj}: {naive[obj]} -> {counts[obj]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Mesure le démarrage à froid de pdf_api : durée de `import main` dans un processus neuf,
+puis durée de chargement des ressources lourdes (YOLO, WordNet, lexique).
+
+Pour comparer avec une version antérieure, --baseline-ref extrait pdf_api/ depuis une
+révision git dans un dossier temporaire et mesure son import de la même façon.
+
+Usage (depuis pdf_api/) :
+    python -m benchmarks.bench_startup --runs 3 --baseline-ref HEAD~1
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+WARMUP_SNIPPET = (
+    "import time, asyncio; t = time.perf_counter(); import main; i = time.perf_counter() - t; "
+    "import registry; asyncio.run(registry.warm_up()); "
+    "print(i, time.perf_counter() - t, registry.readiness()['ready'])"
+)
+
+
+def run_snippet(snippet: str, cwd: str):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Échec dans {cwd} :\n{result.stderr[-2000:]}")
+    wall = time.perf_counter() - started
+    return result.stdout.strip().splitlines()[-1], wall
+
+
+def measure_import(cwd: str, runs: int) -> dict:
+    imports, walls = [], []
+    for _ in range(runs):
+        out, wall = run_snippet(IMPORT_SNIPPET, cwd)
+        imports.append(float(out))
+        walls.append(wall)
+    return {"import_s": statistics.median(imports), "process_s": statistics.median(walls)}
+
+
+def extract_ref(ref: str, target: str) -> str:
+    archive = os.path.join(target, "src.tar")
+    subprocess.run(["git", "archive", "--format=tar", "-o", archive, ref, "pdf_api"], cwd=os.path.dirname(HERE), check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return os.path.join(target, "pdf_api")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--baseline-ref", help="Révision git à comparer (ex. la version avant chargement paresseux)")
+    parser.add_argument("--skip-warmup", action="store_true", help="Ne pas mesurer le chargement des modèles")
+    args = parser.parse_args()
+
+    current = measure_import(HERE, args.runs)
+    print(f"Version courante : import main = {current['import_s']:.2f} s (processus complet {current['process_s']:.2f} s)")
+
+    if not args.skip_warmup:
+        out, _ = run_snippet(WARMUP_SNIPPET, HERE)
+        import_s, total_s, ready = out.split()
+        print(f"Version courante : prêt après préchauffage = {float(total_s):.2f} s (ressources prêtes : {ready})")
+
+    if args.baseline_ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline_dir = extract_ref(args.baseline_ref, tmp)
+            baseline = measure_import(baseline_dir, args.runs)
+        print(f"{args.baseline_ref} : import main = {baseline['import_s']:.2f} s (processus complet {baseline['process_s']:.2f} s)")
+        print(f"Gain au démarrage : x{baseline['import_s'] / max(current['import_s'], 1e-6):.1f}")
+
+
+if __name__ == "__main__":
+    main()
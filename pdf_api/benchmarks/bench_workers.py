@@ -0,0 +1,92 @@
+"""
+Mémoire résidente totale selon le nombre de workers, avec un modèle YOLO par worker
+(INFERENCE_MODE=local) ou un serveur d'inférence partagé (INFERENCE_MODE=server).
+
+Chaque worker simulé importe le moteur d'inférence, détecte une image puis attend ;
+la RSS de tous les processus (serveur compris) est alors relevée dans /proc (Linux).
+
+Usage (depuis pdf_api/) :
+    python -m benchmarks.bench_workers --workers 1 3 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_SNIPPET = """
+import asyncio, sys
+from objects import load_image_array
+from inference import inference_engine
+from ultralytics.utils import ASSETS
+
+async def main():
+    image = load_image_array(str(next(ASSETS.glob("*.jpg"))))
+    print(dict(await inference_engine.detect(image)), flush=True)
+    sys.stdin.read()
+
+asyncio.run(main())
+"""
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def wait_for_socket(path: str, timeout: float = 300):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        if time.time() > deadline:
+            raise SystemExit(f"Le serveur d'inférence n'a pas ouvert {path}")
+        time.sleep(0.2)
+
+
+def measure(mode: str, workers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, INFERENCE_MODE=mode, INFERENCE_SOCKET=os.path.join(tmp, "inference.sock"))
+        processes = []
+        server = None
+        if mode == "server":
+            server = subprocess.Popen([sys.executable, "inference_server.py"], cwd=HERE, env=env)
+            wait_for_socket(env["INFERENCE_SOCKET"])
+        try:
+            for _ in range(workers):
+                processes.append(subprocess.Popen(
+                    [sys.executable, "-c", WORKER_SNIPPET], cwd=HERE, env=env,
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+                ))
+            for process in processes:
+                process.stdout.readline()  # détection terminée
+            worker_rss = [rss_mb(process.pid) for process in processes]
+            server_rss = rss_mb(server.pid) if server else 0.0
+        finally:
+            for process in processes:
+                process.kill()
+            if server:
+                server.terminate()
+                server.wait()
+    return {"total": sum(worker_rss) + server_rss, "per_worker": sum(worker_rss) / workers, "server": server_rss}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--modes", nargs="+", default=["local", "server"], choices=["local", "server"])
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        for workers in args.workers:
+            result = measure(mode, workers)
+            print(f"{mode:6s} | {workers} workers | RSS totale {result['total']:7.0f} Mo "
+                  f"| par worker {result['per_worker']:6.0f} Mo | serveur {result['server']:6.0f} Mo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Corpus fixe pour les tests de charge : images, PDF et textes générés de façon déterministe.
+
+Les images dérivent des images d'exemple d'ultralytics (bus, personnes) redimensionnées et
+retournées : des objets réellement détectables, mais des octets distincts pour ne pas tout
+servir depuis le cache de détections. Les PDF mêlent texte français et images du corpus ;
+les textes couvrent les cas court, moyen et long (découpage map-reduce et multi-segments).
+manifest.json liste le SHA-256 de chaque fichier pour vérifier que deux mesures portent
+sur le même corpus.
+
+Usage (depuis pdf_api/) :
+    python -m benchmarks.corpus --out /tmp/docvision-corpus
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+from typing import Dict, List
+
+SEED = 1234
+SCALES = (1.0, 0.75, 0.5, 0.35)
+PDF_PAGES = (1, 10, 40)
+
+PHRASES_FR = (
+    "Le bus de la ligne 12 s'arrête devant la gare routière.",
+    "Plusieurs personnes attendent sous l'abri, un sac à la main.",
+    "Un homme en costume ajuste sa cravate avant la réunion.",
+    "La voiture blanche est garée à côté d'un vélo.",
+    "Sur la table, une tasse de café et un ordinateur portable.",
+    "Le chien traverse la rue en suivant son maître.",
+    "Un feu de circulation passe au rouge au carrefour.",
+    "Les enfants jouent au ballon dans le parc voisin.",
+    "Le rapport annuel présente la croissance du réseau de transport.",
+    "Une valise oubliée a été retrouvée près du quai.",
+)
+
+PHRASES_EN = (
+    "The city bus stopped in front of the station while passengers waited in the rain.",
+    "A man in a dark suit adjusted his tie before entering the meeting room.",
+    "The annual report describes the growth of the regional transport network.",
+    "Several people carried umbrellas and handbags along the crowded sidewalk.",
+    "A white car was parked next to a bicycle near the traffic light.",
+    "The committee approved the budget for new electric buses and charging stations.",
+    "Children played football in the park while their parents talked on a bench.",
+    "The document was translated, reviewed and archived by the operations team.",
+)
+
+TEXT_SIZES = {"short": 400, "medium": 4000, "long": 20000}
+
+
+def _paragraphs(phrases, size: int, rng: random.Random) -> str:
+    sentences = []
+    length = 0
+    while length < size:
+        sentence = rng.choice(phrases)
+        sentences.append(sentence)
+        length += len(sentence) + 1
+        if len(sentences) % 5 == 0:
+            sentences[-1] += "\n"
+    return " ".join(sentences).strip()
+
+
+def build_images(out: str) -> List[str]:
+    import cv2
+    from ultralytics.utils import ASSETS
+
+    sources = sorted(str(path) for path in ASSETS.glob("*.jpg"))
+    names = []
+    for source_index, source in enumerate(sources):
+        image = cv2.imread(source, cv2.IMREAD_COLOR)
+        for scale in SCALES:
+            for flip in (False, True):
+                variant = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                if flip:
+                    variant = cv2.flip(variant, 1)
+                name = f"img_{source_index}_{int(scale * 100):03d}{'_f' if flip else ''}.jpg"
+                cv2.imwrite(os.path.join(out, name), variant, [cv2.IMWRITE_JPEG_QUALITY, 90])
+                names.append(name)
+    return names
+
+
+def build_pdfs(out: str, images: List[str], rng: random.Random) -> List[str]:
+    import fitz
+
+    names = []
+    for pages in PDF_PAGES:
+        doc = fitz.open()
+        for page_num in range(pages):
+            page = doc.new_page()
+            text = _paragraphs(PHRASES_FR, 1500, rng)
+            page.insert_textbox(fitz.Rect(50, 50, 545, 450), text, fontsize=10)
+            # Une image sur deux pages ; certaines reviennent d'une page à l'autre (logos, figures)
+            if page_num % 2 == 0:
+                image = images[(page_num // 2) % len(images)]
+                page.insert_image(fitz.Rect(50, 470, 545, 790), filename=os.path.join(out, image), keep_proportion=True)
+        name = f"doc_{pages:02d}p.pdf"
+        doc.save(os.path.join(out, name), deflate=True, garbage=3)
+        doc.close()
+        names.append(name)
+    return names
+
+
+def build_texts(out: str, rng: random.Random) -> str:
+    texts = {
+        "fr": {size: _paragraphs(PHRASES_FR, length, rng) for size, length in TEXT_SIZES.items()},
+        "en": {size: _paragraphs(PHRASES_EN, length, rng) for size, length in TEXT_SIZES.items()},
+    }
+    with open(os.path.join(out, "texts.json"), "w", encoding="utf-8") as f:
+        json.dump(texts, f, ensure_ascii=False, indent=1)
+    return "texts.json"
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build(out: str) -> Dict:
+    os.makedirs(out, exist_ok=True)
+    rng = random.Random(SEED)
+    images = build_images(out)
+    pdfs = build_pdfs(out, images, rng)
+    texts = build_texts(out, rng)
+    manifest = {
+        "seed": SEED,
+        "images": images,
+        "pdfs": pdfs,
+        "texts": texts,
+        "sha256": {name: sha256_file(os.path.join(out, name)) for name in images + pdfs + [texts]},
+    }
+    with open(os.path.join(out, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def load(corpus_dir: str) -> Dict:
+    """Manifeste et textes d'un corpus déjà construit (build() sinon)."""
+    path = os.path.join(corpus_dir, "manifest.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+    else:
+        manifest = build(corpus_dir)
+    with open(os.path.join(corpus_dir, manifest["texts"]), encoding="utf-8") as f:
+        manifest["text"] = json.load(f)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    manifest = build(args.out)
+    print(f"{len(manifest['images'])} images, {len(manifest['pdfs'])} PDF et textes écrits dans {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Substituts locaux des services externes pour les tests de charge.
+
+- FakeOllama : mêmes routes que l'API Ollama utilisées par pdf_api (/api/generate, /api/chat,
+  /api/tags, /api/pull, /api/version), en NDJSON streamé ou non, avec une latence de
+  chargement et un débit de jetons configurables. Les durées et compteurs de la réponse
+  finale (eval_count, eval_duration...) sont renseignés comme par Ollama.
+- Hébergeur d'images : sert les fichiers du corpus (images et PDF) avec une latence réglable.
+
+La traduction utilise TRANSLATION_BACKEND=local (voir translate.LocalBackend).
+
+Usage autonome (depuis pdf_api/) :
+    python -m benchmarks.fakes --corpus /tmp/docvision-corpus --ollama-port 11435 --host-port 8765
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+WORDS = (
+    "Sur l'image on distingue clairement un bus rouge garé le long du trottoir , tandis que plusieurs "
+    "personnes attendent près de l'arrêt . Un homme porte une cravate et tient un sac à main ; "
+    "au second plan une voiture et un vélo complètent la scène urbaine ."
+).split()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeOllama:
+    def __init__(self, load_ms: float = 50, tokens_per_second: float = 40, tokens: int = 60,
+                 prompt_tokens_per_second: float = 800, pull_bytes_per_second: float = 200e6,
+                 models: Optional[List[str]] = None, seed: int = 0):
+        self.load = load_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.pull_bytes_per_second = pull_bytes_per_second
+        self.models = list(models or ["llava:7b", "mistral:latest", "gemma3:4b"])
+        self.random = random.Random(seed)
+        self.requests: Dict[str, int] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/api/generate", self.generate)
+        app.router.add_post("/api/chat", self.chat)
+        app.router.add_get("/api/tags", self.tags)
+        app.router.add_post("/api/pull", self.pull)
+        app.router.add_get("/api/version", self.version)
+        return app
+
+    def _count(self, route: str):
+        self.requests[route] = self.requests.get(route, 0) + 1
+
+    @staticmethod
+    def _prompt_tokens(payload: Dict) -> int:
+        text = payload.get("prompt", "") + "".join(m.get("content", "") for m in payload.get("messages", []))
+        # Ordre de grandeur d'un tokenizer : ~4 caractères par jeton, plus un forfait par image
+        return max(1, len(text) // 4) + 576 * len(payload.get("images", []))
+
+    def _tokens(self, payload: Dict) -> List[str]:
+        limit = payload.get("options", {}).get("num_predict")
+        count = min(self.tokens, limit) if limit and limit > 0 else self.tokens
+        start = self.random.randrange(len(WORDS))
+        return [WORDS[(start + i) % len(WORDS)] + " " for i in range(count)]
+
+    def _final(self, payload: Dict, prompt_tokens: int, tokens: int, started: float, prompt_seconds: float, eval_seconds: float) -> Dict:
+        return {
+            "model": payload.get("model"),
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": int(self.load * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": tokens,
+            "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    async def _respond(self, request: web.Request, chat: bool) -> web.StreamResponse:
+        payload = await request.json()
+        self._count("chat" if chat else "generate")
+        if payload.get("model") not in self.models and not any(m.split(":")[0] == payload.get("model") for m in self.models):
+            return web.json_response({"error": f"model '{payload.get('model')}' not found"}, status=404)
+
+        started = time.perf_counter()
+        prompt_tokens = self._prompt_tokens(payload)
+        prompt_seconds = prompt_tokens / self.prompt_tokens_per_second
+        await asyncio.sleep(self.load + prompt_seconds)
+        tokens = self._tokens(payload)
+        delay = 1 / self.tokens_per_second
+
+        def chunk(text: str) -> Dict:
+            base = {"model": payload.get("model"), "created_at": _now(), "done": False}
+            if chat:
+                base["message"] = {"role": "assistant", "content": text}
+            else:
+                base["response"] = text
+            return base
+
+        if payload.get("stream", True) is False:
+            await asyncio.sleep(delay * len(tokens))
+            final = self._final(payload, prompt_tokens, len(tokens), started, prompt_seconds, delay * len(tokens))
+            final.update(chunk("".join(tokens)), done=True)
+            return web.json_response(final)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        eval_started = time.perf_counter()
+        for token in tokens:
+            await asyncio.sleep(delay)
+            await response.write((json.dumps(chunk(token)) + "\n").encode())
+        final = self._final(payload, prompt_tokens, len(tokens), started, prompt_seconds, time.perf_counter() - eval_started)
+        final.update(chunk(""), done=True)
+        await response.write((json.dumps(final) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        return await self._respond(request, chat=False)
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        return await self._respond(request, chat=True)
+
+    async def tags(self, request: web.Request) -> web.Response:
+        self._count("tags")
+        return web.json_response({"models": [
+            {"name": name, "model": name, "modified_at": _now(), "size": 4_000_000_000,
+             "digest": hashlib.sha256(name.encode()).hexdigest()}
+            for name in self.models
+        ]})
+
+    async def version(self, request: web.Request) -> web.Response:
+        return web.json_response({"version": "0.0.0-fake"})
+
+    async def pull(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        self._count("pull")
+        name = payload.get("name") or payload.get("model")
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+
+        async def send(data: Dict):
+            await response.write((json.dumps(data) + "\n").encode())
+
+        await send({"status": "pulling manifest"})
+        # Deux couches, comme un modèle réel (poids + paramètres), découvertes l'une après l'autre
+        layers = [(hashlib.sha256(f"{name}:{i}".encode()).hexdigest(), size) for i, size in enumerate((400_000_000, 8_000))]
+        step = 0.05
+        for digest, total in layers:
+            completed = 0
+            while completed < total:
+                await asyncio.sleep(step)
+                completed = min(total, completed + int(self.pull_bytes_per_second * step) or total)
+                await send({"status": f"pulling {digest[:12]}", "digest": f"sha256:{digest}", "total": total, "completed": completed})
+        for status in ("verifying sha256 digest", "writing manifest", "success"):
+            await send({"status": status})
+        if name not in self.models:
+            self.models.append(name)
+        await response.write_eof()
+        return response
+
+
+def image_host_app(corpus_dir: str, latency_ms: float = 0) -> web.Application:
+    """
+    Sert corpus_dir sous /files/<nom> ; latence ajoutée avant chaque réponse.
+    Avec ?v=<marqueur>, le marqueur est ajouté après la fin du fichier : contenu affiché
+    identique (JPEG, PNG et PDF ignorent ces octets), empreinte SHA-256 différente.
+    """
+    latency = latency_ms / 1000
+
+    async def serve(request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        path = os.path.join(corpus_dir, os.path.basename(name))
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        if latency:
+            await asyncio.sleep(latency)
+        marker = request.query.get("v")
+        if not marker:
+            return web.FileResponse(path)
+        with open(path, "rb") as f:
+            body = f.read() + b"\n" + marker.encode()
+        return web.Response(body=body, content_type="application/pdf" if path.endswith(".pdf") else "image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/files/{name}", serve)
+    return app
+
+
+async def start_site(app: web.Application, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def serve(args):
+    runners = [
+        await start_site(FakeOllama(args.load_ms, args.tokens_per_second, args.tokens).app(), args.bind, args.ollama_port),
+        await start_site(image_host_app(args.corpus, args.host_latency_ms), args.bind, args.host_port),
+    ]
+    print(f"Faux Ollama sur http://{args.bind}:{args.ollama_port}, corpus sur http://{args.bind}:{args.host_port}/files/")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--load-ms", type=float, default=50, help="latence avant le premier jeton")
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--tokens", type=int, default=60, help="jetons générés par réponse")
+    parser.add_argument("--host-latency-ms", type=float, default=0, help="latence de l'hébergeur d'images")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--host-port", type=int, default=8765)
+    add_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
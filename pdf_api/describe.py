@@ -1,31 +1,36 @@
-import aiohttp
 import asyncio
-import base64
-import os
 import json
-import hashlib
-from typing import List, Dict
+import time
+from typing import AsyncIterator, List, Dict
+from image_io import DownloadedImage
+from image_preprocess import prepare_for_vision, preprocess_signature, record_generation
 from model_manager import ModelManager
+from ollama_client import ollama_client, OllamaError, stream_timings
+from result_cache import llm_cache, make_key
+from singleflight import SingleFlight
 import logging
-from threading import Lock
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Thread-safe cache
-cache = {}
-cache_lock = Lock()
-
-def hash_image_and_objects(image_path: str, objects: List[str]) -> str:
-    """Génère un hash unique basé sur l'image et les objets."""
-    try:
-        with open(image_path, 'rb') as f:
-            image_bytes = f.read()
-        return hashlib.sha256(image_bytes + ','.join(objects).encode()).hexdigest()
-    except FileNotFoundError:
-        logger.error(f"Échec de la lecture du fichier pour hachage : {image_path}")
-        raise
+# À incrémenter à chaque modification de build_prompt ou des options : invalide le cache
+PROMPT_VERSION = 1
+DESCRIBE_OPTIONS = {"num_ctx": 2048, "temperature": 0.7}
+# Un seul appel au modèle de vision par image + objets + modèle, même pour des requêtes concurrentes
+describe_flight = SingleFlight("describe")
+
+def hash_image_and_objects(image_hash: str, objects: List[str], model: str) -> str:
+    """Génère la clé de cache basée sur l'image (SHA-256 calculé au téléchargement), les objets, le modèle, la version du prompt et la préparation de l'image."""
+    return make_key(
+        "describe",
+        image=image_hash,
+        objects=objects,
+        model=model,
+        prompt_version=PROMPT_VERSION,
+        options=DESCRIBE_OPTIONS,
+        preprocess=preprocess_signature(model)
+    )
 
 def build_prompt(objects: List[str]) -> str:
     """Génère le prompt pour décrire les objets spécifiés."""
@@ -66,7 +71,7 @@ def format_response(content: str, objects: List[str]) -> str:
         raise ValueError("Réponse vide")
     return content.strip()
 
-async def describe_objects(image_path: str, objects: List[str], manager: ModelManager = None, cleanup: bool = True) -> Dict:
+async def describe_objects(image: DownloadedImage, objects: List[str], manager: ModelManager = None, cleanup: bool = True) -> Dict:
     """Génère une description des objets spécifiés dans l'image."""
     if not manager:
         logger.error("Aucun gestionnaire de modèle fourni.")
@@ -78,82 +83,123 @@ async def describe_objects(image_path: str, objects: List[str], manager: ModelMa
         logger.error("Aucun modèle actif défini.")
         return {"status": "error", "message": "Aucun modèle actif défini.", "description": None}
 
-    # Générer la clé de cache
-    try:
-        cache_key = hash_image_and_objects(image_path, objects)
-        with cache_lock:
-            if cache_key in cache:
-                logger.info(f"Résultat récupéré du cache pour {image_path} avec objets {objects}")
-                return {
-                    "status": "success",
-                    "message": "Résultat récupéré du cache.",
-                    "description": cache[cache_key],
-                    "model_used": current_model
-                }
-    except FileNotFoundError:
-        logger.error(f"Fichier {image_path} introuvable pour hachage.")
-        return {"status": "error", "message": f"Fichier {image_path} introuvable.", "description": None}
-
     try:
-        # Vérifier l'existence du fichier
-        if not os.path.exists(image_path):
-            logger.error(f"Fichier {image_path} introuvable.")
-            return {"status": "error", "message": f"Fichier {image_path} introuvable.", "description": None}
-
-        # Lire et encoder l'image
-        with open(image_path, "rb") as image_file:
-            image_base64 = base64.b64encode(image_file.read()).decode('utf-8')
-
-        # Construire le prompt
-        prompt = build_prompt(objects)
-        ollama_url = f"{manager.base_url}/api/generate"
-
-        # Configurer le connecteur pour optimiser les connexions
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10)) as session:
-            async with session.post(
-                ollama_url,
-                json={
-                    "model": current_model,
-                    "prompt": prompt,
-                    "images": [image_base64],
-                    "stream": False,
-                    "options": {"num_ctx": 2048, "temperature": 0.7}
-                },
-              
-            ) as response:
-                if response.status == 200:
-                    try:
-                        response_data = await response.json()
-                        description = format_response(response_data.get("response", ""), objects)
-                        with cache_lock:
-                            cache[cache_key] = description
-                        logger.info(f"Description générée pour {image_path} avec objets {objects}")
-                        return {
-                            "status": "success",
-                            "message": "Description générée avec succès",
-                            "description": description,
-                            "model_used": current_model
-                        }
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Erreur de décodage JSON : {str(e)}")
-                        return {"status": "error", "message": f"Erreur de décodage JSON : {str(e)}", "description": None}
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Erreur API : {response.status} - {error_text}")
-                    return {"status": "error", "message": f"Erreur API : {response.status} - {error_text}", "description": None}
-    except FileNotFoundError:
-        logger.error(f"Fichier {image_path} introuvable.")
-        return {"status": "error", "message": f"Fichier {image_path} introuvable.", "description": None}
-    except aiohttp.ClientError as e:
-        logger.error(f"Erreur de connexion API : {str(e)}")
-        return {"status": "error", "message": f"Erreur de connexion API : {str(e)}", "description": None}
+        # Clé de cache : le hash de l'image est déjà calculé pendant le téléchargement
+        cache_key = hash_image_and_objects(image.sha256, objects, current_model)
+        cached = await llm_cache.get_async(cache_key)
+        if cached is not None:
+            logger.info(f"Résultat récupéré du cache pour l'image {image.sha256[:12]} avec objets {objects}")
+            return {
+                "status": "success",
+                "message": "Résultat récupéré du cache.",
+                "description": cached,
+                "model_used": current_model
+            }
+
+        async def generate():
+            # Session, timeouts et rejeux gérés par le client Ollama partagé ;
+            # l'image est réduite et réencodée pour le modèle avant l'envoi
+            image_data, preprocessing = await prepare_for_vision(image, current_model)
+            started = time.perf_counter()
+            response_data = await ollama_client.generate(
+                current_model,
+                build_prompt(objects),
+                images=[image_data],
+                options=DESCRIBE_OPTIONS
+            )
+            description = format_response(response_data.get("response", ""), objects)
+            await llm_cache.set_async(cache_key, description)
+            return {
+                "description": description,
+                "preprocessing": record_generation(preprocessing, response_data),
+                "timings": stream_timings(response_data, started, None)
+            }
+
+        generated = await describe_flight.do(cache_key, generate)
+        logger.info(f"Description générée pour l'image {image.sha256[:12]} avec objets {objects}")
+        return {
+            "status": "success",
+            "message": "Description générée avec succès",
+            "model_used": current_model,
+            **generated
+        }
+    except OllamaError as e:
+        logger.error(str(e))
+        return {"status": "error", "message": str(e), "description": None}
+    except json.JSONDecodeError as e:
+        logger.error(f"Erreur de décodage JSON : {str(e)}")
+        return {"status": "error", "message": f"Erreur de décodage JSON : {str(e)}", "description": None}
     except Exception as e:
         logger.error(f"Exception non gérée : {type(e).__name__} - {str(e)}")
         return {"status": "error", "message": f"Exception non gérée : {type(e).__name__} - {str(e)}", "description": None}
     finally:
-        if cleanup and os.path.exists(image_path):
+        if cleanup:
+            image.close()
+
+async def describe_objects_stream(image: DownloadedImage, objects: List[str], manager: ModelManager, cleanup: bool = True) -> AsyncIterator[Dict]:
+    """
+    Variante streamée de describe_objects : un événement "token" par fragment reçu d'Ollama,
+    puis un événement "done" avec la description complète et les durées (ou "error").
+    """
+    current_model = manager.get_active_model()
+    try:
+        if not current_model:
+            yield {"type": "error", "message": "Aucun modèle actif défini."}
+            return
+        cache_key = hash_image_and_objects(image.sha256, objects, current_model)
+        cached = await llm_cache.get_async(cache_key)
+        if cached is not None:
+            logger.info(f"Résultat récupéré du cache pour l'image {image.sha256[:12]} avec objets {objects}")
+            yield {"type": "done", "description": cached, "model_used": current_model, "cached": True, "timings": {}}
+            return
+        if describe_flight.in_flight(cache_key):
+            # Une requête non streamée identique est déjà en cours : on attend son résultat
             try:
-                os.remove(image_path)
-                logger.info(f"Fichier {image_path} supprimé avec succès.")
+                generated = await describe_flight.wait(cache_key)
             except Exception as e:
-                logger.warning(f"Échec de la suppression du fichier {image_path}: {str(e)}")
\ No newline at end of file
+                yield {"type": "error", "message": str(e)}
+                return
+            yield {"type": "done", "description": generated["description"], "model_used": current_model, "cached": True, "timings": {}}
+            return
+
+        first_token_at = None
+        parts = []
+        try:
+            # Dans le try : toute erreur, préparation de l'image comprise, termine le flux par un événement "error"
+            image_data, preprocessing = await prepare_for_vision(image, current_model)
+            started = time.perf_counter()
+            async for chunk in ollama_client.generate_stream(
+                current_model,
+                build_prompt(objects),
+                images=[image_data],
+                options=DESCRIBE_OPTIONS
+            ):
+                token = chunk.get("response", "")
+                if token:
+                    first_token_at = first_token_at or time.perf_counter()
+                    parts.append(token)
+                    yield {"type": "token", "token": token}
+                if chunk.get("done"):
+                    description = format_response("".join(parts), objects)
+                    await llm_cache.set_async(cache_key, description)
+                    yield {
+                        "type": "done",
+                        "description": description,
+                        "model_used": current_model,
+                        "cached": False,
+                        "preprocessing": record_generation(preprocessing, chunk),
+                        "timings": stream_timings(chunk, started, first_token_at)
+                    }
+                    return
+        except (OllamaError, ValueError) as e:
+            logger.error(f"Erreur lors de la génération streamée : {str(e)}")
+            yield {"type": "error", "message": str(e)}
+            return
+        except Exception as e:
+            logger.error(f"Exception non gérée pendant la génération streamée : {type(e).__name__} - {str(e)}")
+            yield {"type": "error", "message": f"Exception non gérée : {type(e).__name__} - {str(e)}"}
+            return
+        yield {"type": "error", "message": "Flux Ollama interrompu avant la fin de la génération"}
+    finally:
+        if cleanup:
+            image.close()
\ No newline at end of file
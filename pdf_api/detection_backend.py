@@ -0,0 +1,165 @@
+"""
+Choix du modèle YOLO (famille, taille) et de son runtime d'exécution.
+
+    YOLO_FAMILY     yolov8 | yolo11                        (défaut : yolov8)
+    YOLO_VARIANT    n | s | m | l | x                      (défaut : x)
+    YOLO_RUNTIME    torch | onnx | openvino                (défaut : torch)
+    YOLO_PRECISION  fp32 | fp16 | int8                     (défaut : fp32)
+    YOLO_WEIGHTS    fichier .pt explicite (remplace famille + taille)
+
+Pour ONNX Runtime et OpenVINO, le modèle est exporté au premier usage puis mis en cache
+dans YOLO_EXPORT_DIR (DATA_DIR/models) : les démarrages suivants, et les autres workers,
+réutilisent l'export. Un verrou de fichier évite que deux processus exportent en même temps.
+"""
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+YOLO_FAMILY = os.getenv("YOLO_FAMILY", "yolov8")
+YOLO_VARIANT = os.getenv("YOLO_VARIANT", "x")
+YOLO_RUNTIME = os.getenv("YOLO_RUNTIME", "torch")
+YOLO_PRECISION = os.getenv("YOLO_PRECISION", "fp32")
+YOLO_WEIGHTS = os.getenv("YOLO_WEIGHTS")
+YOLO_IMGSZ = int(os.getenv("YOLO_IMGSZ", "640"))
+YOLO_EXPORT_DIR = os.getenv("YOLO_EXPORT_DIR", os.path.join(DATA_DIR, "models"))
+# Jeu de calibration pour la quantification INT8 OpenVINO (téléchargé par ultralytics)
+YOLO_INT8_DATA = os.getenv("YOLO_INT8_DATA", "coco8.yaml")
+
+VARIANTS = ("n", "s", "m", "l", "x")
+RUNTIMES = ("torch", "onnx", "openvino")
+PRECISIONS = ("fp32", "fp16", "int8")
+
+
+def weights_name(family: str = YOLO_FAMILY, variant: str = YOLO_VARIANT) -> str:
+    if variant not in VARIANTS:
+        raise ValueError(f"Taille de modèle inconnue : {variant} (attendu : {', '.join(VARIANTS)})")
+    # Nommage ultralytics : yolov8x.pt, mais yolo11x.pt (sans « v »)
+    family = "yolo11" if family in ("yolo11", "yolov11") else family
+    return f"{family}{variant}.pt"
+
+
+class DetectionBackend:
+    """Un modèle YOLO + un runtime + une précision ; load() renvoie (modèle, dispositif)."""
+
+    def __init__(
+        self,
+        weights: Optional[str] = None,
+        runtime: str = YOLO_RUNTIME,
+        precision: str = YOLO_PRECISION,
+        imgsz: int = YOLO_IMGSZ,
+        export_dir: str = YOLO_EXPORT_DIR,
+    ):
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Runtime inconnu : {runtime} (attendu : {', '.join(RUNTIMES)})")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Précision inconnue : {precision} (attendu : {', '.join(PRECISIONS)})")
+        if runtime == "torch" and precision == "int8":
+            raise ValueError("INT8 n'est disponible qu'avec les runtimes onnx et openvino")
+        self.weights = weights or YOLO_WEIGHTS or weights_name()
+        self.runtime = runtime
+        self.precision = precision
+        self.imgsz = imgsz
+        self.export_dir = export_dir
+
+    @property
+    def name(self) -> str:
+        stem = os.path.splitext(os.path.basename(self.weights))[0]
+        return f"{stem}-{self.runtime}-{self.precision}"
+
+    def export_path(self) -> str:
+        stem = os.path.splitext(os.path.basename(self.weights))[0]
+        base = os.path.join(self.export_dir, f"{stem}_{self.precision}_{self.imgsz}")
+        return f"{base}.onnx" if self.runtime == "onnx" else f"{base}_openvino_model"
+
+    def _device(self) -> str:
+        if self.runtime == "openvino":
+            return "cpu"
+        import torch
+        return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+    def _export(self, target: str):
+        from ultralytics import YOLO
+
+        options = {"imgsz": self.imgsz, "dynamic": True}
+        if self.precision == "fp16":
+            options["half"] = True
+        if self.runtime == "openvino" and self.precision == "int8":
+            options.update(int8=True, data=YOLO_INT8_DATA)
+
+        with tempfile.TemporaryDirectory(dir=self.export_dir) as tmp:
+            # ultralytics écrit l'export à côté des poids : on travaille sur une copie temporaire
+            model = YOLO(self.weights)
+            local_weights = os.path.join(tmp, os.path.basename(self.weights))
+            shutil.copy(model.ckpt_path, local_weights)
+            exported = YOLO(local_weights).export(format=self.runtime, **options)
+            if self.runtime == "onnx" and self.precision == "int8":
+                # Quantification dynamique des poids (pas de jeu de calibration nécessaire)
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantized = os.path.join(tmp, "quantized.onnx")
+                quantize_dynamic(exported, quantized, weight_type=QuantType.QUInt8)
+                exported = quantized
+            os.replace(exported, target)
+
+    def ensure_exported(self) -> str:
+        """Chemin du modèle exporté, créé au premier appel."""
+        target = self.export_path()
+        if os.path.exists(target):
+            return target
+        os.makedirs(self.export_dir, exist_ok=True)
+        with open(os.path.join(self.export_dir, ".export.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(target):
+                    print(f"[INFO] Export de {self.weights} vers {self.runtime} ({self.precision}) : {target}")
+                    self._export(target)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return target
+
+    def load(self) -> Tuple[object, str]:
+        from ultralytics import YOLO
+
+        device = self._device()
+        if self.runtime == "torch":
+            model = YOLO(self.weights)
+            model.to(device)
+            if self.precision == "fp16" and device == "cuda":
+                model.model.half()
+        else:
+            model = YOLO(self.ensure_exported(), task="detect")
+        print(f"[INFO] Modèle {self.name} chargé ; dispositif : {device}")
+        return model, device
+
+    def describe(self) -> Dict:
+        return {
+            "weights": self.weights,
+            "runtime": self.runtime,
+            "precision": self.precision,
+            "imgsz": self.imgsz,
+            "export_path": None if self.runtime == "torch" else self.export_path(),
+        }
+
+
+def parse_spec(spec: str) -> DetectionBackend:
+    """« x:onnx:int8 », « yolo11s:openvino » ou « yolov8n.pt » -> DetectionBackend."""
+    parts = spec.split(":")
+    model = parts[0]
+    if model.endswith(".pt"):
+        weights = model
+    elif model in VARIANTS:
+        weights = weights_name(YOLO_FAMILY, model)
+    else:
+        weights = weights_name(model[:-1], model[-1])
+    runtime = parts[1] if len(parts) > 1 else "torch"
+    precision = parts[2] if len(parts) > 2 else "fp32"
+    return DetectionBackend(weights=weights, runtime=runtime, precision=precision)
+
+
+def get_backend() -> DetectionBackend:
+    return DetectionBackend()
@@ -0,0 +1,129 @@
+"""
+Détections YOLO adressées par contenu.
+
+Le Counter d'une image est mis en cache sous le SHA-256 de ses octets encodés et le modèle
+configuré (taille, runtime, précision) : la même image, qu'elle vienne de /analyze, d'une
+autre URL ou d'un PDF, n'est détectée qu'une fois. Les demandes concurrentes pour la même
+image (ou la même URL) partagent un seul calcul en cours.
+"""
+import asyncio
+import os
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from detection_backend import get_backend
+from executors import cpu_pool
+from image_io import download_image, DownloadedImage
+from metrics import stage
+from inference import inference_engine
+from objects import summarize_occurrences, translate_counts
+from result_cache import DATA_DIR, ResultCache, make_key
+from singleflight import SingleFlight
+
+DETECTION_CACHE_MAX_ENTRIES = int(os.getenv("DETECTION_CACHE_MAX_ENTRIES", "20000"))
+DETECTION_CACHE_TTL = float(os.getenv("DETECTION_CACHE_TTL", str(30 * 24 * 3600)))
+# Chemin vide : cache en mémoire uniquement
+DETECTION_CACHE_DB = os.getenv("DETECTION_CACHE_DB", os.path.join(DATA_DIR, "detection_cache.sqlite"))
+DETECTION_MODEL = get_backend().name
+
+detection_cache = ResultCache(
+    max_entries=DETECTION_CACHE_MAX_ENTRIES,
+    max_bytes=16 * 1024 * 1024,
+    ttl=DETECTION_CACHE_TTL,
+    db_path=DETECTION_CACHE_DB,
+    disk_max_bytes=64 * 1024 * 1024,
+)
+detect_flight = SingleFlight("detect")
+url_flight = SingleFlight("analyze_url")
+
+
+def detection_key(image_hash: str) -> str:
+    return make_key("detect", image=image_hash, model=DETECTION_MODEL)
+
+
+async def detect_cached(image_hash: str, decode: Callable[[], np.ndarray]) -> Counter:
+    """Détections d'une image identifiée par son hash ; decode() n'est appelé qu'en cas d'absence du cache."""
+    key = detection_key(image_hash)
+    cached = await detection_cache.get_async(key)
+    if cached is not None:
+        return Counter(cached)
+
+    async def compute():
+        with stage("image_decode"):
+            image = await asyncio.to_thread(decode)
+        with stage("yolo"):
+            detected = await inference_engine.detect(image)
+        await detection_cache.set_async(key, dict(detected))
+        return detected
+
+    return Counter(await detect_flight.do(key, compute))
+
+
+async def detect_image(image: DownloadedImage) -> Counter:
+    return await detect_cached(image.sha256, image.to_array)
+
+
+async def detect_url(url: str, download_semaphore: Optional[asyncio.Semaphore] = None) -> Counter:
+    """
+    Télécharge et détecte une image ; les appels concurrents pour la même URL partagent le téléchargement.
+    download_semaphore borne les téléchargements simultanés sans limiter la taille des lots YOLO.
+    """
+    async def compute():
+        if download_semaphore is None:
+            image = await download_image(url)
+        else:
+            async with download_semaphore:
+                image = await download_image(url)
+        with image:
+            return await detect_image(image)
+
+    return Counter(await url_flight.do(url, compute))
+
+
+async def analyze_document(text: str, image_urls: List[str], max_downloads: int = 8, on_progress=None) -> Dict:
+    """
+    Analyse les images d'un document : téléchargements concurrents bornés, détection par
+    micro-lots, puis un seul calcul des synonymes et un seul parcours du texte.
+    Une image en échec est signalée sans invalider les autres.
+    """
+    semaphore = asyncio.Semaphore(max_downloads)
+    # Une URL répétée dans le document n'est traitée qu'une fois
+    unique_urls = list(dict.fromkeys(image_urls))
+    done = 0
+
+    async def detect(url):
+        nonlocal done
+        try:
+            return await detect_url(url, download_semaphore=semaphore)
+        finally:
+            done += 1
+            if on_progress:
+                on_progress(done, len(unique_urls))
+
+    outcomes = await asyncio.gather(*(detect(url) for url in unique_urls), return_exceptions=True)
+    by_url = dict(zip(unique_urls, outcomes))
+
+    images = []
+    detections = []
+    for url in image_urls:
+        outcome = by_url[url]
+        if isinstance(outcome, BaseException):
+            images.append({"image_url": url, "objects": {}, "error": str(outcome)})
+            continue
+        detections.append(outcome)
+        images.append({"image_url": url, "objects": translate_counts(outcome)})
+
+    result = await cpu_pool.run(summarize_occurrences, detections=detections, texts=[text])
+    result["images"] = images
+    result["failed"] = sum(1 for image in images if "error" in image)
+    return result
+
+
+def get_stats() -> Dict:
+    return {
+        "model": DETECTION_MODEL,
+        "cache": detection_cache.stats(),
+        "single_flight": {"detect": detect_flight.stats(), "url": url_flight.stats()},
+    }
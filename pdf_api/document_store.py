@@ -0,0 +1,216 @@
+"""
+Résultats des documents PDF déjà traités, conservés par page.
+
+Chaque page est identifiée par une empreinte (hash du texte et des flux bruts de ses images) ;
+son résultat (texte, URLs et objets détectés des images) est enregistré sous cette empreinte
+et la variante du traitement (détection ou non, modèle, destination des images). Un PDF
+légèrement modifié ne recalcule que les pages dont l'empreinte a changé, les autres sont
+reprises telles quelles, même depuis un autre document.
+
+Le document lui-même est enregistré sous le SHA-256 du fichier avec la liste de ses
+empreintes : un envoi identique est servi sans ouvrir le PDF.
+
+Base SQLite (WAL) sous DATA_DIR, partagée par les workers uvicorn et conservée entre
+redémarrages ; les pages les moins récemment utilisées sont supprimées au-delà de
+DOCUMENT_STORE_MAX_BYTES, avec les documents qui les référencent. Les appels sont bloquants :
+depuis la boucle d'événements, ils passent par io_pool.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+# Chemin vide : pas de reprise des résultats
+DOCUMENT_STORE_DB = os.getenv("DOCUMENT_STORE_DB", os.path.join(DATA_DIR, "documents.sqlite"))
+DOCUMENT_STORE_MAX_BYTES = int(os.getenv("DOCUMENT_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Limite de paramètres d'une requête SQLite
+_BATCH = 500
+
+
+class DocumentStore:
+    def __init__(self, path: str = DOCUMENT_STORE_DB, max_bytes: int = DOCUMENT_STORE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        self._counters = {"document_hits": 0, "document_misses": 0, "page_hits": 0, "page_misses": 0, "pages_stored": 0, "pruned": 0, "documents_pruned": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_hash TEXT NOT NULL, variant TEXT NOT NULL, fingerprints TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (doc_hash, variant))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " fingerprint TEXT NOT NULL, variant TEXT NOT NULL, result TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (fingerprint, variant))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_pages(self, fingerprints: List[str], variant: str) -> Dict[str, Dict]:
+        """Résultats connus parmi ces empreintes de pages."""
+        unique = list(dict.fromkeys(fingerprints))
+        found: Dict[str, Dict] = {}
+        try:
+            conn = self._connect()
+            for start in range(0, len(unique), _BATCH):
+                batch = unique[start:start + _BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT fingerprint, result FROM pages WHERE variant = ? AND fingerprint IN ({placeholders})",
+                    (variant, *batch),
+                ).fetchall()
+                found.update((fingerprint, json.loads(result)) for fingerprint, result in rows)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE pages SET accessed_at = ? WHERE fingerprint = ? AND variant = ?",
+                    [(now, fingerprint, variant) for fingerprint in found],
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Lecture du magasin de documents impossible : {e}")
+            return {}
+        self._counters["page_hits"] += sum(1 for fingerprint in fingerprints if fingerprint in found)
+        self._counters["page_misses"] += sum(1 for fingerprint in fingerprints if fingerprint not in found)
+        return found
+
+    def get_document(self, doc_hash: str, variant: str) -> Optional[Dict]:
+        """
+        Document complet (résultats de toutes ses pages, dans l'ordre) ou None s'il est inconnu
+        ou si une de ses pages a été supprimée depuis.
+        """
+        try:
+            row = self._connect().execute(
+                "SELECT fingerprints FROM documents WHERE doc_hash = ? AND variant = ?", (doc_hash, variant)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Lecture du magasin de documents impossible : {e}")
+            row = None
+        if row is None:
+            self._counters["document_misses"] += 1
+            return None
+        pages = json.loads(row[0])
+        results = self.get_pages([page["fingerprint"] for page in pages], variant)
+        if len(results) < len({page["fingerprint"] for page in pages}):
+            self._counters["document_misses"] += 1
+            return None
+        self._counters["document_hits"] += 1
+        try:
+            self._connect().execute(
+                "UPDATE documents SET accessed_at = ? WHERE doc_hash = ? AND variant = ?", (time.time(), doc_hash, variant)
+            )
+        except sqlite3.Error:
+            pass
+        return {
+            "document_hash": doc_hash,
+            "pages": [{**page, "result": results[page["fingerprint"]]} for page in pages],
+        }
+
+    def put_page(self, fingerprint: str, variant: str, result: Dict):
+        raw = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO pages (fingerprint, variant, result, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (fingerprint, variant, raw, len(raw), now, now),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Écriture du magasin de documents impossible : {e}")
+            return
+        self._counters["pages_stored"] += 1
+        self._writes += 1
+        # Le nettoyage n'est fait que périodiquement pour garder les écritures rapides
+        if self._writes % 64 == 0:
+            self.prune()
+
+    def put_document(self, doc_hash: str, variant: str, pages: List[Dict]):
+        """pages : empreinte et xrefs des images de chaque page, dans l'ordre du document."""
+        now = time.time()
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO documents (doc_hash, variant, fingerprints, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (doc_hash, variant, json.dumps(pages), now, now),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Écriture du magasin de documents impossible : {e}")
+
+    def prune(self) -> int:
+        """
+        Supprime les pages les moins récemment utilisées au-delà de max_bytes, par lots (index
+        sur accessed_at), puis les documents qui référencent une page supprimée.
+        """
+        conn = self._connect()
+        removed = 0
+        try:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            excess = total - self.max_bytes
+            if excess <= 0:
+                return 0
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                while excess > 0:
+                    rows = conn.execute("SELECT rowid, size FROM pages ORDER BY accessed_at LIMIT ?", (_BATCH,)).fetchall()
+                    if not rows:
+                        break
+                    victims = []
+                    for rowid, size in rows:
+                        if excess <= 0:
+                            break
+                        victims.append(rowid)
+                        excess -= size
+                    conn.execute(f"DELETE FROM pages WHERE rowid IN ({','.join('?' * len(victims))})", victims)
+                    removed += len(victims)
+                # Un document dont une page a disparu ne peut plus être servi : sa ligne est supprimée aussi
+                documents = conn.execute(
+                    "DELETE FROM documents WHERE EXISTS ("
+                    " SELECT 1 FROM json_each(documents.fingerprints) AS page WHERE NOT EXISTS ("
+                    "  SELECT 1 FROM pages WHERE pages.fingerprint = json_extract(page.value, '$.fingerprint')"
+                    "  AND pages.variant = documents.variant))"
+                ).rowcount
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Nettoyage du magasin de documents impossible : {e}")
+            return 0
+        self._counters["pruned"] += removed
+        self._counters["documents_pruned"] += documents
+        return removed
+
+    def stats(self) -> Dict:
+        conn = self._connect()
+        documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        pages, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        return {"path": self.path, "documents": documents, "pages": pages, "bytes": size, "max_bytes": self.max_bytes, **self._counters}
+
+
+def get_document_store(path: str = DOCUMENT_STORE_DB) -> Optional[DocumentStore]:
+    if not path:
+        return None
+    try:
+        return DocumentStore(path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Magasin de documents indisponible ({path}), tous les PDF seront retraités : {e}")
+        return None
+
+
+document_store = get_document_store()
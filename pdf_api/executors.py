@@ -0,0 +1,269 @@
+"""
+Exécuteurs bornés pour le travail bloquant, hors de la boucle d'événements.
+
+- cpu_pool : pool de processus ("spawn") pour le calcul pur en Python, qui garde le GIL :
+  extraction des pages PDF, croisement des détections avec le texte.
+- io_pool : pool de threads pour les clients bloquants hérités (GoogleTranslator,
+  écriture des images extraites).
+
+La détection YOLO garde son propre exécuteur (moteur de micro-lots ou serveur d'inférence).
+
+Chaque pool admet au plus workers + file d'attente tâches. Les endpoints vérifient la
+capacité à l'entrée (check()) et répondent 429 si le pool est saturé ; une fois admise,
+une requête attend son tour plutôt que de perdre le travail déjà fait.
+
+LoopLagMonitor mesure le retard de la boucle d'événements : un retard élevé signale un
+appel bloquant resté dans un handler async.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# PDF_PAGE_WORKERS : ancien nom de la taille du pool de pages, toujours accepté
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", os.getenv("PDF_PAGE_WORKERS", str(min(4, os.cpu_count() or 1)))))
+CPU_POOL_QUEUE = int(os.getenv("CPU_POOL_QUEUE", "32"))
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "16"))
+IO_POOL_QUEUE = int(os.getenv("IO_POOL_QUEUE", "64"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "200"))
+
+# Bornes (ms) de l'histogramme des retards de la boucle
+LAG_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+executor_wait = metrics.registry.histogram("pdf_api_executor_wait_seconds", "Attente d'une place dans le pool", ("pool",))
+executor_run = metrics.registry.histogram("pdf_api_executor_run_seconds", "Durée d'exécution dans le pool", ("pool",))
+# Pools propres à chaque worker uvicorn : une série par worker (étiquette pid)
+executor_in_flight = metrics.registry.gauge("pdf_api_executor_in_flight", "Tâches admises dans le pool", ("pool",), merge="worker")
+executor_queued = metrics.registry.gauge("pdf_api_executor_queued", "Tâches en attente d'un worker du pool", ("pool",), merge="worker")
+executor_rejected = metrics.registry.counter("pdf_api_executor_rejected_total", "Requêtes refusées (pool saturé)", ("pool",))
+loop_lag_seconds = metrics.registry.histogram(
+    "pdf_api_event_loop_lag_seconds", "Retard de réveil de la boucle d'événements",
+    buckets=tuple(bound / 1000 for bound in LAG_BUCKETS_MS)
+)
+loop_lag_recent = metrics.registry.gauge(
+    "pdf_api_event_loop_lag_recent_seconds", "Retard récent (moyenne exponentielle) de la boucle d'événements", merge="worker"
+)
+
+
+def _call(fn: Callable, args: tuple, kwargs: dict, capture: bool):
+    """Exécuté dans le pool : résultat, durée d'exécution et étapes mesurées dans un autre processus."""
+    started = time.perf_counter()
+    if capture:
+        with metrics.capture() as observed:
+            result = fn(*args, **kwargs)
+    else:
+        observed = None
+        result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started, observed
+
+
+class PoolSaturated(RuntimeError):
+    def __init__(self, pool: str, capacity: int):
+        super().__init__(f"Pool '{pool}' saturé ({capacity} tâches admises), réessayez plus tard")
+        self.pool = pool
+        self.capacity = capacity
+
+
+class BoundedExecutor:
+    """Exécuteur (threads ou processus) dont le nombre de tâches admises est borné."""
+
+    def __init__(self, name: str, factory: Callable[[int], Executor], max_workers: int, max_queue: int,
+                 remote: bool = False):
+        self.name = name
+        self.factory = factory
+        # Pool de processus : les mesures faites dans le processus fils sont renvoyées au worker
+        self.remote = remote
+        self.max_workers = max(1, max_workers)
+        self.capacity = self.max_workers + max(0, max_queue)
+        self._executor: Optional[Executor] = None
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._in_flight = 0
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+        self._busy_seconds = 0.0
+        self._max_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self.factory(self.max_workers)
+        return self._executor
+
+    @property
+    def saturated(self) -> bool:
+        return self._slots.locked()
+
+    def check(self):
+        """Lève PoolSaturated si aucune place n'est disponible (contrôle d'admission)."""
+        if self.saturated:
+            self._counters["rejected"] += 1
+            executor_rejected.inc(pool=self.name)
+            raise PoolSaturated(self.name, self.capacity)
+
+    async def run(self, fn: Callable, *args, wait: bool = True, **kwargs):
+        """
+        Exécute fn(*args, **kwargs) dans le pool. Si wait est faux, lève PoolSaturated
+        au lieu d'attendre une place.
+        """
+        if not wait:
+            self.check()
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            future = self._get_executor().submit(_call, fn, args, kwargs, self.remote)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._in_flight += 1
+        self._counters["submitted"] += 1
+        # La place est rendue à la fin réelle du travail, même si l'appelant a été annulé entre-temps
+        future.add_done_callback(lambda f: self._call_soon(loop, self._done, f, started))
+        result, _, _ = await asyncio.wrap_future(future)
+        return result
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args):
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Boucle fermée (arrêt du worker)
+            pass
+
+    def _done(self, future: Future, started: float):
+        self._in_flight -= 1
+        self._slots.release()
+        elapsed = time.perf_counter() - started
+        self._busy_seconds += elapsed
+        self._max_seconds = max(self._max_seconds, elapsed)
+        if future.cancelled():
+            self._counters["cancelled"] += 1
+        elif future.exception() is not None:
+            self._counters["failed"] += 1
+        else:
+            self._counters["completed"] += 1
+            _, run_seconds, observed = future.result()
+            executor_run.observe(run_seconds, pool=self.name)
+            executor_wait.observe(max(0.0, elapsed - run_seconds), pool=self.name)
+            metrics.replay(observed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        finished = self._counters["completed"] + self._counters["failed"]
+        return {
+            "workers": self.max_workers,
+            "capacity": self.capacity,
+            "in_flight": self._in_flight,
+            "queued": max(0, self._in_flight - self.max_workers),
+            "saturated": self.saturated,
+            "avg_seconds": round(self._busy_seconds / finished, 4) if finished else None,
+            "max_seconds": round(self._max_seconds, 4),
+            **self._counters,
+        }
+
+
+def _process_pool(max_workers: int) -> Executor:
+    # "spawn" : ne pas hériter par fork des threads torch/YOLO du processus parent
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _thread_pool(max_workers: int) -> Executor:
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="io-pool")
+
+
+class LoopLagMonitor:
+    """Mesure périodiquement le retard de réveil de la boucle d'événements."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, warn_ms: float = LOOP_LAG_WARN_MS):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self._task: Optional[asyncio.Task] = None
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.avg_ms = 0.0
+        self.samples = 0
+        self.total_ms = 0.0
+        self.slow = 0
+        self.buckets = [0] * len(LAG_BUCKETS_MS)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, (loop.time() - expected) * 1000))
+
+    def record(self, lag_ms: float):
+        self.last_ms = lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+        # Moyenne exponentielle : reflète l'état récent plutôt que toute la durée de vie
+        self.avg_ms = lag_ms if not self.samples else 0.1 * lag_ms + 0.9 * self.avg_ms
+        self.samples += 1
+        self.total_ms += lag_ms
+        loop_lag_seconds.observe(lag_ms / 1000)
+        for i, bound in enumerate(LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                self.buckets[i] += 1
+        if lag_ms >= self.warn_ms:
+            self.slow += 1
+            logger.warning(f"Boucle d'événements bloquée pendant {lag_ms:.0f} ms")
+
+    def stats(self) -> Dict:
+        return {
+            "interval_seconds": self.interval,
+            "last_ms": round(self.last_ms, 2),
+            "avg_ms": round(self.avg_ms, 2),
+            "max_ms": round(self.max_ms, 2),
+            "samples": self.samples,
+            f"over_{self.warn_ms:g}ms": self.slow,
+            "histogram_ms": {f"le_{bound}": count for bound, count in zip(LAG_BUCKETS_MS, self.buckets)},
+        }
+
+
+cpu_pool = BoundedExecutor("cpu", _process_pool, CPU_POOL_WORKERS, CPU_POOL_QUEUE, remote=True)
+io_pool = BoundedExecutor("io", _thread_pool, IO_POOL_WORKERS, IO_POOL_QUEUE)
+loop_lag = LoopLagMonitor()
+
+
+def shutdown_executors():
+    cpu_pool.shutdown()
+    io_pool.shutdown()
+
+
+def _collect_metrics():
+    for pool in (cpu_pool, io_pool):
+        stats = pool.stats()
+        executor_in_flight.set(stats["in_flight"], pool=pool.name)
+        executor_queued.set(stats["queued"], pool=pool.name)
+    loop_lag_recent.set(loop_lag.avg_ms / 1000)
+
+
+metrics.registry.add_collector(_collect_metrics)
+
+
+def get_stats() -> Dict:
+    return {
+        "loop_lag": loop_lag.stats(),
+        "pools": {"cpu": cpu_pool.stats(), "io": io_pool.stats()},
+    }
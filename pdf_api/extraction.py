@@ -1,18 +1,15 @@
 import fitz  # PyMuPDF
+import aiohttp
+import hashlib
+import json
 import requests
 import tempfile
-import cloudinary
-import cloudinary.uploader
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
+from image_sink import get_image_sink, sha256_hex
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
+load_dotenv()
 
 def download_pdf_from_url(url: str) -> str:
     response = requests.get(url)
@@ -24,29 +21,113 @@ def download_pdf_from_url(url: str) -> str:
     else:
         raise Exception(f"Unable to download PDF. Status code: {response.status_code}")
 
+async def download_pdf(url: str) -> str:
+    """Version asynchrone de download_pdf_from_url, écrite par morceaux sur le disque."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            if response.status != 200:
+                raise Exception(f"Unable to download PDF. Status code: {response.status}")
+            temp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+            try:
+                with temp:
+                    async for chunk in response.content.iter_chunked(1 << 16):
+                        temp.write(chunk)
+            except BaseException:
+                # Transfert interrompu (ou requête annulée) : pas de fichier orphelin
+                os.remove(temp.name)
+                raise
+            return temp.name
+
+# Documents ouverts par processus du pool : chaque worker ne rouvre pas le PDF à chaque page
+_open_docs = {}
+MAX_OPEN_DOCS = 4
+
+def _get_document(pdf_path: str):
+    doc = _open_docs.get(pdf_path)
+    if doc is None:
+        if len(_open_docs) >= MAX_OPEN_DOCS:
+            _open_docs.pop(next(iter(_open_docs))).close()
+        doc = _open_docs[pdf_path] = fitz.open(pdf_path)
+    return doc
+
+def get_page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+def validate_pdf(pdf_path: str) -> int:
+    """Nombre de pages d'un PDF lisible ; ValueError si le fichier n'est pas exploitable."""
+    try:
+        doc = fitz.open(pdf_path, filetype="pdf")
+    except Exception as e:
+        raise ValueError(f"Fichier PDF illisible : {e}")
+    with doc:
+        if doc.needs_pass:
+            raise ValueError("PDF protégé par mot de passe")
+        if len(doc) == 0:
+            raise ValueError("PDF sans page")
+        return len(doc)
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint_document(pdf_path: str) -> list:
+    """
+    Empreinte de chaque page : hash du texte et des flux bruts (non décodés) de ses images.
+    Bien moins coûteux qu'extract_page : les images ne sont ni décodées ni copiées hors du PDF.
+    """
+    doc = _get_document(pdf_path)
+    stream_hashes = {}
+    pages = []
+    for page in doc:
+        xrefs = [img[0] for img in page.get_images(full=True)]
+        for xref in xrefs:
+            if xref not in stream_hashes:
+                stream_hashes[xref] = hashlib.sha256(doc.xref_stream_raw(xref) or b"").hexdigest()
+        parts = [hashlib.sha256(page.get_text().encode("utf-8")).hexdigest(), [stream_hashes[xref] for xref in xrefs]]
+        pages.append({
+            "fingerprint": hashlib.sha256(json.dumps(parts).encode("ascii")).hexdigest(),
+            "xrefs": xrefs,
+        })
+    return pages
+
+def extract_page(pdf_path: str, page_num: int) -> dict:
+    """Extrait le texte et les images brutes d'une page (exécuté dans executors.cpu_pool)."""
+    doc = _get_document(pdf_path)
+    page = doc.load_page(page_num)
+    images = []
+    for img in page.get_images(full=True):
+        xref = img[0]
+        base_image = doc.extract_image(xref)
+        images.append({
+            "xref": xref,
+            "ext": base_image.get("ext", "png"),
+            "image": base_image["image"],
+            "sha256": sha256_hex(base_image["image"]),
+        })
+    return {"page": page_num, "text": page.get_text(), "images": images}
+
 def extract_images_and_text(pdf_path: str):
     doc = fitz.open(pdf_path)
-    text = ""
+    sink = get_image_sink()
+    texts = []
     image_urls = []
+    # Une image référencée sur plusieurs pages (logo, en-tête) n'est stockée qu'une fois
+    urls_by_xref = {}
 
     for page_num in range(len(doc)):
         page = doc.load_page(page_num)
-        text += page.get_text()
+        texts.append(page.get_text())
 
         image_list = page.get_images(full=True)
         for img in image_list:
             xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_img:
-                temp_img.write(image_bytes)
-                temp_img.flush()
-
-                # Upload image to Cloudinary
-                result = cloudinary.uploader.upload(temp_img.name, folder="pdf_images")
-                image_urls.append(result["secure_url"])
-
-            os.remove(temp_img.name)
+            if xref not in urls_by_xref:
+                base_image = doc.extract_image(xref)
+                urls_by_xref[xref] = sink.store(base_image["image"], ext=base_image.get("ext", "png"))
+            image_urls.append(urls_by_xref[xref])
 
-    return text, image_urls
+    return "".join(texts), image_urls
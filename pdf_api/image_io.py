@@ -0,0 +1,116 @@
+"""
+Téléchargement d'images en mémoire, de la réponse HTTP jusqu'au décodage et à l'inférence.
+
+Les octets sont hachés (SHA-256) au fil de la réception et gardés dans un seul tampon :
+le décodage OpenCV, la clé de cache et l'encodage base64 pour Ollama le lisent sans
+copie ni passage par le disque. Seules les images dépassant IMAGE_SPILL_BYTES sont
+écrites dans un fichier temporaire, supprimé par close().
+"""
+import base64
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+import aiohttp
+import cv2
+import numpy as np
+
+from metrics import stage
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(25 * 1024 * 1024)))
+IMAGE_SPILL_BYTES = int(os.getenv("IMAGE_SPILL_BYTES", str(8 * 1024 * 1024)))
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "30"))
+CHUNK_SIZE = 1 << 16
+
+
+class ImageTooLarge(ValueError):
+    """L'image dépasse IMAGE_MAX_BYTES."""
+
+
+class DownloadedImage:
+    """Image encodée (PNG, JPEG...) en mémoire, ou sur disque si elle est trop grosse."""
+
+    def __init__(self, data: Optional[bytearray], sha256: str, size: int, path: Optional[str] = None, content_type: str = ""):
+        self._data = data
+        self.sha256 = sha256
+        self.size = size
+        self.path = path
+        self.content_type = content_type
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def buffer(self):
+        """Octets encodés : vue sur le tampon en mémoire, ou contenu du fichier de débordement."""
+        if self._data is not None:
+            return memoryview(self._data)
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def to_array(self) -> np.ndarray:
+        """Décode l'image en tableau BGR, le format attendu par YOLO."""
+        if self.spilled:
+            image = cv2.imread(self.path, cv2.IMREAD_COLOR)
+        else:
+            image = cv2.imdecode(np.frombuffer(self._data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Image illisible")
+        return image
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.buffer()).decode("ascii")
+
+    def close(self):
+        self._data = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def download_image(url: str, max_bytes: int = IMAGE_MAX_BYTES, spill_bytes: int = IMAGE_SPILL_BYTES) -> DownloadedImage:
+    """Télécharge une image en la hachant au fil de l'eau ; lève ImageTooLarge au-delà de max_bytes."""
+    with stage("image_download"):
+        timeout = aiohttp.ClientTimeout(total=IMAGE_DOWNLOAD_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    raise Exception(f"Erreur téléchargement image: {response.status}")
+                if response.content_length and response.content_length > max_bytes:
+                    raise ImageTooLarge(f"Image trop volumineuse : {response.content_length} octets (max {max_bytes})")
+
+                digest = hashlib.sha256()
+                buffer = bytearray()
+                spill = None
+                size = 0
+                try:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise ImageTooLarge(f"Image trop volumineuse : plus de {max_bytes} octets")
+                        digest.update(chunk)
+                        if spill is not None:
+                            spill.write(chunk)
+                            continue
+                        buffer += chunk
+                        if len(buffer) > spill_bytes:
+                            spill = tempfile.NamedTemporaryFile(delete=False, suffix=".img")
+                            spill.write(buffer)
+                            buffer = None
+                except BaseException:
+                    if spill is not None:
+                        spill.close()
+                        os.remove(spill.name)
+                    raise
+
+                if spill is not None:
+                    spill.close()
+                    return DownloadedImage(None, digest.hexdigest(), size, path=spill.name, content_type=response.content_type)
+                return DownloadedImage(buffer, digest.hexdigest(), size, content_type=response.content_type)
@@ -0,0 +1,238 @@
+"""
+Préparation des images envoyées au modèle de vision.
+
+L'image téléchargée est décodée une seule fois, réduite pour que son plus grand côté ne
+dépasse pas la résolution utile du modèle cible, puis réencodée (JPEG ou WebP) : les
+métadonnées (EXIF, profils, vignettes) ne sont pas recopiées, l'orientation EXIF est
+appliquée au décodage. La charge JSON envoyée à Ollama et le temps d'encodage de l'image
+côté modèle diminuent d'autant.
+
+Le résultat (base64 prêt à envoyer) est mis en cache sous le SHA-256 de l'image d'origine
+et les réglages de préparation ; les demandes concurrentes pour la même image partagent
+un seul calcul.
+"""
+import asyncio
+import base64
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+
+from image_io import DownloadedImage
+from metrics import registry, stage
+from result_cache import DATA_DIR, ResultCache, make_key
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+VISION_PREPROCESS = os.getenv("VISION_PREPROCESS", "1") not in ("0", "false", "False")
+# Plus grand côté par défaut, pour les modèles absents de la table ci-dessous
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1024"))
+# Surcharges par modèle : "llava=672,gemma3=896" (nom complet ou famille avant ':')
+VISION_MAX_SIDES = os.getenv("VISION_MAX_SIDES", "")
+# jpeg, ou webp si la version d'Ollama et le modèle l'acceptent
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "jpeg").lower()
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+VISION_IMAGE_CACHE_MAX_BYTES = int(os.getenv("VISION_IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+VISION_IMAGE_CACHE_TTL = float(os.getenv("VISION_IMAGE_CACHE_TTL", str(24 * 3600)))
+# Chemin vide : cache en mémoire uniquement
+VISION_IMAGE_CACHE_DB = os.getenv("VISION_IMAGE_CACHE_DB", os.path.join(DATA_DIR, "vision_image_cache.sqlite"))
+
+# Résolution d'entrée des encodeurs d'image : au-delà, l'image est de toute façon réduite par le modèle
+MODEL_MAX_SIDES = {
+    "llava": 672,
+    "llava-llama3": 672,
+    "llava-phi3": 672,
+    "bakllava": 672,
+    "moondream": 378,
+    "gemma3": 896,
+    "llama3.2-vision": 1120,
+    "qwen2.5vl": 1024,
+    "minicpm-v": 1344,
+}
+
+ENCODERS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+if VISION_IMAGE_FORMAT not in ENCODERS:
+    logger.warning(f"VISION_IMAGE_FORMAT={VISION_IMAGE_FORMAT} inconnu, utilisation de jpeg")
+    VISION_IMAGE_FORMAT = "jpeg"
+
+vision_image_cache = ResultCache(
+    max_entries=512,
+    max_bytes=VISION_IMAGE_CACHE_MAX_BYTES,
+    ttl=VISION_IMAGE_CACHE_TTL,
+    db_path=VISION_IMAGE_CACHE_DB,
+    disk_max_bytes=4 * VISION_IMAGE_CACHE_MAX_BYTES,
+)
+preprocess_flight = SingleFlight("vision_preprocess")
+
+vision_image_bytes = registry.counter("pdf_api_vision_image_bytes_total", "Octets d'image avant et après préparation", ("kind",))
+vision_prompt_eval = registry.histogram(
+    "pdf_api_vision_prompt_eval_seconds", "Évaluation du prompt (encodage de l'image compris) par Ollama", ("image",)
+)
+
+_counters = {
+    "requests": 0, "cached": 0, "resized": 0, "kept_original": 0, "failed": 0,
+    "original_bytes": 0, "sent_bytes": 0, "preprocess_ms": 0.0,
+}
+# Durée d'évaluation du prompt par Ollama selon que l'image a été préparée ou non
+_prompt_eval = {"preprocessed": [0, 0.0], "original": [0, 0.0]}
+
+
+def _parse_overrides(value: str) -> Dict[str, int]:
+    overrides = {}
+    for item in value.split(","):
+        name, _, side = item.partition("=")
+        if name.strip() and side.strip().isdigit():
+            overrides[name.strip()] = int(side)
+    return overrides
+
+
+_overrides = _parse_overrides(VISION_MAX_SIDES)
+
+
+def max_side_for(model: Optional[str]) -> int:
+    """Plus grand côté pour le modèle : surcharge, puis table par famille, puis VISION_MAX_SIDE."""
+    model = model or ""
+    family = model.split(":")[0]
+    for table in (_overrides, MODEL_MAX_SIDES):
+        for name in (model, family):
+            if name in table:
+                return table[name]
+    return _overrides.get("*", VISION_MAX_SIDE)
+
+
+def preprocess_signature(model: Optional[str]) -> Dict:
+    """Réglages qui changent l'image envoyée : à inclure dans les clés des résultats du modèle."""
+    if not VISION_PREPROCESS:
+        return {"enabled": False}
+    return {"enabled": True, "max_side": max_side_for(model), "format": VISION_IMAGE_FORMAT, "quality": VISION_IMAGE_QUALITY}
+
+
+def _encode(image: DownloadedImage, max_side: int) -> Tuple[Optional[bytes], Dict]:
+    """Décode, réduit et réencode ; renvoie (None, infos) si l'original est plus léger."""
+    array = image.to_array()
+    height, width = array.shape[:2]
+    info = {"original_size": [width, height], "sent_size": [width, height], "resized": False}
+    scale = max_side / max(width, height)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        array = cv2.resize(array, size, interpolation=cv2.INTER_AREA)
+        info.update(sent_size=list(size), resized=True)
+
+    extension, quality_flag = ENCODERS[VISION_IMAGE_FORMAT]
+    ok, encoded = cv2.imencode(extension, array, [quality_flag, VISION_IMAGE_QUALITY])
+    if not ok:
+        raise ValueError(f"Encodage {VISION_IMAGE_FORMAT} impossible")
+    if not info["resized"] and len(encoded) >= image.size:
+        # Image déjà petite et bien compressée : un réencodage ne ferait que la dégrader
+        return None, info
+    return encoded.tobytes(), info
+
+
+async def prepare_for_vision(image: DownloadedImage, model: Optional[str]) -> Tuple[str, Dict]:
+    """
+    Image en base64 pour Ollama et statistiques de la préparation (octets, dimensions, durée).
+    En cas d'échec (format non décodable par OpenCV...), l'image d'origine est envoyée telle quelle.
+    """
+    started = time.perf_counter()
+    _counters["requests"] += 1
+    if not VISION_PREPROCESS:
+        return image.to_base64(), _finish({"preprocessed": False, "format": image.content_type}, image.size, image.size, started)
+
+    signature = preprocess_signature(model)
+    key = make_key("vision_image", image=image.sha256, **signature)
+    entry = await vision_image_cache.get_async(key)
+    cached = entry is not None
+    if entry is None:
+        async def compute():
+            with stage("vision_preprocess"):
+                encoded, info = await asyncio.to_thread(_encode, image, signature["max_side"])
+            if encoded is None:
+                result = {"data": None, "info": {**info, "preprocessed": False, "format": image.content_type}}
+            else:
+                info.update(preprocessed=True, format=VISION_IMAGE_FORMAT, sent_bytes=len(encoded))
+                result = {"data": base64.b64encode(encoded).decode("ascii"), "info": info}
+            await vision_image_cache.set_async(key, result)
+            return result
+
+        try:
+            entry = await preprocess_flight.do(key, compute)
+        except Exception as e:
+            logger.warning(f"Préparation de l'image {image.sha256[:12]} impossible, envoi de l'original : {e}")
+            _counters["failed"] += 1
+            return image.to_base64(), _finish({"preprocessed": False, "error": str(e)}, image.size, image.size, started)
+
+    info = dict(entry["info"], max_side=signature["max_side"], cached=cached)
+    if entry["data"] is None:
+        _counters["kept_original"] += 1
+        return image.to_base64(), _finish(info, image.size, image.size, started)
+    if cached:
+        _counters["cached"] += 1
+    if info.get("resized"):
+        _counters["resized"] += 1
+    return entry["data"], _finish(info, image.size, info.pop("sent_bytes"), started)
+
+
+def _finish(info: Dict, original_bytes: int, sent_bytes: int, started: float) -> Dict:
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _counters["original_bytes"] += original_bytes
+    _counters["sent_bytes"] += sent_bytes
+    _counters["preprocess_ms"] += elapsed_ms
+    vision_image_bytes.inc(original_bytes, kind="original")
+    vision_image_bytes.inc(sent_bytes, kind="sent")
+    return {
+        **info,
+        "original_bytes": original_bytes,
+        "sent_bytes": sent_bytes,
+        "bytes_saved": original_bytes - sent_bytes,
+        "ratio": round(sent_bytes / original_bytes, 4) if original_bytes else 1.0,
+        "preprocess_ms": round(elapsed_ms, 2),
+    }
+
+
+def record_generation(preprocessing: Dict, response: Dict) -> Dict:
+    """
+    Ajoute aux statistiques de préparation la durée d'évaluation du prompt mesurée par Ollama
+    (c'est là que l'image est encodée) et la compare à la moyenne des images non préparées.
+    """
+    duration = response.get("prompt_eval_duration")
+    if not duration:
+        return preprocessing
+    prompt_eval_ms = duration / 1e6
+    mode = "preprocessed" if preprocessing.get("preprocessed") else "original"
+    totals = _prompt_eval[mode]
+    totals[0] += 1
+    totals[1] += prompt_eval_ms
+    vision_prompt_eval.observe(prompt_eval_ms / 1000, image=mode)
+
+    preprocessing["prompt_eval_ms"] = round(prompt_eval_ms, 2)
+    count, total = _prompt_eval["original"]
+    if mode == "preprocessed" and count:
+        # Variation estimée : coût de la préparation moins le gain sur l'évaluation du prompt
+        preprocessing["latency_change_ms"] = round(preprocessing["preprocess_ms"] + prompt_eval_ms - total / count, 2)
+    return preprocessing
+
+
+def get_stats() -> Dict:
+    stats = {
+        "enabled": VISION_PREPROCESS,
+        "format": VISION_IMAGE_FORMAT,
+        "quality": VISION_IMAGE_QUALITY,
+        "default_max_side": VISION_MAX_SIDE,
+        "max_side_overrides": _overrides,
+        **{name: round(value, 2) if isinstance(value, float) else value for name, value in _counters.items()},
+        "cache": vision_image_cache.stats(),
+        "single_flight": preprocess_flight.stats(),
+    }
+    stats["bytes_saved"] = stats["original_bytes"] - stats["sent_bytes"]
+    stats["mean_preprocess_ms"] = round(_counters["preprocess_ms"] / _counters["requests"], 2) if _counters["requests"] else None
+    stats["mean_prompt_eval_ms"] = {
+        mode: round(total / count, 2) if count else None for mode, (count, total) in _prompt_eval.items()
+    }
+    return stats
@@ -0,0 +1,113 @@
+"""
+Destinations de stockage des images extraites des PDF.
+
+Par défaut les images sont écrites dans un magasin local adressé par contenu (sha256)
+sous DATA_DIR/images et servies par l'application ; Cloudinary reste disponible via
+IMAGE_SINK=cloudinary.
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+IMAGE_SINK = os.getenv("IMAGE_SINK", "local")
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(DATA_DIR, "images"))
+# Préfixe public des URLs (ex. http://pdf-api:8000) ; vide = URLs relatives à l'API
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+IMAGES_ROUTE = "/images"
+
+
+def sha256_hex(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class ImageSink(ABC):
+    """Interface commune : stocke des octets d'image et retourne une URL."""
+
+    @abstractmethod
+    def store(self, image_bytes: bytes, ext: str = "png", digest: Optional[str] = None) -> str:
+        ...
+
+
+class LocalImageStore(ImageSink):
+    """Magasin local adressé par contenu : une image identique n'est écrite qu'une fois."""
+
+    def __init__(self, root: str = IMAGE_STORE_DIR, public_base_url: str = PUBLIC_BASE_URL):
+        self.root = root
+        self.public_base_url = public_base_url
+        os.makedirs(self.root, exist_ok=True)
+
+    def relative_path(self, digest: str, ext: str) -> str:
+        return f"{digest[:2]}/{digest}.{ext}"
+
+    def store(self, image_bytes: bytes, ext: str = "png", digest: Optional[str] = None) -> str:
+        digest = digest or sha256_hex(image_bytes)
+        relative = self.relative_path(digest, ext)
+        path = os.path.join(self.root, relative)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Écriture atomique : plusieurs workers peuvent stocker la même image en parallèle
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(image_bytes)
+                os.replace(tmp_path, path)
+            except BaseException:
+                # Disque plein, droits... : pas de fichier temporaire abandonné dans le magasin
+                os.unlink(tmp_path)
+                raise
+        return f"{self.public_base_url}{IMAGES_ROUTE}/{relative}"
+
+
+class CloudinarySink(ImageSink):
+    """Envoi vers Cloudinary, l'identifiant public étant le hash du contenu."""
+
+    def __init__(self, folder: str = "pdf_images"):
+        import cloudinary
+        import cloudinary.uploader
+
+        cloudinary.config(
+            cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key=os.getenv("CLOUDINARY_API_KEY"),
+            api_secret=os.getenv("CLOUDINARY_API_SECRET")
+        )
+        self._uploader = cloudinary.uploader
+        self.folder = folder
+        self._urls: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def store(self, image_bytes: bytes, ext: str = "png", digest: Optional[str] = None) -> str:
+        digest = digest or sha256_hex(image_bytes)
+        with self._lock:
+            url = self._urls.get(digest)
+        if url:
+            return url
+        # overwrite=False : une image déjà envoyée par un autre worker n'est pas réécrite
+        result = self._uploader.upload(io.BytesIO(image_bytes), folder=self.folder, public_id=digest, overwrite=False)
+        with self._lock:
+            self._urls[digest] = result["secure_url"]
+        return result["secure_url"]
+
+
+_sink: Optional[ImageSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_image_sink() -> ImageSink:
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                if IMAGE_SINK == "cloudinary":
+                    _sink = CloudinarySink()
+                else:
+                    _sink = LocalImageStore()
+                logger.info(f"Stockage des images : {type(_sink).__name__}")
+    return _sink
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from objects import detect_objects_batch
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale d'un micro-lot et temps d'attente maximal avant de lancer la passe
+MAX_BATCH_SIZE = int(os.getenv("YOLO_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.getenv("YOLO_MAX_WAIT_MS", "15"))
+# "local" : modèle chargé dans chaque worker ; "server" : un seul modèle, servi par inference_server.py
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "local")
+
+
+class InferenceEngine:
+    """
+    Regroupe les détections demandées par des requêtes concurrentes en micro-lots.
+
+    Chaque appelant dépose une image décodée et attend son propre Counter via un future ;
+    un worker unique forme des lots (taille max / attente max) et exécute une seule passe
+    YOLO par lot dans un thread dédié, sans bloquer la boucle d'événements.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        detect_fn: Callable[[list], List[Counter]] = detect_objects_batch,
+        history_size: int = 200,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._detect_fn = detect_fn
+        self._pending = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._history = deque(maxlen=history_size)
+        self._totals = {"batches": 0, "images": 0, "errors": 0, "inference_ms": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-inference")
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Moteur d'inférence démarré (lot max : {self.max_batch_size}, attente max : {self.max_wait * 1000:.0f} ms)")
+
+    async def stop(self):
+        if not self._worker:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        while self._pending:
+            _, future, _ = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("Moteur d'inférence arrêté"))
+        self._executor.shutdown(wait=False)
+        self._worker = None
+        self._executor = None
+
+    async def detect(self, image) -> Counter:
+        """Soumet une image (tableau BGR ou chemin) et attend ses détections."""
+        if not self.running:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((image, future, time.perf_counter()))
+        self._wakeup.set()
+        return await future
+
+    async def _collect(self) -> list:
+        while not self._pending:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+        batch = [self._pending.popleft()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if self._pending:
+                batch.append(self._pending.popleft())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        # Les appelants qui ont abandonné (timeout, déconnexion) ne coûtent pas d'inférence
+        return [item for item in batch if not item[1].done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            images = [image for image, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                counters = await loop.run_in_executor(self._executor, self._detect_fn, images)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'inférence du lot ({len(batch)} images) : {e}")
+                self._totals["errors"] += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for (_, future, _), counter in zip(batch, counters):
+                if not future.done():
+                    future.set_result(counter)
+
+            self._record(batch, started, finished)
+
+    def _record(self, batch: list, started: float, finished: float):
+        inference_ms = (finished - started) * 1000
+        waits = [(started - enqueued) * 1000 for _, _, enqueued in batch]
+        self._totals["batches"] += 1
+        self._totals["images"] += len(batch)
+        self._totals["inference_ms"] += inference_ms
+        self._history.append({
+            "size": len(batch),
+            "inference_ms": round(inference_ms, 2),
+            "per_image_ms": round(inference_ms / len(batch), 2),
+            "max_queue_wait_ms": round(max(waits), 2),
+            "avg_queue_wait_ms": round(sum(waits) / len(waits), 2),
+            "finished_at": time.time(),
+        })
+
+    def get_stats(self, last: int = 20) -> Dict:
+        """Statistiques cumulées et détail des derniers lots."""
+        history = list(self._history)
+        batches = self._totals["batches"]
+        return {
+            "running": self.running,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": len(self._pending),
+            "batches": batches,
+            "images": self._totals["images"],
+            "errors": self._totals["errors"],
+            "avg_batch_size": round(self._totals["images"] / batches, 2) if batches else 0,
+            "avg_inference_ms": round(self._totals["inference_ms"] / batches, 2) if batches else 0,
+            "recent_batches": history[-last:] if last > 0 else [],
+        }
+
+    async def stats(self, last: int = 20) -> Dict:
+        return {"mode": "local", **self.get_stats(last)}
+
+
+def get_inference_engine(mode: str = INFERENCE_MODE):
+    if mode == "server":
+        from inference_server import InferenceClient
+        return InferenceClient()
+    return InferenceEngine()
+
+
+# Instance partagée par les endpoints du worker
+inference_engine = get_inference_engine()
@@ -0,0 +1,302 @@
+"""
+Serveur d'inférence YOLO partagé par tous les workers uvicorn.
+
+Un seul processus charge le modèle et exécute le moteur de micro-lots ; les workers FastAPI
+lui envoient leurs images par une socket Unix locale. Les pixels ne transitent pas par la
+socket : le client les dépose dans un segment de mémoire partagée et n'envoie que son nom,
+sa forme et son type. Les requêtes de tous les workers alimentent la même file, ce qui
+permet de former des lots plus grands qu'avec un moteur par worker.
+
+Lancement (avant uvicorn, voir start.sh) :
+    python inference_server.py
+
+Protocole : trames préfixées par leur longueur (4 octets, big-endian) contenant du JSON.
+    -> {"id": 1, "op": "detect", "shm": "psm_x", "shape": [h, w, 3], "dtype": "uint8"}
+    -> {"id": 2, "op": "detect", "path": "/tmp/image.jpg"}
+    -> {"id": 3, "op": "stats", "last": 20}
+    <- {"id": 1, "objects": {"person": 2}} | {"id": 2, "error": "..."} | {"id": 3, "stats": {...}}
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import struct
+import time
+from collections import Counter
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", os.path.join(os.getenv("DATA_DIR", "/app/data"), "inference.sock"))
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "120"))
+INFERENCE_CONNECT_TIMEOUT = float(os.getenv("INFERENCE_CONNECT_TIMEOUT", "5"))
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+_HEADER = struct.Struct(">I")
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Dict:
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Trame trop grande : {size} octets")
+    return json.loads(await reader.readexactly(size))
+
+
+def encode_frame(message: Dict) -> bytes:
+    payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(payload)) + payload
+
+
+def read_shared_image(name: str, shape, dtype: str) -> np.ndarray:
+    """Copie l'image déposée par le client ; le segment reste la propriété du client, qui le libère."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Sans cela, le resource_tracker du serveur supprimerait le segment du client à l'arrêt
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    try:
+        # Copie privée : YOLO garde une référence à l'image d'origine dans ses résultats
+        return np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf).copy()
+    finally:
+        shm.close()
+
+
+class InferenceServer:
+    """Expose un InferenceEngine local sur une socket Unix."""
+
+    def __init__(self, engine=None, socket_path: str = INFERENCE_SOCKET):
+        if engine is None:
+            from inference import InferenceEngine
+            engine = InferenceEngine()
+        self.engine = engine
+        self.socket_path = socket_path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.connections = 0
+
+    async def start(self):
+        from registry import get_yolo
+
+        # Le modèle est chargé avant d'ouvrir la socket : un client connecté est servi sans délai
+        await asyncio.to_thread(get_yolo)
+        await self.engine.start()
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        print(f"[INFO] Serveur d'inférence à l'écoute sur {self.socket_path}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.engine.stop()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def reply(message: Dict):
+            async with write_lock:
+                writer.write(encode_frame(message))
+                await writer.drain()
+
+        async def serve(request: Dict):
+            request_id = request.get("id")
+            try:
+                if request.get("op") == "stats":
+                    stats = self.engine.get_stats(last=request.get("last", 20))
+                    stats["connections"] = self.connections
+                    await reply({"id": request_id, "stats": stats})
+                    return
+                if "shm" in request:
+                    image = await asyncio.to_thread(read_shared_image, request["shm"], request["shape"], request["dtype"])
+                else:
+                    image = request["path"]
+                detected = await self.engine.detect(image)
+                await reply({"id": request_id, "objects": dict(detected)})
+            except (ConnectionError, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                await reply({"id": request_id, "error": f"{type(e).__name__} - {str(e)}"})
+
+        try:
+            while True:
+                request = await read_frame(reader)
+                task = asyncio.create_task(serve(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Connexion au serveur d'inférence interrompue : {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.connections -= 1
+            writer.close()
+
+
+class InferenceClient:
+    """
+    Client du serveur d'inférence, avec la même interface que InferenceEngine
+    (start, stop, detect, stats). Une connexion par worker, multiplexée par identifiant.
+    """
+
+    def __init__(self, socket_path: str = INFERENCE_SOCKET, timeout: float = INFERENCE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._totals = {"requests": 0, "errors": 0, "round_trip_ms": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    async def start(self):
+        # La connexion est ouverte au premier appel : le serveur peut démarrer après le worker
+        self._connect_lock = self._connect_lock or asyncio.Lock()
+        self._write_lock = self._write_lock or asyncio.Lock()
+
+    async def stop(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        self._disconnect(RuntimeError("Client d'inférence arrêté"))
+
+    async def _connect(self):
+        await self.start()
+        async with self._connect_lock:
+            if self.running:
+                return
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_unix_connection(self.socket_path), INFERENCE_CONNECT_TIMEOUT
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                raise RuntimeError(f"Serveur d'inférence injoignable ({self.socket_path}) : {e}")
+            self._reader_task = asyncio.create_task(self._read_responses())
+
+    def _disconnect(self, error: Exception):
+        if self._writer:
+            self._writer.close()
+        self._reader = self._writer = self._reader_task = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _read_responses(self):
+        try:
+            while True:
+                response = await read_frame(self._reader)
+                future = self._pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Connexion au serveur d'inférence perdue : {e}")
+            self._disconnect(RuntimeError(f"Connexion au serveur d'inférence perdue : {e}"))
+
+    async def _call(self, message: Dict) -> Dict:
+        if not self.running:
+            await self._connect()
+        request_id = next(self._ids)
+        message["id"] = request_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            async with self._write_lock:
+                if self._writer is None:
+                    raise RuntimeError("Connexion au serveur d'inférence fermée")
+                self._writer.write(encode_frame(message))
+                await self._writer.drain()
+            response = await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+        if "error" in response:
+            raise RuntimeError(f"Erreur du serveur d'inférence : {response['error']}")
+        return response
+
+    async def detect(self, image) -> Counter:
+        """Soumet une image (tableau BGR ou chemin) au serveur et attend ses détections."""
+        started = time.perf_counter()
+        self._totals["requests"] += 1
+        if not isinstance(image, np.ndarray):
+            message = {"op": "detect", "path": str(image)}
+            shm = None
+        else:
+            image = np.ascontiguousarray(image)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+            np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+            message = {"op": "detect", "shm": shm.name, "shape": list(image.shape), "dtype": image.dtype.str}
+        try:
+            response = await self._call(message)
+        except Exception:
+            self._totals["errors"] += 1
+            raise
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._totals["round_trip_ms"] += (time.perf_counter() - started) * 1000
+        return Counter(response["objects"])
+
+    async def stats(self, last: int = 20) -> Dict:
+        requests = self._totals["requests"]
+        client = {
+            "socket": self.socket_path,
+            "connected": self.running,
+            "requests": requests,
+            "errors": self._totals["errors"],
+            "avg_round_trip_ms": round(self._totals["round_trip_ms"] / requests, 2) if requests else 0,
+        }
+        try:
+            server = (await self._call({"op": "stats", "last": last}))["stats"]
+        except Exception as e:
+            server = {"running": False, "error": str(e)}
+        return {"mode": "server", "client": client, **server}
+
+    async def ping(self) -> Dict:
+        """Joignabilité du serveur pour /ready, avec un délai court (INFERENCE_CONNECT_TIMEOUT)."""
+        try:
+            await asyncio.wait_for(self._call({"op": "stats", "last": 0}), INFERENCE_CONNECT_TIMEOUT)
+        except Exception as e:
+            return {"reachable": False, "socket": self.socket_path, "error": str(e) or type(e).__name__}
+        return {"reachable": True, "socket": self.socket_path}
+
+
+async def serve_forever():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = InferenceServer()
+    await server.start()
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    await stopped.wait()
+    print("[INFO] Arrêt du serveur d'inférence")
+    await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve_forever())
@@ -0,0 +1,69 @@
+"""
+Types de tâches exposés par /jobs. Chaque handler reçoit un JobContext et les paramètres
+de la tâche, publie sa progression et renvoie un résultat sérialisable en JSON.
+"""
+import asyncio
+from typing import Dict, List
+
+from describe import describe_objects
+from detections import analyze_document
+from image_io import download_image
+from jobs import JobContext, JobQueue
+from model_manager import ModelManager, MODEL_DOWNLOAD_CONCURRENCY
+from resume import resumer_stream
+from translate import translate_to_french
+
+
+async def resumer_job(ctx: JobContext, text: str, mode: str = "auto") -> Dict:
+    # Le flux de résumé fournit déjà la progression des morceaux en mode map-reduce
+    async for event in resumer_stream(text, mode):
+        if event["type"] == "progress":
+            ctx.progress(event["done"] / event["total"] * 90, f"Résumé des morceaux (niveau {event['level']})")
+        elif event["type"] == "done":
+            return {"summary": event["summary"], "mode": event["mode"], "model_used": event["model_used"]}
+        elif event["type"] == "error":
+            raise RuntimeError(event["message"])
+    raise RuntimeError("Résumé interrompu")
+
+
+async def translate_job(ctx: JobContext, text: str) -> Dict:
+    ctx.progress(0, "Traduction en cours")
+    return {"translated_text": await translate_to_french(text)}
+
+
+def describe_job_handler(manager: ModelManager):
+    async def describe_job(ctx: JobContext, image_urls: List[str], objects: List[str]) -> Dict:
+        done = 0
+
+        async def describe_one(url: str) -> Dict:
+            nonlocal done
+            try:
+                image = await download_image(url)
+                result = await describe_objects(image, objects, manager=manager, cleanup=True)
+            except Exception as e:
+                result = {"status": "error", "message": str(e), "description": None}
+            done += 1
+            ctx.progress(done / len(image_urls) * 100, f"{done}/{len(image_urls)} images décrites")
+            return {"image_url": url, **result}
+
+        # La concurrence réelle vers Ollama est bornée par le client (un créneau par modèle)
+        return {"images": await asyncio.gather(*(describe_one(url) for url in image_urls))}
+
+    return describe_job
+
+
+async def analyze_batch_job(ctx: JobContext, text: str, image_urls: List[str]) -> Dict:
+    def on_progress(done: int, total: int):
+        ctx.progress(done / total * 95, f"{done}/{total} images analysées")
+
+    return await analyze_document(text, image_urls, on_progress=on_progress)
+
+
+def register_job_handlers(queue: JobQueue, manager: ModelManager):
+    # Voie dédiée : plusieurs modèles en parallèle sans occuper les workers des autres tâches
+    queue.add_lane("downloads", MODEL_DOWNLOAD_CONCURRENCY)
+    queue.register("model_download", manager.run_download_job, priority=1, lane="downloads")
+    queue.register("translate", translate_job, priority=3)
+    queue.register("analyze_batch", analyze_batch_job, priority=3)
+    queue.register("describe", describe_job_handler(manager), priority=5)
+    queue.register("resumer", resumer_job, priority=5)
@@ -0,0 +1,511 @@
+"""
+Tâches longues asynchrones : résumé de longs textes, descriptions en série, téléchargement de modèles...
+
+submit() renvoie immédiatement un identifiant ; des workers asyncio consomment une file bornée
+à priorités (0 = la plus urgente) et publient progression, résultat ou erreur dans un magasin :
+
+    JOB_STORE=memory   état propre au processus (défaut)
+    JOB_STORE=sqlite   base SQLite (WAL) sous DATA_DIR, partagée par les workers uvicorn
+
+Une tâche s'exécute dans le processus qui l'a acceptée. Avec le magasin SQLite, une annulation
+demandée depuis un autre worker est enregistrée dans la base et relevée par le processus
+propriétaire, qui annule alors la tâche asyncio. Le propriétaire rafraîchit périodiquement
+l'horodatage (heartbeat) de ses tâches actives ; celles dont l'horodatage est trop ancien
+(processus arrêté, conteneur redémarré ou recréé) sont marquées en échec. Les accès au magasin
+SQLite se font dans io_pool, hors de la boucle d'événements.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from executors import io_pool
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+JOB_DB_PATH = os.getenv("JOB_DB", os.path.join(DATA_DIR, "jobs.sqlite"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(24 * 3600)))
+CANCEL_POLL_INTERVAL = float(os.getenv("JOB_CANCEL_POLL_INTERVAL", "0.5"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+# Tâche active sans heartbeat depuis ce délai : propriétaire considéré comme arrêté
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv("JOB_HEARTBEAT_TIMEOUT", str(6 * JOB_HEARTBEAT_INTERVAL)))
+
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+HOSTNAME = socket.gethostname()
+
+
+class JobQueueFull(Exception):
+    """La file des tâches est pleine : réessayer plus tard."""
+
+
+class JobAlreadyActive(Exception):
+    """Une tâche active porte déjà la même clé d'unicité (ex. téléchargement du même modèle)."""
+
+    def __init__(self, message: str, job_id: str):
+        super().__init__(message)
+        self.job_id = job_id
+
+
+class MemoryJobStore:
+    """État des tâches en mémoire, visible uniquement par ce processus."""
+
+    # Accès non bloquants : appelés directement depuis la boucle d'événements
+    blocking = False
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict):
+        with self._lock:
+            if job.get("unique_key"):
+                for other in self._jobs.values():
+                    if other.get("unique_key") == job["unique_key"] and other["status"] in ACTIVE_STATUSES:
+                        raise JobAlreadyActive(f"Tâche déjà active : {job['unique_key']}", other["id"])
+            self._jobs[job["id"]] = dict(job)
+
+    def update(self, job_id: str, **fields) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values()
+                    if (kind is None or job["kind"] == kind) and (status is None or job["status"] == status)]
+        jobs.sort(key=lambda job: job["created_at"], reverse=True)
+        return jobs[:limit]
+
+    def cancel_requested(self, job_ids: List[str]) -> List[str]:
+        with self._lock:
+            return [job_id for job_id in job_ids if self._jobs.get(job_id, {}).get("cancel_requested")]
+
+    def prune(self, older_than: float) -> int:
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in FINAL_STATUSES and (job["finished_at"] or 0) < older_than]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def heartbeat(self, owner: str, now: float) -> int:
+        return 0
+
+    def fail_orphans(self, stale_before: float) -> int:
+        # Tâches propres à ce processus : elles disparaissent avec lui
+        return 0
+
+
+class SQLiteJobStore:
+    """État des tâches dans SQLite : tous les workers voient et peuvent annuler toutes les tâches."""
+
+    blocking = True
+    _JSON_FIELDS = ("params", "result", "extra")
+    _COLUMNS = ("id", "kind", "status", "priority", "progress", "message", "params", "result", "error",
+                "extra", "owner", "cancel_requested", "created_at", "started_at", "finished_at", "unique_key",
+                "heartbeat_at")
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL,"
+            " progress REAL NOT NULL, message TEXT, params TEXT, result TEXT, error TEXT, extra TEXT,"
+            " owner TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._connect().execute("CREATE INDEX IF NOT EXISTS jobs_kind_created ON jobs (kind, created_at)")
+        columns = {row[1] for row in self._connect().execute("PRAGMA table_info(jobs)")}
+        if "unique_key" not in columns:
+            self._connect().execute("ALTER TABLE jobs ADD COLUMN unique_key TEXT")
+        if "heartbeat_at" not in columns:
+            self._connect().execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        # Au plus une tâche active par clé, garanti par la base même entre workers
+        self._connect().execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_unique ON jobs (unique_key)"
+            " WHERE unique_key IS NOT NULL AND status IN ('queued', 'running')"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _encode(self, fields: Dict) -> Dict:
+        encoded = dict(fields)
+        for name in self._JSON_FIELDS:
+            if name in encoded:
+                encoded[name] = json.dumps(encoded[name], ensure_ascii=False, default=str)
+        if "cancel_requested" in encoded:
+            encoded["cancel_requested"] = int(bool(encoded["cancel_requested"]))
+        return encoded
+
+    def _decode(self, row) -> Dict:
+        job = dict(zip(self._COLUMNS, row))
+        for name in self._JSON_FIELDS:
+            job[name] = json.loads(job[name]) if job[name] is not None else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def create(self, job: Dict):
+        encoded = self._encode(job)
+        columns = [column for column in self._COLUMNS if column in encoded]
+        try:
+            self._connect().execute(
+                f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [encoded[column] for column in columns],
+            )
+        except sqlite3.IntegrityError:
+            row = self._connect().execute(
+                "SELECT id FROM jobs WHERE unique_key = ? AND status IN ('queued', 'running')", (job.get("unique_key"),)
+            ).fetchone()
+            if row is None:
+                raise
+            raise JobAlreadyActive(f"Tâche déjà active : {job['unique_key']}", row[0])
+
+    def update(self, job_id: str, **fields) -> Optional[Dict]:
+        encoded = self._encode(fields)
+        assignments = ", ".join(f"{column} = ?" for column in encoded)
+        self._connect().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*encoded.values(), job_id])
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connect().execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def list(self, kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE 1 = 1"
+        args = []
+        if kind is not None:
+            query += " AND kind = ?"
+            args.append(kind)
+        if status is not None:
+            query += " AND status = ?"
+            args.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        return [self._decode(row) for row in self._connect().execute(query, args).fetchall()]
+
+    def cancel_requested(self, job_ids: List[str]) -> List[str]:
+        if not job_ids:
+            return []
+        rows = self._connect().execute(
+            f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({', '.join('?' for _ in job_ids)})", job_ids
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def prune(self, older_than: float) -> int:
+        return self._connect().execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINAL_STATUSES)}) AND finished_at < ?",
+            [*FINAL_STATUSES, older_than],
+        ).rowcount
+
+    def heartbeat(self, owner: str, now: float) -> int:
+        """Signale que le propriétaire de ces tâches actives est toujours en vie."""
+        return self._connect().execute(
+            f"UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})",
+            [now, owner, *ACTIVE_STATUSES],
+        ).rowcount
+
+    def fail_orphans(self, stale_before: float) -> int:
+        """Marque en échec les tâches actives dont le propriétaire n'a plus donné signe de vie."""
+        return self._connect().execute(
+            "UPDATE jobs SET status = 'failed', error = 'Processus propriétaire arrêté', message = 'Échec', finished_at = ?"
+            f" WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})"
+            " AND COALESCE(heartbeat_at, started_at, created_at) < ?",
+            [time.time(), *ACTIVE_STATUSES, stale_before],
+        ).rowcount
+
+
+def get_job_store(name: str = JOB_STORE):
+    if name == "sqlite":
+        try:
+            return SQLiteJobStore()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Magasin de tâches SQLite indisponible ({JOB_DB_PATH}), repli en mémoire : {e}")
+    return MemoryJobStore()
+
+
+class JobContext:
+    """Passé au handler : publication de la progression et test d'annulation."""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self.job_id = job_id
+        self._last_update = 0.0
+        self._last_progress = 0.0
+        self._last_message: Optional[str] = None
+        self._pending: Optional[Dict] = None
+        self._writer: Optional[asyncio.Future] = None
+
+    def progress(self, progress: Optional[float], message: Optional[str] = None, **extra):
+        """Progression en pourcentage (None : inchangée) ; écritures limitées à quelques-unes par seconde."""
+        progress = self._last_progress if progress is None else max(0.0, min(100.0, float(progress)))
+        now = time.monotonic()
+        if now - self._last_update < 0.25 and abs(progress - self._last_progress) < 1 and message == self._last_message:
+            return
+        self._last_update = now
+        self._last_progress = progress
+        self._last_message = message
+        fields = {"progress": round(progress, 2)}
+        if message is not None:
+            fields["message"] = message
+        if extra:
+            fields["extra"] = extra
+        # Écriture en tâche de fond : une seule à la fois, les mises à jour arrivées entre-temps sont fusionnées
+        self._pending = {**(self._pending or {}), **fields}
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        while self._pending:
+            fields, self._pending = self._pending, None
+            try:
+                await self._queue._store("update", self.job_id, **fields)
+            except Exception as e:
+                logger.warning(f"Progression de la tâche {self.job_id} non enregistrée : {e}")
+
+    async def drain(self):
+        """Attend la dernière écriture de progression, avant l'état final de la tâche."""
+        if self._writer is not None and not self._writer.done():
+            await asyncio.shield(self._writer)
+
+
+Handler = Callable[..., Awaitable]
+
+
+class JobQueue:
+    def __init__(self, store=None, workers: int = JOB_WORKERS, max_size: int = JOB_QUEUE_SIZE):
+        self.store = store or get_job_store()
+        self.max_size = max_size
+        self.owner = self._new_owner()
+        self._handlers: Dict[str, Dict] = {}
+        # Une file et des workers par voie : une voie lente (téléchargements) ne bloque pas les autres
+        self._lanes: Dict[str, int] = {"default": max(1, workers)}
+        self._queues: Dict[str, asyncio.PriorityQueue] = {}
+        self._sequence = itertools.count()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def _new_owner() -> str:
+        # Identifiant propre à ce démarrage : un PID réutilisé après redémarrage ne désigne pas le même propriétaire
+        return f"{HOSTNAME}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def _store(self, method: str, *args, **kwargs):
+        """Appel au magasin ; SQLite (bloquant) est appelé dans io_pool."""
+        fn = getattr(self.store, method)
+        if self.store.blocking:
+            return await io_pool.run(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    def add_lane(self, lane: str, workers: int):
+        self._lanes[lane] = max(1, workers)
+
+    def register(self, kind: str, handler: Handler, priority: int = 5, lane: str = "default"):
+        """handler(ctx, **params) -> résultat sérialisable en JSON."""
+        if lane not in self._lanes:
+            raise ValueError(f"Voie inconnue : {lane}")
+        self._handlers[kind] = {"handler": handler, "priority": priority, "lane": lane}
+
+    @property
+    def kinds(self) -> List[str]:
+        return sorted(self._handlers)
+
+    async def start(self):
+        if self._tasks:
+            return
+        # Après un fork (workers uvicorn), le propriétaire doit désigner ce processus
+        self.owner = self._new_owner()
+        self._queues = {lane: asyncio.PriorityQueue(maxsize=self.max_size) for lane in self._lanes}
+        await self._fail_orphans()
+        await self._store("prune", time.time() - JOB_RETENTION)
+        self._tasks = [asyncio.create_task(self._worker(self._queues[lane]))
+                       for lane, workers in self._lanes.items() for _ in range(workers)]
+        self._tasks.append(asyncio.create_task(self._watch_cancellations()))
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def _fail_orphans(self):
+        orphans = await self._store("fail_orphans", time.time() - JOB_HEARTBEAT_TIMEOUT)
+        if orphans:
+            logger.warning(f"{orphans} tâche(s) orpheline(s) marquée(s) en échec")
+
+    async def _heartbeat(self):
+        # Tâches de ce processus rafraîchies ; celles d'un propriétaire disparu sont relevées par les autres
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                await self._store("heartbeat", self.owner, time.time())
+                await self._fail_orphans()
+            except Exception as e:
+                logger.warning(f"Heartbeat des tâches impossible : {e}")
+
+    async def stop(self):
+        for task in list(self._running.values()) + self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._running.values(), return_exceptions=True)
+        self._tasks = []
+        # Les tâches encore en file ne seront jamais exécutées
+        for queue in self._queues.values():
+            while not queue.empty():
+                _, _, job_id = queue.get_nowait()
+                await self._store("update", job_id, status="cancelled", message="Service arrêté", finished_at=time.time())
+
+    async def submit(self, kind: str, params: Optional[Dict] = None, priority: Optional[int] = None,
+                     unique_key: Optional[str] = None) -> Dict:
+        """
+        Enregistre une tâche et la met en file ; lève JobQueueFull si la file est pleine et
+        JobAlreadyActive si une tâche active (de n'importe quel worker) porte la même unique_key.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Type de tâche inconnu : {kind} (disponibles : {', '.join(self.kinds)})")
+        queue = self._queues.get(self._handlers[kind]["lane"])
+        if queue is None:
+            raise RuntimeError("File des tâches non démarrée")
+        if queue.full():
+            raise JobQueueFull(f"File des tâches pleine ({self.max_size})")
+        priority = self._handlers[kind]["priority"] if priority is None else priority
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "priority": priority,
+            "progress": 0.0,
+            "message": "En attente",
+            "params": params or {},
+            "result": None,
+            "error": None,
+            "extra": None,
+            "owner": self.owner,
+            "cancel_requested": False,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "unique_key": unique_key,
+            "heartbeat_at": time.time(),
+        }
+        await self._store("create", job)
+        try:
+            queue.put_nowait((priority, next(self._sequence), job["id"]))
+        except asyncio.QueueFull:
+            # File remplie pendant l'enregistrement
+            await self._store("update", job["id"], status="cancelled", message="File pleine", finished_at=time.time())
+            raise JobQueueFull(f"File des tâches pleine ({self.max_size})")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self._store("get", job_id)
+
+    async def list(self, kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        return await self._store("list", kind=kind, status=status, limit=limit)
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        """Annule une tâche en file ou en cours, quel que soit le worker qui l'exécute."""
+        job = await self._store("get", job_id)
+        if job is None or job["status"] in FINAL_STATUSES:
+            return job
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            return await self._store("update", job_id, cancel_requested=True, message="Annulation en cours")
+        if job["status"] == "queued" and job["owner"] == self.owner:
+            # Pas encore démarrée ici : le worker l'ignorera en la retirant de la file
+            return await self._store("update", job_id, status="cancelled", cancel_requested=True,
+                                     message="Annulée avant démarrage", finished_at=time.time())
+        # Tâche d'un autre worker : il relèvera la demande
+        return await self._store("update", job_id, cancel_requested=True, message="Annulation demandée")
+
+    async def _worker(self, queue: asyncio.PriorityQueue):
+        while True:
+            _, _, job_id = await queue.get()
+            try:
+                job = await self._store("get", job_id)
+                if job is None or job["status"] != "queued" or job["cancel_requested"]:
+                    if job is not None and job["status"] == "queued":
+                        await self._store("update", job_id, status="cancelled", message="Annulée avant démarrage",
+                                          finished_at=time.time())
+                    continue
+                task = asyncio.create_task(self._execute(job))
+                self._running[job_id] = task
+                try:
+                    await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    # Annulation de la tâche elle-même (et non du worker) : on passe à la suivante
+                    if not task.cancelled():
+                        raise
+                finally:
+                    self._running.pop(job_id, None)
+            finally:
+                queue.task_done()
+
+    async def _execute(self, job: Dict):
+        job_id = job["id"]
+        await self._store("update", job_id, status="running", message="En cours", started_at=time.time())
+        handler = self._handlers[job["kind"]]["handler"]
+        ctx = JobContext(self, job_id)
+        try:
+            result = await handler(ctx, **job["params"])
+        except asyncio.CancelledError:
+            await ctx.drain()
+            await self._store("update", job_id, status="cancelled", message="Tâche annulée", finished_at=time.time())
+            raise
+        except Exception as e:
+            logger.error(f"Tâche {job['kind']} {job_id} en échec : {type(e).__name__} - {str(e)}")
+            await ctx.drain()
+            await self._store("update", job_id, status="failed", error=f"{type(e).__name__} - {str(e)}",
+                              message="Échec", finished_at=time.time())
+            return
+        await ctx.drain()
+        await self._store("update", job_id, status="completed", progress=100.0, result=result,
+                          message="Terminé", finished_at=time.time())
+
+    async def _watch_cancellations(self):
+        while True:
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+            try:
+                for job_id in await self._store("cancel_requested", list(self._running)):
+                    task = self._running.get(job_id)
+                    if task is not None and not task.done():
+                        task.cancel()
+            except Exception as e:
+                logger.warning(f"Lecture des annulations impossible : {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "store": type(self.store).__name__,
+            "lanes": {lane: {"workers": workers, "queued": self._queues[lane].qsize() if lane in self._queues else 0}
+                      for lane, workers in self._lanes.items()},
+            "running": len(self._running),
+            "max_size": self.max_size,
+            "kinds": self.kinds,
+        }
+
+
+# File partagée par les endpoints du worker
+job_queue = JobQueue()
@@ -0,0 +1,175 @@
+"""
+Lexique français précalculé des classes YOLO (traduction + synonymes WordNet traduits).
+
+Le lexique est construit une fois hors ligne :
+    python lexicon.py build
+puis chargé au démarrage. Les libellés inconnus du lexique passent par une traduction
+de repli mise en cache (LRU) dans le processus.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Set
+
+from deep_translator import GoogleTranslator
+
+from metrics import stage
+from registry import get_wordnet, get_yolo
+
+logger = logging.getLogger(__name__)
+
+LEXICON_PATH = os.getenv("LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon_fr.json"))
+LEXICON_VERSION = 1
+FALLBACK_CACHE_SIZE = int(os.getenv("LEXICON_FALLBACK_CACHE_SIZE", "4096"))
+
+translator = GoogleTranslator(source='en', target='fr')
+
+
+def english_synonyms(obj: str) -> Set[str]:
+    """Synonymes anglais d'un objet via WordNet (noms uniquement, hors personnes/groupes)."""
+    wordnet = get_wordnet()
+    synonyms = set()
+    for syn in wordnet.synsets(obj, pos=wordnet.NOUN):
+        if "person" in syn.lexname() or "group" in syn.lexname():
+            continue
+        for lemma in syn.lemmas():
+            word = lemma.name().replace("_", " ").lower()
+            if word.isalpha():
+                synonyms.add(word)
+    synonyms.add(obj)  # inclure l’objet lui-même
+    return synonyms
+
+
+@lru_cache(maxsize=FALLBACK_CACHE_SIZE)
+def _translate_cached(word: str) -> str:
+    with stage("label_translation"):
+        translated = translator.translate(word)
+    if not translated:
+        raise ValueError(f"Traduction vide pour '{word}'")
+    return translated.lower()
+
+
+class TranslationError(RuntimeError):
+    pass
+
+
+def translate_word(word: str, strict: bool = False) -> str:
+    """
+    Traduit un mot en français. En cas d'échec le mot original est conservé (et non mis en cache),
+    sauf si strict : TranslationError est levée, pour ne pas écrire de mot anglais dans le lexique.
+    """
+    try:
+        return _translate_cached(word)
+    except Exception as e:
+        if strict:
+            raise TranslationError(f"Traduction impossible pour '{word}' : {e}") from e
+        logger.warning(f"Traduction impossible pour '{word}' : {e}")
+        return word
+
+
+def build_entry(obj: str, strict: bool = False) -> Dict:
+    synonyms = {translate_word(word, strict) for word in english_synonyms(obj)}
+    return {"label": translate_word(obj, strict), "synonyms": sorted(synonyms)}
+
+
+def build_lexicon(labels: Iterable[str]) -> Dict:
+    """Lexique complet ; lève TranslationError si une seule traduction échoue (hors ligne, quota...)."""
+    entries = {}
+    for label in sorted({label.lower() for label in labels}):
+        entries[label] = build_entry(label, strict=True)
+        logger.info(f"Lexique : {label} -> {entries[label]['label']} ({len(entries[label]['synonyms'])} synonymes)")
+    return {"version": LEXICON_VERSION, "source": "en", "target": "fr", "entries": entries}
+
+
+def save_lexicon(lexicon: Dict, path: str = LEXICON_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(lexicon, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class Lexicon:
+    """Accès en lecture au lexique, avec repli sur la traduction à la demande."""
+
+    def __init__(self, entries: Optional[Dict] = None):
+        self.entries = entries or {}
+        self._fallback_lock = threading.Lock()
+        self._fallback_entries: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, path: str = LEXICON_PATH) -> "Lexicon":
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logger.warning(f"Lexique introuvable ({path}) : toutes les traductions passeront par le repli en ligne")
+            return cls()
+        if data.get("version") != LEXICON_VERSION:
+            logger.warning(f"Version de lexique inattendue dans {path} : {data.get('version')}")
+        entries = data.get("entries", {})
+        logger.info(f"Lexique chargé : {len(entries)} classes depuis {path}")
+        return cls(entries)
+
+    def __contains__(self, obj: str) -> bool:
+        return obj.lower() in self.entries
+
+    def _entry(self, obj: str) -> Dict:
+        obj = obj.lower()
+        entry = self.entries.get(obj)
+        if entry is not None:
+            return entry
+        with self._fallback_lock:
+            entry = self._fallback_entries.get(obj)
+        if entry is None:
+            entry = build_entry(obj)
+            with self._fallback_lock:
+                if len(self._fallback_entries) >= FALLBACK_CACHE_SIZE:
+                    self._fallback_entries.pop(next(iter(self._fallback_entries)))
+                self._fallback_entries[obj] = entry
+        return entry
+
+    def translate_label(self, obj: str) -> str:
+        return self._entry(obj)["label"]
+
+    def synonyms(self, obj: str) -> Set[str]:
+        return set(self._entry(obj)["synonyms"])
+
+
+_lexicon: Optional[Lexicon] = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon() -> Lexicon:
+    """Lexique du processus, chargé une seule fois."""
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = Lexicon.load()
+    return _lexicon
+
+
+def main(argv: list) -> int:
+    if len(argv) < 2 or argv[1] != "build":
+        print("Usage : python lexicon.py build [chemin_sortie]")
+        return 1
+    logging.basicConfig(level=logging.INFO)
+    model, _ = get_yolo()
+
+    path = argv[2] if len(argv) > 2 else LEXICON_PATH
+    try:
+        lexicon = build_lexicon(model.names.values())
+    except TranslationError as e:
+        # Pas de lexique partiel : le build Docker échoue plutôt que de livrer des libellés anglais
+        print(f"Échec de la construction du lexique, rien n'est écrit : {e}", file=sys.stderr)
+        return 1
+    save_lexicon(lexicon, path)
+    print(f"Lexique écrit dans {path} ({len(lexicon['entries'])} classes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
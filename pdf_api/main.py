@@ -1,17 +1,37 @@
 from fastapi import FastAPI, HTTPException, Body
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Literal, Optional, Dict
-import requests
 import asyncio
+import json
+import os
 
-from objects import download_image_from_url, count_object_occurrences
-from describe import describe_objects
-from resume import resumer
+from objects import summarize_occurrences, document_mentions
+from image_io import download_image, ImageTooLarge
+from inference import inference_engine, INFERENCE_MODE
+from detections import analyze_document, detect_url, detection_cache, detect_flight, url_flight, get_stats as detection_stats
+from registry import warm_up, readiness
+from extraction import download_pdf, validate_pdf
+from executors import cpu_pool, io_pool, loop_lag, PoolSaturated, shutdown_executors, get_stats as executor_stats
+from pdf_pipeline import process_pdf, stored_document
+from document_store import document_store
+from text_index import text_index
+from image_sink import IMAGE_STORE_DIR, IMAGES_ROUTE
+from describe import describe_objects, describe_objects_stream, describe_flight
+from image_preprocess import vision_image_cache, preprocess_flight, get_stats as preprocess_stats
+from resume import resumer, resumer_stream
 from translate import translate_to_french
 from model_manager import ModelManager
+from model_catalog import model_catalog
+from jobs import job_queue, JobQueueFull
+from job_handlers import register_job_handlers
 from run_model import run_model
+from ollama_client import ollama_client
+from result_cache import llm_cache, make_key
+from singleflight import SingleFlight
+import metrics
 
 app = FastAPI(title="Analyse Objet-Texte")
 
@@ -24,44 +44,283 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Durée, statut et requêtes en cours par route, exposés sur /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Images extraites des PDF (magasin local adressé par contenu)
+app.mount(IMAGES_ROUTE, StaticFiles(directory=IMAGE_STORE_DIR, check_dir=False), name="images")
+
+describe_url_flight = SingleFlight("describe_url")
+
+cache_lookups = metrics.registry.counter("pdf_api_cache_lookups_total", "Consultations des caches de résultats", ("cache", "result"))
+cache_entries = metrics.registry.gauge("pdf_api_cache_entries", "Entrées en mémoire des caches de résultats", ("cache",))
+single_flight_calls = metrics.registry.counter("pdf_api_single_flight_calls_total", "Appels regroupés par clé", ("flight", "outcome"))
+jobs_queued = metrics.registry.gauge("pdf_api_jobs_queued", "Tâches /jobs en attente", ("lane",))
+jobs_running = metrics.registry.gauge("pdf_api_jobs_running", "Tâches /jobs en cours")
+inference_queued = metrics.registry.gauge("pdf_api_inference_queued", "Images en attente d'un lot YOLO (mode local)")
+
+def collect_service_metrics():
+    for name, cache in (("llm", llm_cache), ("detection", detection_cache), ("vision_image", vision_image_cache)):
+        # Compteurs en mémoire seulement : pas de requête SQLite pendant le rendu de /metrics
+        stats = cache.stats(disk=False)
+        cache_lookups.set(stats["hits"], cache=name, result="hit")
+        cache_lookups.set(stats["disk_hits"], cache=name, result="disk_hit")
+        cache_lookups.set(stats["misses"], cache=name, result="miss")
+        cache_entries.set(stats["entries"], cache=name)
+    for flight in (detect_flight, url_flight, describe_flight, describe_url_flight, preprocess_flight):
+        stats = flight.stats()
+        single_flight_calls.set(stats["calls"] - stats["shared"], flight=flight.name, outcome="executed")
+        single_flight_calls.set(stats["shared"], flight=flight.name, outcome="shared")
+    queue_stats = job_queue.stats()
+    for lane, lane_stats in queue_stats["lanes"].items():
+        jobs_queued.set(lane_stats["queued"], lane=lane)
+    jobs_running.set(queue_stats["running"])
+    if hasattr(inference_engine, "get_stats"):
+        inference_queued.set(inference_engine.get_stats(last=0)["queued"])
+
+metrics.registry.add_collector(collect_service_metrics)
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request, exc: PoolSaturated):
+    # Contre-pression : le client réessaie plutôt que d'allonger la file du worker
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 class AnalysisRequest(BaseModel):
     image_url: str
+    text: Optional[str] = None
+    # SHA-256 d'un PDF traité par /pdf/process : mentions lues dans l'index au lieu de text
+    document_id: Optional[str] = None
+
+class MentionsRequest(BaseModel):
+    objects: List[str] = []
+    # Synonymes fournis par l'appelant (objet -> synonymes) ; sinon ceux du lexique
+    synonyms: Dict[str, List[str]] = {}
+    document_ids: Optional[List[str]] = None
+
+class BatchAnalysisRequest(BaseModel):
     text: str
+    image_urls: List[str]
 
 class DescribeRequest(BaseModel):
     image_url: str
     objects: List[str]
+    stream: bool = False
+    stream_format: Literal["ndjson", "sse"] = "ndjson"
+
+class PdfProcessRequest(BaseModel):
+    pdf_url: str
+    detect_objects: bool = True
+
+def stream_response(events, stream_format: str = "ndjson", on_close=None) -> StreamingResponse:
+    """
+    Diffuse un itérateur asynchrone d'événements, en NDJSON (une ligne JSON par événement)
+    ou en Server-Sent Events (champ "type" de l'événement utilisé comme nom d'événement SSE).
+    """
+    async def body():
+        try:
+            async for event in events:
+                data = json.dumps(event, ensure_ascii=False)
+                if stream_format == "sse":
+                    yield f"event: {event.get('type', 'message')}\ndata: {data}\n\n"
+                else:
+                    yield data + "\n"
+        finally:
+            if on_close:
+                on_close()
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache"})
 
 # Initialisation du gestionnaire de modèles
 model_manager = ModelManager()
 
-# Définir un modèle par défaut au démarrage
-@app.on_event("startup")
-async def startup_event():
+# Tâches longues (résumés, descriptions en série, téléchargements de modèles) exécutées via /jobs
+register_job_handlers(job_queue, model_manager)
+
+# Préchauffage des modèles en arrière-plan (désactivable : chargement au premier usage)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+# En mode serveur, YOLO (et WordNet, inutile une fois le lexique construit) ne sont pas chargés par les workers
+WORKER_RESOURCES = ("lexicon",) if INFERENCE_MODE == "server" else ("lexicon", "wordnet", "yolo")
+background_tasks = set()
+startup_state = {"models_initialized": False}
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def init_ollama_models():
     try:
-        models = model_manager.list_available_models()
+        models = await model_manager.list_available_models()
         if models:
-            default_model = next((m["name"] for m in models if "llava" in m["name"]), models[0]["name"])
-            model_manager.set_active_model(default_model)
-            print(f"Modèle par défaut défini : {default_model}")
-            run_model(default_model, options={"keep_alive": -1})
+            # Le modèle actif est partagé : un worker qui (re)démarre ne remplace pas le choix courant
+            default_model = model_manager.get_active_model()
+            if default_model not in [m["name"] for m in models]:
+                default_model = next((m["name"] for m in models if "llava" in m["name"]), models[0]["name"])
+                await model_manager.set_active_model(default_model)
+                print(f"Modèle par défaut défini : {default_model}")
+            await run_model(default_model, keep_alive=-1)
             print(f"Préchargement du modèle Mistral pour le résumé")
-            run_model("mistral", options={"keep_alive": -1})
+            await run_model("mistral", keep_alive=-1)
     except Exception as e:
         print(f"Erreur lors de l'initialisation des modèles : {str(e)}")
+    finally:
+        startup_state["models_initialized"] = True
+
+@app.on_event("startup")
+async def startup_event():
+    await loop_lag.start()
+    await metrics.registry.start()
+    await ollama_client.start()
+    await model_catalog.start()
+    await inference_engine.start()
+    await job_queue.start()
+    # Aucun chargement bloquant ici : le worker répond à /health immédiatement
+    if WARMUP_ON_STARTUP:
+        run_in_background(warm_up(WORKER_RESOURCES))
+    run_in_background(init_ollama_models())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in list(background_tasks):
+        task.cancel()
+    await job_queue.stop()
+    await inference_engine.stop()
+    await model_catalog.stop()
+    shutdown_executors()
+    await ollama_client.close()
+    await loop_lag.stop()
+    await metrics.registry.stop()
 
 @app.post("/analyze")
 async def analyze(request: AnalysisRequest):
+    if request.document_id:
+        if text_index is None or not await io_pool.run(text_index.has_document, request.document_id.lower()):
+            raise HTTPException(status_code=404, detail="Document absent de l'index de texte : le traiter d'abord avec /pdf/process")
+    elif request.text is None:
+        raise HTTPException(status_code=400, detail="Champ 'text' ou 'document_id' requis")
+    # Admission à l'entrée : une fois la détection faite, le croisement avec le texte attend son tour
+    cpu_pool.check()
     try:
-        image_path = await download_image_from_url(request.image_url)
-        result = count_object_occurrences(
-            image_paths=[image_path],
-            texts=[request.text]
+        # Téléchargement partagé entre requêtes concurrentes pour la même URL, détection
+        # mise en cache par hash d'image, puis moteur de micro-lots
+        detected = await detect_url(request.image_url)
+        result = await cpu_pool.run(
+            summarize_occurrences,
+            detections=[detected],
+            texts=[request.text or ""],
+            document_ids=[request.document_id.lower()] if request.document_id else None
         )
         return result
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse : {str(e)}")
 
+# Analyse d'un document entier : bornes sur le nombre d'images et les téléchargements simultanés
+ANALYZE_BATCH_MAX_IMAGES = int(os.getenv("ANALYZE_BATCH_MAX_IMAGES", "200"))
+ANALYZE_BATCH_DOWNLOADS = int(os.getenv("ANALYZE_BATCH_DOWNLOADS", "8"))
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyse toutes les images d'un document en un seul appel : téléchargements concurrents
+    bornés, détection par micro-lots, puis un seul calcul des synonymes et un seul parcours
+    du texte. Une image en échec n'invalide pas les autres.
+    """
+    if not request.image_urls:
+        raise HTTPException(status_code=400, detail="La liste 'image_urls' est vide")
+    if len(request.image_urls) > ANALYZE_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Trop d'images : {len(request.image_urls)} (max {ANALYZE_BATCH_MAX_IMAGES})")
+    cpu_pool.check()
+
+    try:
+        return await analyze_document(request.text, request.image_urls, max_downloads=ANALYZE_BATCH_DOWNLOADS)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse : {str(e)}")
+
+@app.get("/analyze/stats")
+async def analyze_stats():
+    """
+    Statistiques des micro-lots du moteur d'inférence YOLO
+    (celles du serveur d'inférence partagé en mode INFERENCE_MODE=server)
+    """
+    return await inference_engine.stats()
+
+@app.post("/pdf/process")
+async def pdf_process(request: PdfProcessRequest):
+    """
+    Extrait un PDF et diffuse en NDJSON le résultat de chaque page dès qu'il est prêt
+    (texte, URLs des images, objets détectés), puis un événement final "done".
+    """
+    # Refus avant le téléchargement : une fois le flux commencé, les pages attendent le pool
+    cpu_pool.check()
+    try:
+        pdf_path = await download_pdf(request.pdf_url)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Échec du téléchargement du PDF : {str(e)}")
+
+    def cleanup():
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+
+    # Validation avant le flux : une fois la réponse commencée, le statut 200 est déjà envoyé
+    try:
+        await cpu_pool.run(validate_pdf, pdf_path)
+    except ValueError as e:
+        cleanup()
+        raise HTTPException(status_code=422, detail=str(e))
+    except BaseException:
+        cleanup()
+        raise
+
+    return stream_response(process_pdf(pdf_path, detect=request.detect_objects), on_close=cleanup)
+
+@app.get("/pdf/documents/{document_hash}")
+async def pdf_document(document_hash: str, detect_objects: bool = True):
+    """
+    Résultat d'un PDF déjà traité par /pdf/process, recherché par le SHA-256 du fichier
+    """
+    document = await stored_document(document_hash.lower(), detect=detect_objects)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document inconnu ou résultats incomplets")
+    return document
+
+@app.post("/index/mentions")
+async def index_mentions(request: MentionsRequest):
+    """
+    Mentions d'objets (par leurs synonymes) dans un ou plusieurs documents indexés, ou dans tous
+    si document_ids est absent : totaux, par document et par page, sans relire le texte
+    """
+    if text_index is None:
+        raise HTTPException(status_code=503, detail="Index de texte désactivé")
+    if not request.objects and not request.synonyms:
+        raise HTTPException(status_code=400, detail="Champ 'objects' ou 'synonyms' requis")
+    cpu_pool.check()
+    document_ids = [doc_id.lower() for doc_id in request.document_ids] if request.document_ids is not None else None
+    try:
+        return await cpu_pool.run(document_mentions, request.objects, document_ids, request.synonyms)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche dans l'index : {str(e)}")
+
+@app.get("/index/stats")
+async def index_stats():
+    """
+    Index de texte des documents : documents complets, entrées de l'index
+    """
+    if text_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **await io_pool.run(text_index.stats)}
+
+@app.get("/pdf/store/stats")
+async def pdf_store_stats():
+    """
+    Magasin des résultats de documents : documents et pages enregistrés, pages reprises ou recalculées
+    """
+    if document_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **await io_pool.run(document_store.stats)}
+
 @app.post("/describe")
 async def describe(request: DescribeRequest):
     """
@@ -79,19 +338,38 @@ async def describe(request: DescribeRequest):
         if not current_model:
             raise HTTPException(status_code=400, detail="Aucun modèle actif défini. Veuillez définir un modèle via /models/set.")
 
-        # Télécharger l'image
-        try:
-            image_path = await download_image_from_url(request.image_url)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Échec du téléchargement de l'image : {str(e)}")
-
-        # Générer la description
-        description = await describe_objects(
-            image_path=image_path,
-            objects=request.objects,
-            manager=model_manager,
-            cleanup=True
-        )
+        async def download():
+            try:
+                return await download_image(request.image_url)
+            except ImageTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Échec du téléchargement de l'image : {str(e)}")
+
+        # Mode streamé : les fragments sont relayés dès leur réception depuis Ollama
+        if request.stream:
+            image = await download()
+            return stream_response(
+                describe_objects_stream(image, request.objects, manager=model_manager, cleanup=True),
+                request.stream_format
+            )
+
+        async def download_and_describe():
+            image = await download()
+            # close() est idempotent : le tampon est libéré dans tous les cas
+            try:
+                return await describe_objects(
+                    image=image,
+                    objects=request.objects,
+                    manager=model_manager,
+                    cleanup=True
+                )
+            finally:
+                image.close()
+
+        # Requêtes identiques concurrentes (même URL, objets et modèle) : un seul téléchargement et un seul appel
+        flight_key = make_key("describe_url", url=request.image_url, objects=request.objects, model=current_model)
+        description = await describe_url_flight.do(flight_key, download_and_describe)
 
         # Vérifier le résultat
         if description["status"] == "error":
@@ -105,20 +383,29 @@ async def describe(request: DescribeRequest):
         raise HTTPException(status_code=500, detail=f"Erreur inattendue : {type(e).__name__} - {str(e)}")
     
 @app.post("/resumer")
-def get_resumer(body: dict = Body(...)):
+async def get_resumer(body: dict = Body(...)):
     text = body.get("text")
     if not text:
         return JSONResponse(status_code=400, content={"error": "Missing text"})
-    summary = resumer(text)
+    mode = body.get("mode", "auto")
+    if mode not in ("auto", "single", "map_reduce"):
+        return JSONResponse(status_code=400, content={"error": "mode must be 'auto', 'single' or 'map_reduce'"})
+    if body.get("stream"):
+        stream_format = body.get("stream_format", "ndjson")
+        if stream_format not in ("ndjson", "sse"):
+            return JSONResponse(status_code=400, content={"error": "stream_format must be 'ndjson' or 'sse'"})
+        return stream_response(resumer_stream(text, mode), stream_format)
+    summary = await resumer(text, mode)
     return {"summary": summary}
 
 @app.post("/translate")
-def translate(body: dict = Body(...)):
+async def translate(body: dict = Body(...)):
+    io_pool.check()
     try:
         text = body.get("text")
         if not isinstance(text, str) or not text.strip():
             raise HTTPException(status_code=400, detail="Le champ 'text' doit être une chaîne non vide")
-        translated_text = translate_to_french(text)
+        translated_text = await translate_to_french(text)
         return {"translated_text": translated_text}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -126,9 +413,78 @@ def translate(body: dict = Body(...)):
         raise HTTPException(status_code=500, detail=f"Erreur lors de la traduction : {str(e)}")
 
 @app.get("/health")
-def health_check():
-    manager = ModelManager()
-    return {"status": "healthy", "ollama_connection": "ok"}
+async def health_check():
+    """
+    Vivacité du processus et sonde Ollama réelle (mise en cache quelques secondes) ;
+    toujours 200 : une panne d'Ollama rend le service dégradé, pas le worker défaillant.
+    """
+    ollama = await ollama_client.health()
+    return {
+        "status": "healthy" if ollama["status"] == "ok" else "degraded",
+        "ollama_connection": ollama["status"],
+        "ollama": ollama
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Métriques au format texte Prometheus, agrégées sur les workers du conteneur
+    """
+    # Collecteurs exécutés dans la boucle : ils lisent l'état des pools, files et caches du worker ;
+    # lecture des instantanés des autres workers et agrégation dans io_pool
+    snapshot = metrics.registry.snapshot()
+    text = await io_pool.run(metrics.registry.render, snapshot)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+async def ready_check():
+    """
+    Disponibilité : modèles chargés, initialisation Ollama terminée et, en mode
+    INFERENCE_MODE=server, serveur d'inférence joignable (503 sinon).
+    Distinct de /health, qui indique seulement que le processus répond.
+    """
+    state = readiness(WORKER_RESOURCES)
+    state["models_initialized"] = startup_state["models_initialized"]
+    state["ready"] = state["ready"] and state["models_initialized"]
+    if INFERENCE_MODE == "server":
+        # Sonde réelle du serveur partagé : arrêté, il rend tous les workers indisponibles
+        probe = await inference_engine.ping()
+        state["inference_server"] = probe["reachable"]
+        if not probe["reachable"]:
+            state["inference_server_error"] = probe["error"]
+        state["ready"] = state["ready"] and state["inference_server"]
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Compteurs du cache des résultats LLM / traduction (hits, misses, évictions, taille)
+    """
+    return await io_pool.run(llm_cache.stats)
+
+@app.get("/executors/stats")
+async def executors_stats():
+    """
+    Pools CPU (processus) et E/S (threads) : occupation, file, refus ; retard de la boucle d'événements
+    """
+    return executor_stats()
+
+@app.get("/analyze/cache/stats")
+async def detection_cache_stats():
+    """
+    Cache des détections par hash d'image et regroupement des requêtes identiques en cours
+    """
+    stats = await io_pool.run(detection_stats)
+    stats["single_flight"]["describe"] = describe_flight.stats()
+    stats["single_flight"]["describe_url"] = describe_url_flight.stats()
+    return stats
+
+@app.get("/describe/preprocess/stats")
+async def describe_preprocess_stats():
+    """
+    Préparation des images pour le modèle de vision : octets économisés, cache, durées comparées
+    """
+    return await io_pool.run(preprocess_stats)
 
 @app.get("/models/available")
 async def get_available_models():
@@ -136,7 +492,7 @@ async def get_available_models():
     Récupère la liste des modèles disponibles
     """
     try:
-        models = model_manager.list_available_models()
+        models = await model_manager.list_available_models()
         return {"status": "success", "models": models}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -154,13 +510,34 @@ async def get_current_model():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/models/events")
+async def model_events(stream_format: Literal["ndjson", "sse"] = "sse"):
+    """
+    Notifications de changement du modèle actif, quel que soit le worker qui l'a modifié
+    """
+    queue = model_catalog.subscribe()
+
+    async def events():
+        yield {"type": "active_model", "previous": None, "model": model_catalog.get_active_model(), "at": None}
+        while True:
+            yield await queue.get()
+
+    return stream_response(events(), stream_format, on_close=lambda: model_catalog.unsubscribe(queue))
+
+@app.get("/models/catalog/stats")
+async def model_catalog_stats():
+    """
+    Cache de la liste des modèles Ollama (âge, rafraîchissements, erreurs)
+    """
+    return model_catalog.stats()
+
 @app.post("/models/set/{model_name}")
 async def set_model(model_name: str):
     """
     Définit le modèle actif
     """
     try:
-        result = model_manager.set_active_model(model_name)
+        result = await model_manager.set_active_model(model_name)
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result["message"])
         return result
@@ -176,39 +553,78 @@ async def download_model(body: dict = Body(...)):
     if not model_name:
         raise HTTPException(status_code=400, detail="Le nom du modèle est requis")
     try:
-        result = model_manager.download_model(model_name)
+        result = await model_manager.download_model(model_name)
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result["message"])
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 @app.get("/models/download-status")
-async def download_status():
-    status = model_manager.get_download_status()
-    return status
+async def download_status(job_id: Optional[str] = None):
+    """
+    Statut d'un téléchargement (le plus récent si job_id est omis) ; détail complet via /jobs/{job_id}
+    """
+    return await model_manager.get_download_status(job_id)
+
+@app.get("/models/downloads")
+async def list_downloads(active: bool = False):
+    """
+    Téléchargements par modèle : progression en octets, débit, temps restant
+    """
+    return {"downloads": await model_manager.list_downloads(active_only=active)}
+
 @app.post("/models/cancel-download")
-async def cancel_model_download():
+async def cancel_model_download(job_id: Optional[str] = None):
     """
-    Annule le téléchargement en cours
+    Annule le téléchargement en cours (ou celui de la tâche job_id)
     """
-    result = model_manager.cancel_download()
+    result = await model_manager.cancel_download(job_id)
     return result
 
-@app.get("/models/download-status")
-async def get_download_status():
+class JobRequest(BaseModel):
+    kind: str
+    params: Dict = {}
+    priority: Optional[int] = None
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
     """
-    Récupère le statut du téléchargement en cours
+    Soumet une tâche longue (resumer, translate, describe, analyze_batch, model_download) ;
+    la réponse contient l'identifiant à interroger sur /jobs/{job_id}
     """
-    status = model_manager.get_download_status()
-    return status
+    try:
+        job = await job_queue.submit(request.kind, request.params, request.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job["id"], "status": job["status"]}
+
+@app.get("/jobs")
+async def list_jobs(kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+    return {"jobs": await job_queue.list(kind=kind, status=status, limit=limit), "queue": job_queue.stats()}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche introuvable")
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche introuvable")
+    return job
 
 @app.post("/models/run/{model_name}")
-def execute_model(model_name: str):
+async def execute_model(model_name: str):
     """
     Exécute un modèle spécifique
     """
     try:
-        response_text = run_model(model_name)
+        response_text = await run_model(model_name)
         return {"status": "success", "response": response_text}
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
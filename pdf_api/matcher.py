@@ -0,0 +1,162 @@
+"""
+Recherche multi-motifs en une seule passe pour compter les mentions d'objets dans un texte.
+
+Les synonymes sont normalisés (minuscules, accents retirés), déclinés au pluriel et compilés
+en une expression régulière structurée en trie : le texte est parcouru une seule fois et
+seuls les mots entiers sont comptés ("chat" ne correspond plus dans "achat").
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _build_fold_table() -> str:
+    # Table indexée par point de code (plus rapide qu'un dict pour str.translate)
+    table = [chr(code) for code in range(0x2020)]
+    for code in range(0xC0, 0x250):
+        char = chr(code)
+        decomposed = unicodedata.normalize("NFD", char)
+        base = "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+        if len(base) == 1:
+            table[code] = base
+    # Apostrophes typographiques fréquentes dans les PDF ("l’avion")
+    table[ord("’")] = "'"
+    table[ord("‘")] = "'"
+    return "".join(table)
+
+
+_FOLD_TABLE = _build_fold_table()
+
+
+def fold(text: str) -> str:
+    """Minuscules sans accents, en conservant la longueur (les positions restent valides)."""
+    folded = text.lower()
+    if len(folded) != len(text):
+        # Rares caractères dont la minuscule change de longueur : on les laisse tels quels
+        folded = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+    if folded.isascii():
+        return folded
+    return folded.translate(_FOLD_TABLE)
+
+
+def _plural(word: str) -> str:
+    """Pluriel usuel d'un mot français (déjà normalisé)."""
+    if not word or word[-1] in "sxz":
+        return word
+    if word.endswith(("au", "eu")):
+        return word + "x"
+    if word.endswith("al"):
+        return word[:-2] + "aux"
+    return word + "s"
+
+
+def plural_forms(word: str) -> set:
+    """Formes singulier/pluriel admises, y compris les pluriels irréguliers courants (bleus, travaux)."""
+    forms = {word, _plural(word)}
+    if word and word[-1] not in "sxz":
+        forms.add(word + "s")
+        if word.endswith("ail"):
+            forms.add(word[:-3] + "aux")
+    return forms
+
+
+def variants(synonym: str) -> set:
+    """Formes recherchées pour un synonyme : singulier, pluriel du premier mot et de tous les mots."""
+    words = fold(synonym).split()
+    if not words:
+        return set()
+    if len(words) == 1:
+        return plural_forms(words[0])
+    forms = {" ".join(words), " ".join(_plural(w) for w in words)}
+    for head in plural_forms(words[0]):
+        forms.add(" ".join([head] + words[1:]))
+    return forms
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def emit(node: Dict) -> Optional[str]:
+        terminal = "" in node
+        branches = []
+        for char in sorted(k for k in node if k):
+            piece = r"\s+" if char == " " else re.escape(char)
+            sub = emit(node[char])
+            branches.append(piece + (sub or ""))
+        if not branches:
+            return None
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            # Quantificateur gourmand : la forme la plus longue est essayée en premier
+            return "(?:" + body + ")?"
+        return body
+
+    return emit(trie) or ""
+
+
+class MentionMatcher:
+    """Automate compilé une fois à partir d'un dictionnaire objet -> synonymes."""
+
+    def __init__(self, obj_to_synonyms: Dict[str, Iterable[str]]):
+        self.objects = list(obj_to_synonyms)
+        self._owners: Dict[str, List[str]] = {}
+        for obj, synonyms in obj_to_synonyms.items():
+            for synonym in synonyms:
+                for form in variants(synonym):
+                    owners = self._owners.setdefault(form, [])
+                    if obj not in owners:
+                        owners.append(obj)
+        if self._owners:
+            self._regex = re.compile(r"(?<!\w)" + _trie_regex(self._owners) + r"(?!\w)")
+        else:
+            self._regex = None
+
+    def scan(self, text: str, with_offsets: bool = False) -> Tuple[Dict[str, int], Optional[Dict[str, List[Tuple[int, int]]]]]:
+        """
+        Parcourt le texte une seule fois.
+
+        Returns:
+            (comptes par objet, positions (début, fin) par objet si with_offsets sinon None)
+        """
+        counts = {obj: 0 for obj in self.objects}
+        offsets = {obj: [] for obj in self.objects} if with_offsets else None
+        if self._regex is None or not text:
+            return counts, offsets
+        for match in self._regex.finditer(fold(text)):
+            form = " ".join(match.group().split())
+            for obj in self._owners.get(form, ()):
+                counts[obj] += 1
+                if with_offsets:
+                    offsets[obj].append(match.span())
+        return counts, offsets
+
+    def count(self, text: str) -> Dict[str, int]:
+        return self.scan(text)[0]
+
+
+_matchers: "OrderedDict[tuple, MentionMatcher]" = OrderedDict()
+_matchers_lock = threading.Lock()
+MAX_CACHED_MATCHERS = 128
+
+
+def get_matcher(obj_to_synonyms: Dict[str, Iterable[str]]) -> MentionMatcher:
+    """Matcher compilé mis en cache par contenu (objets + synonymes)."""
+    key = tuple(sorted((obj, tuple(sorted(synonyms))) for obj, synonyms in obj_to_synonyms.items()))
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is not None:
+            _matchers.move_to_end(key)
+            return matcher
+    matcher = MentionMatcher(obj_to_synonyms)
+    with _matchers_lock:
+        _matchers[key] = matcher
+        if len(_matchers) > MAX_CACHED_MATCHERS:
+            _matchers.popitem(last=False)
+    return matcher
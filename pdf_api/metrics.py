@@ -0,0 +1,425 @@
+"""
+Métriques du service au format texte Prometheus (GET /metrics).
+
+Compteurs, jauges et histogrammes minimalistes, sans dépendance. Les durées par étape
+(téléchargement, décodage, YOLO, synonymes, traduction, recherche dans le texte...) sont
+mesurées avec stage() ; celles mesurées dans un processus du pool CPU sont capturées et
+rejouées dans le worker (voir executors).
+
+Chaque worker uvicorn écrit périodiquement un instantané de ses métriques dans METRICS_DIR ;
+/metrics agrège les instantanés des workers vivants, quel que soit le worker qui répond.
+Les valeurs issues des statistiques existantes (caches, pools, file des tâches) sont
+relevées par des collecteurs juste avant chaque instantané.
+"""
+import asyncio
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+# Répertoire vide : métriques du seul worker qui répond
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(DATA_DIR, "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            values = [[list(key), value] for key, value in self._values.items()]
+        return {"type": self.kind, "help": self.help, "labelnames": list(self.labelnames), "values": values}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+
+class Gauge(_Metric):
+    """
+    merge : agrégation entre workers dans /metrics.
+      "sum"    : quantités propres à chaque worker qui s'additionnent (requêtes en cours...) ;
+      "max"    : état partagé vu par chaque worker (Ollama joignable, file du serveur d'inférence) ;
+      "worker" : une série par worker, étiquette pid ajoutée (pools, retard de boucle).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), merge: str = "sum"):
+        if merge not in ("sum", "max", "worker"):
+            raise ValueError(f"Agrégation inconnue : {merge}")
+        super().__init__(name, help, labelnames)
+        self.merge = merge
+
+    def snapshot(self) -> Dict:
+        snapshot = super().snapshot()
+        snapshot["merge"] = self.merge
+        if self.merge == "worker":
+            pid = str(os.getpid())
+            snapshot["labelnames"] = ["pid"] + snapshot["labelnames"]
+            snapshot["values"] = [[[pid] + key, value] for key, value in snapshot["values"]]
+        return snapshot
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [compte par borne (non cumulé)..., dépassements, somme, nombre]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 3)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self) -> Dict:
+        snapshot = super().snapshot()
+        snapshot["values"] = [[key, list(state)] for key, state in snapshot["values"]]
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class MetricsRegistry:
+    def __init__(self, directory: str = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = (), merge: str = "sum") -> Gauge:
+        return self._register(Gauge(name, help, labelnames, merge))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """collector() met à jour des jauges/compteurs à partir de statistiques existantes."""
+        self._collectors.append(collector)
+
+    # --- Instantanés partagés entre workers ---
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"worker-{pid}.json")
+
+    def snapshot(self) -> Dict:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Collecteur de métriques en échec : {e}")
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def _write(self, snapshot: Dict):
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(os.getpid())
+                with open(path + ".tmp", "w") as f:
+                    json.dump(snapshot, f)
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                logger.warning(f"Écriture des métriques impossible ({self.directory}) : {e}")
+
+    def flush(self) -> Dict:
+        snapshot = self.snapshot()
+        self._write(snapshot)
+        return snapshot
+
+    def _worker_snapshots(self, own: Dict) -> List[Dict]:
+        snapshots = [own]
+        if not self.directory or not os.path.isdir(self.directory):
+            return snapshots
+        for entry in os.listdir(self.directory):
+            if not (entry.startswith("worker-") and entry.endswith(".json")):
+                continue
+            try:
+                pid = int(entry[len("worker-"):-len(".json")])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            path = os.path.join(self.directory, entry)
+            try:
+                stale = time.time() - os.path.getmtime(path) > max(30.0, 3 * self.flush_interval)
+            except OSError:
+                continue
+            # Worker arrêté, ou fichier d'un conteneur précédent dont le PID a été réattribué
+            if stale or not _alive(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self, own: Optional[Dict] = None) -> str:
+        """
+        Texte Prometheus des métriques de tous les workers : compteurs et histogrammes additionnés
+        par étiquettes, jauges selon leur mode d'agrégation (voir Gauge).
+
+        own : instantané de ce worker, pris dans la boucle d'événements (les collecteurs lisent
+        l'état du worker) ; render lit les fichiers des autres workers et peut alors être appelé
+        hors de la boucle. Le fichier de ce worker n'est écrit que par la tâche périodique.
+        """
+        merged: Dict[str, Dict] = {}
+        for snapshot in self._worker_snapshots(self.snapshot() if own is None else own):
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, {**metric, "values": {}})
+                for key, value in metric["values"]:
+                    key = tuple(key)
+                    current = target["values"].get(key)
+                    if current is None:
+                        target["values"][key] = value
+                    elif metric["type"] == "histogram":
+                        target["values"][key] = [a + b for a, b in zip(current, value)]
+                    elif metric.get("merge") == "max":
+                        target["values"][key] = max(current, value)
+                    else:
+                        target["values"][key] = current + value
+
+        lines = []
+        for name, metric in sorted(merged.items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric["labelnames"]
+            for key, value in sorted(metric["values"].items()):
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric["buckets"] + [float("inf")], value[:-2]):
+                    cumulative += count
+                    le = (("le", _format_value(float(bound))),)
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(float(value[-2]))}")
+                lines.append(f"{name}_count{_format_labels(labelnames, key)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.directory:
+            try:
+                os.remove(self._path(os.getpid()))
+            except OSError:
+                pass
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # Collecteurs dans la boucle, écriture du fichier dans un thread
+                await asyncio.to_thread(self._write, self.snapshot())
+            except Exception as e:
+                logger.warning(f"Instantané des métriques impossible : {e}")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram("pdf_api_stage_seconds", "Durée des étapes de traitement", ("stage",))
+stage_errors = registry.counter("pdf_api_stage_errors_total", "Étapes terminées par une exception", ("stage",))
+http_requests = registry.counter("pdf_api_http_requests_total", "Requêtes HTTP terminées", ("method", "route", "status"))
+http_duration = registry.histogram("pdf_api_http_request_duration_seconds", "Durée des requêtes HTTP (flux compris)", ("method", "route"))
+http_in_flight = registry.gauge("pdf_api_http_requests_in_flight", "Requêtes HTTP en cours", ("method", "route"))
+ollama_seconds = registry.histogram("pdf_api_ollama_request_seconds", "Durée des appels à Ollama", ("endpoint",))
+ollama_errors = registry.counter("pdf_api_ollama_errors_total", "Appels à Ollama en échec", ("endpoint",))
+ollama_tokens = registry.counter("pdf_api_ollama_tokens_total", "Jetons traités par Ollama", ("model", "kind"))
+ollama_tokens_per_second = registry.histogram("pdf_api_ollama_tokens_per_second", "Vitesse de génération Ollama", ("model",), RATE_BUCKETS)
+ollama_up = registry.gauge("pdf_api_ollama_up", "Dernière sonde Ollama réussie (1) ou non (0)", merge="max")
+process_memory = registry.gauge("pdf_api_process_resident_memory_bytes", "Mémoire résidente du worker", ("pid",))
+process_cpu = registry.counter("pdf_api_process_cpu_seconds_total", "Temps CPU consommé par le worker", ("pid",))
+
+# Observations faites dans un processus du pool CPU, renvoyées au worker (voir executors)
+_capture = threading.local()
+
+
+@contextmanager
+def stage(name: str):
+    """Mesure la durée d'un bloc (synchrone ou contenant des await) sous l'étape name."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        observed = getattr(_capture, "observed", None)
+        if observed is not None:
+            observed.append((name, elapsed))
+        else:
+            stage_seconds.observe(elapsed, stage=name)
+
+
+@contextmanager
+def capture():
+    """Collecte les durées d'étapes du thread courant au lieu de les enregistrer."""
+    observed: List[Tuple[str, float]] = []
+    _capture.observed = observed
+    try:
+        yield observed
+    finally:
+        _capture.observed = None
+
+
+def replay(observed: Optional[List[Tuple[str, float]]]):
+    for name, elapsed in observed or ():
+        stage_seconds.observe(elapsed, stage=name)
+
+
+def record_ollama_usage(model: str, data: Dict):
+    """Jetons et vitesse à partir de la réponse finale d'Ollama (durées en ns)."""
+    if data.get("prompt_eval_count"):
+        ollama_tokens.inc(data["prompt_eval_count"], model=model, kind="prompt")
+    if data.get("eval_count"):
+        ollama_tokens.inc(data["eval_count"], model=model, kind="eval")
+        if data.get("eval_duration"):
+            ollama_tokens_per_second.observe(data["eval_count"] / (data["eval_duration"] / 1e9), model=model)
+
+
+def _resident_memory() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Hors Linux : pic de mémoire résidente (ko)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _collect_process():
+    pid = os.getpid()
+    process_memory.set(_resident_memory(), pid=pid)
+    process_cpu.set(time.process_time(), pid=pid)
+
+
+registry.add_collector(_collect_process)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : durée, statut et requêtes en cours par route (modèle de chemin)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _route(scope) -> str:
+        from starlette.routing import Match
+
+        app = scope.get("app")
+        for route in getattr(getattr(app, "router", None), "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        # Chemins inconnus regroupés : pas d'explosion du nombre de séries
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        route = self._route(scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method=method, route=route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec(method=method, route=route)
+            http_duration.observe(time.perf_counter() - started, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=status["code"])
@@ -0,0 +1,222 @@
+"""
+Catalogue des modèles Ollama et modèle actif partagé entre workers.
+
+La liste /api/tags est mise en cache (MODEL_CATALOG_TTL) et rafraîchie en arrière-plan ;
+les appels concurrents pendant un rafraîchissement partagent la même requête, et l'ancienne
+liste reste servie si Ollama ne répond pas. Un téléchargement terminé invalide le cache.
+
+Le modèle actif et la version du catalogue sont conservés dans une petite base SQLite sous
+DATA_DIR : tous les workers uvicorn voient le même modèle actif, et l'invalidation faite par
+un worker est relevée par les autres. Les changements de modèle actif sont notifiés aux
+abonnés (voir subscribe()).
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ollama_client import ollama_client, OllamaClient, OllamaError
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+MODEL_CATALOG_TTL = float(os.getenv("MODEL_CATALOG_TTL", "30"))
+MODEL_STATE_POLL_INTERVAL = float(os.getenv("MODEL_STATE_POLL_INTERVAL", "1"))
+# Chemin vide : état propre au processus
+MODEL_STATE_DB = os.getenv("MODEL_STATE_DB", os.path.join(DATA_DIR, "model_state.sqlite"))
+
+
+class _MemoryState:
+    def __init__(self):
+        self._values: Dict[str, str] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        return self._values.get(key)
+
+    def set(self, key: str, value: str):
+        self._values[key] = value
+
+    def snapshot(self) -> Dict[str, str]:
+        return dict(self._values)
+
+
+class _SQLiteState:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT, updated_at REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO state (key, value, updated_at) VALUES (?, ?, ?)", (key, value, time.time())
+        )
+
+    def snapshot(self) -> Dict[str, str]:
+        return dict(self._connect().execute("SELECT key, value FROM state").fetchall())
+
+
+def _get_state(path: str = MODEL_STATE_DB):
+    if path:
+        try:
+            return _SQLiteState(path)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"État partagé des modèles indisponible ({path}), repli en mémoire : {e}")
+    return _MemoryState()
+
+
+class ModelCatalog:
+    def __init__(self, client: OllamaClient = None, ttl: float = MODEL_CATALOG_TTL, state=None):
+        self.client = client or ollama_client
+        self.ttl = ttl
+        self.state = state or _get_state()
+        self._models: Optional[List[Dict]] = None
+        self._fetched_at = 0.0
+        self._flight = SingleFlight("tags")
+        self._seen = self.state.snapshot()
+        self._subscribers: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._counters = {"hits": 0, "refreshes": 0, "errors": 0, "stale_served": 0}
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._seen = self.state.snapshot()
+        self._tasks = [asyncio.create_task(self._refresh_loop()), asyncio.create_task(self._watch_state())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- Catalogue ---
+
+    @property
+    def fresh(self) -> bool:
+        return self._models is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    async def _fetch(self) -> List[Dict]:
+        try:
+            models = await self.client.tags()
+        except OllamaError:
+            self._counters["errors"] += 1
+            raise
+        self._models = models
+        self._fetched_at = time.monotonic()
+        self._counters["refreshes"] += 1
+        return models
+
+    async def refresh(self) -> List[Dict]:
+        return await self._flight.do("tags", self._fetch)
+
+    async def models(self, force: bool = False) -> List[Dict]:
+        """Modèles installés (réponse de /api/tags) ; l'ancienne liste est servie si Ollama échoue."""
+        if self.fresh and not force:
+            self._counters["hits"] += 1
+            return self._models
+        try:
+            return await self.refresh()
+        except OllamaError:
+            if self._models is None:
+                raise
+            self._counters["stale_served"] += 1
+            return self._models
+
+    async def names(self) -> List[str]:
+        return [model["name"] for model in await self.models()]
+
+    async def is_available(self, model_name: str) -> bool:
+        if model_name in await self.names():
+            return True
+        # Modèle inconnu du cache : il vient peut-être d'être installé hors de ce service
+        return model_name in [model["name"] for model in await self.models(force=True)]
+
+    def invalidate(self):
+        """Invalide le catalogue ici et dans les autres workers (après un téléchargement, par exemple)."""
+        self._fetched_at = 0.0
+        self.state.set("catalog_version", str(time.time()))
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.ttl * 0.8))
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Rafraîchissement du catalogue Ollama impossible : {e}")
+
+    # --- Modèle actif partagé ---
+
+    def get_active_model(self) -> Optional[str]:
+        return self._seen.get("active_model")
+
+    async def set_active_model(self, model_name: str):
+        previous = self.get_active_model()
+        self.state.set("active_model", model_name)
+        self._seen["active_model"] = model_name
+        if previous != model_name:
+            self._notify(previous, model_name)
+
+    def subscribe(self) -> asyncio.Queue:
+        """File recevant un événement à chaque changement de modèle actif (tous workers confondus)."""
+        queue = asyncio.Queue(maxsize=100)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def _notify(self, previous: Optional[str], current: Optional[str]):
+        event = {"type": "active_model", "previous": previous, "model": current, "at": time.time()}
+        logger.info(f"Modèle actif : {previous} -> {current}")
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _watch_state(self):
+        while True:
+            await asyncio.sleep(MODEL_STATE_POLL_INTERVAL)
+            try:
+                current = self.state.snapshot()
+            except Exception as e:
+                logger.warning(f"Lecture de l'état partagé des modèles impossible : {e}")
+                continue
+            previous, self._seen = self._seen, current
+            if current.get("catalog_version") != previous.get("catalog_version"):
+                self._fetched_at = 0.0
+            if current.get("active_model") != previous.get("active_model"):
+                self._notify(previous.get("active_model"), current.get("active_model"))
+
+    def stats(self) -> Dict:
+        return {
+            "cached_models": len(self._models) if self._models is not None else None,
+            "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._models is not None else None,
+            "ttl": self.ttl,
+            "active_model": self.get_active_model(),
+            "state": type(self.state).__name__,
+            **self._counters,
+        }
+
+
+# Catalogue partagé par ModelManager, models.py et les endpoints
+model_catalog = ModelCatalog()
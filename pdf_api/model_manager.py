@@ -1,148 +1,196 @@
+import asyncio
 import os
-import requests
-import json
-from dotenv import load_dotenv
+import time
 from typing import Optional, List, Dict
-import threading
 
-class ModelManager:
-    def __init__(self, base_url: str = None):
-        load_dotenv()
-        ollama_host = os.getenv("OLLAMA_HOST", "localhost")
-        ollama_port = os.getenv("OLLAMA_PORT", "11434")
-        self.base_url = base_url or f"http://{ollama_host}:{ollama_port}"
-        self._current_model = None
-        self._download_thread = None
-        self._cancel_download = False
-        self._download_status = {"status": "idle", "progress": 0, "message": ""}
-
-    def _download_model_thread(self, model_name: str):
-        try:
-            self._download_status = {
-                "status": "downloading",
-                "progress": 0,
-                "message": "Début du téléchargement"
-            }
-
-            response = requests.post(
-                f"{self.base_url}/api/pull",
-                json={"name": model_name},
-                stream=True
-            )
-            response.raise_for_status()
-
-            for line in response.iter_lines():
-                if self._cancel_download:
-                    self._download_status = {
-                        "status": "cancelled",
-                        "progress": 0,
-                        "message": "Téléchargement annulé"
-                    }
-                    return
-
-                if line:
-                    try:
-                        data = json.loads(line.decode('utf-8'))
-                        if "status" in data:
-                            self._download_status["message"] = data["status"]
-                        if "total" in data and "completed" in data:
-                            progress = int((data["completed"] / data["total"]) * 100)
-                            self._download_status["progress"] = progress
-                    except Exception:
-                        pass
-
-            self._download_status = {
-                "status": "completed",
-                "progress": 100,
-                "message": "Téléchargement terminé"
-            }
+from model_catalog import model_catalog, ModelCatalog
+from jobs import job_queue, JobAlreadyActive, JobContext, JobQueue, JobQueueFull
+from ollama_client import ollama_client, OllamaClient, OllamaError
+
+MODEL_DOWNLOAD_CONCURRENCY = int(os.getenv("MODEL_DOWNLOAD_CONCURRENCY", "3"))
+
+
+class PullProgress:
+    """Agrège les événements de /api/pull (un par couche) en progression globale."""
+
+    def __init__(self):
+        self.layers: Dict[str, Dict] = {}
+        self.percent = 0.0
+        self.rate = 0.0
+        self._started = time.monotonic()
+        self._sample_at = self._started
+        self._sample_bytes = 0
+
+    @property
+    def completed(self) -> int:
+        return sum(layer["completed"] for layer in self.layers.values())
+
+    @property
+    def total(self) -> int:
+        return sum(layer["total"] for layer in self.layers.values())
+
+    def update(self, data: Dict):
+        digest = data.get("digest")
+        if digest and data.get("total"):
+            self.layers[digest] = {"total": data["total"], "completed": data.get("completed", 0)}
+        now = time.monotonic()
+        completed = self.completed
+        if now - self._sample_at >= 0.5:
+            instant = (completed - self._sample_bytes) / (now - self._sample_at)
+            # Débit lissé (moyenne exponentielle) pour un temps restant stable
+            self.rate = instant if not self.rate else 0.3 * instant + 0.7 * self.rate
+            self._sample_at, self._sample_bytes = now, completed
+        if self.total:
+            # Les couches sont découvertes au fil du flux : le pourcentage ne doit pas reculer
+            self.percent = max(self.percent, completed / self.total * 100)
+        if data.get("status") == "success":
+            self.percent = 100.0
+
+    def snapshot(self) -> Dict:
+        remaining = self.total - self.completed
+        return {
+            "completed_bytes": self.completed,
+            "total_bytes": self.total,
+            "layers": len(self.layers),
+            "rate_bytes_per_s": round(self.rate),
+            "eta_seconds": round(remaining / self.rate, 1) if self.rate > 0 and remaining > 0 else None,
+            "elapsed_seconds": round(time.monotonic() - self._started, 1),
+        }
 
-        except requests.exceptions.RequestException as e:
-            self._download_status = {
-                "status": "error",
-                "progress": 0,
-                "message": str(e)
-            }
 
-    def download_model(self, model_name: str) -> Dict:
+class ModelManager:
+    def __init__(self, client: OllamaClient = None, jobs: JobQueue = None, catalog: ModelCatalog = None):
+        self.client = client or ollama_client
+        self.jobs = jobs or job_queue
+        # Liste des modèles en cache et modèle actif partagé entre workers
+        self.catalog = catalog or model_catalog
+        self.base_url = self.client.base_url
+
+    async def run_download_job(self, ctx: JobContext, model_name: str) -> Dict:
+        """
+        Handler de la tâche "model_download". La progression est calculée en octets sur
+        l'ensemble des couches (et non couche par couche), avec débit lissé et temps restant.
+        L'annulation de la tâche ferme immédiatement la connexion de streaming vers Ollama.
         """
-        Lance le téléchargement du modèle dans un thread
+        progress = PullProgress()
+        ctx.progress(0, "Début du téléchargement")
+        async for data in self.client.pull(model_name):
+            progress.update(data)
+            ctx.progress(progress.percent, data.get("status"), **progress.snapshot())
+        self.catalog.invalidate()
+        return {"model_name": model_name, **progress.snapshot()}
+
+    async def _download_jobs(self, status: Optional[str] = None) -> List[Dict]:
+        return await self.jobs.list(kind="model_download", status=status)
+
+    async def _find_download_job(self, job_id: Optional[str] = None, active_only: bool = False) -> Optional[Dict]:
+        if job_id:
+            job = await self.jobs.get(job_id)
+            return job if job and job["kind"] == "model_download" else None
+        for job in await self._download_jobs():
+            if not active_only or job["status"] in ("queued", "running"):
+                return job
+        return None
+
+    async def download_model(self, model_name: str) -> Dict:
         """
-        if self._download_thread and self._download_thread.is_alive():
+        Lance le téléchargement du modèle dans la file des tâches
+        """
+        try:
+            # Clé d'unicité vérifiée par le magasin : un seul téléchargement par modèle, tous workers confondus
+            job = await self.jobs.submit("model_download", {"model_name": model_name}, unique_key=f"model_download:{model_name}")
+        except JobAlreadyActive as e:
             return {
                 "status": "error",
-                "message": "Un téléchargement est déjà en cours"
+                "message": f"Le modèle '{model_name}' est déjà en cours de téléchargement",
+                "job_id": e.job_id
             }
-
-        self._cancel_download = False
-        self._current_model = model_name
-        self._download_thread = threading.Thread(
-            target=self._download_model_thread,
-            args=(model_name,),
-            daemon=True
-        )
-        self._download_thread.start()
+        except JobQueueFull as e:
+            return {"status": "error", "message": str(e)}
 
         return {
             "status": "started",
-            "message": f"Téléchargement du modèle '{model_name}' lancé"
+            "message": f"Téléchargement du modèle '{model_name}' lancé",
+            "job_id": job["id"]
         }
 
-    def cancel_download(self) -> Dict:
-        if not self._download_thread or not self._download_thread.is_alive():
+    async def cancel_download(self, job_id: Optional[str] = None) -> Dict:
+        job = await self._find_download_job(job_id, active_only=True)
+        if not job or job["status"] not in ("queued", "running"):
             return {
                 "status": "error",
                 "message": "Aucun téléchargement en cours"
             }
 
-        self._cancel_download = True
+        await self.jobs.cancel(job["id"])
         return {
             "status": "cancelling",
-            "message": "Annulation du téléchargement en cours"
+            "message": "Annulation du téléchargement en cours",
+            "job_id": job["id"]
         }
 
-    def get_download_status(self) -> Dict:
-        status_with_name = self._download_status.copy()
-        status_with_name["model_name"] = self._current_model
-        return status_with_name
-
+    @staticmethod
+    def _download_status(job: Dict) -> Dict:
+        status = {"running": "downloading", "failed": "error"}.get(job["status"], job["status"])
+        return {
+            "status": status,
+            "progress": int(job["progress"]),
+            "message": job["error"] or job["message"],
+            "model_name": job["params"].get("model_name"),
+            "job_id": job["id"],
+            **(job["extra"] or {})
+        }
 
-    def is_model_available(self, model_name: str) -> bool:
+    async def get_download_status(self, job_id: Optional[str] = None) -> Dict:
+        job = await self._find_download_job(job_id)
+        if job is None:
+            return {"status": "idle", "progress": 0, "message": "", "model_name": None, "job_id": None}
+        return self._download_status(job)
+
+    async def list_downloads(self, active_only: bool = False) -> List[Dict]:
+        """Statut par modèle : le téléchargement le plus récent de chaque modèle."""
+        latest = {}
+        for job in await self._download_jobs():
+            model_name = job["params"].get("model_name")
+            if model_name not in latest:
+                latest[model_name] = job
+        downloads = [self._download_status(job) for job in latest.values()]
+        if active_only:
+            downloads = [download for download in downloads if download["status"] in ("queued", "downloading")]
+        return downloads
+
+    async def is_model_available(self, model_name: str) -> bool:
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
-            response.raise_for_status()
-            models = response.json().get("models", [])
-            return any(model["name"] == model_name for model in models)
-        except requests.exceptions.RequestException:
+            return await self.catalog.is_available(model_name)
+        except OllamaError:
             return False
 
-    def set_active_model(self, model_name: str) -> Dict:
-        if not self.is_model_available(model_name):
+    async def set_active_model(self, model_name: str) -> Dict:
+        if not await self.is_model_available(model_name):
             return {
                 "status": "error",
                 "message": f"Le modèle {model_name} n'est pas disponible. Veuillez le télécharger d'abord."
             }
 
-        self._current_model = model_name
+        await self.catalog.set_active_model(model_name)
         return {
             "status": "success",
             "message": f"Le modèle {model_name} a été défini comme modèle actif."
         }
 
     def get_active_model(self) -> Optional[str]:
-        return self._current_model
+        return self.catalog.get_active_model()
 
-    def list_available_models(self) -> List[Dict]:
+    async def list_available_models(self) -> List[Dict]:
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
-            response.raise_for_status()
-            models = response.json().get("models", [])
+            models = await self.catalog.models()
+            active_model = self.get_active_model()
             return [
                 {
                     "name": model["name"],
-                    "is_active": model["name"] == self._current_model
+                    "is_active": model["name"] == active_model
                 }
                 for model in models
             ]
-        except requests.exceptions.RequestException:
+        except OllamaError:
             return []
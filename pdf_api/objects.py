@@ -1,95 +1,115 @@
-import aiohttp
-from ultralytics import YOLO
-from deep_translator import GoogleTranslator
-import tempfile
-import torch
-import nltk
-from nltk.corpus import wordnet
+import cv2
+import numpy as np
 from collections import defaultdict, Counter
 
-nltk.download('wordnet')
-nltk.download('omw-1.4')
+from lexicon import get_lexicon
+from matcher import get_matcher
+from metrics import stage
+# Le modèle YOLO est chargé au premier usage (ou par le préchauffage), pas à l'import
+from registry import get_yolo
+from text_index import text_index
 
-translator = GoogleTranslator(source='en', target='fr')
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-model = YOLO('yolov8x.pt')
-model.to(device)
+def load_image_array(image_path: str) -> np.ndarray:
+    """Décode une image du disque en tableau BGR, le format attendu par YOLO."""
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Image illisible : {image_path}")
+    return image
 
-print(f"[INFO] Utilisation du dispositif : {device}")
+def decode_image_bytes(image_bytes: bytes) -> np.ndarray:
+    """Décode une image encodée (PNG, JPEG...) en mémoire en tableau BGR."""
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Image illisible")
+    return image
 
-async def download_image_from_url(image_url: str) -> str:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(image_url) as response:
-            if response.status == 200:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_img:
-                    temp_img.write(await response.read())
-                    return temp_img.name
-            else:
-                raise Exception(f"Erreur téléchargement image: {response.status}")
+def _count_labels(result, names: dict) -> Counter:
+    objects = Counter()
+    for box in result.boxes:
+        cls_id = int(box.cls)
+        label = names[cls_id]
+        objects[label.lower()] += 1
+    return objects
 
 # Étape 1 : détecter les objets
+def detect_objects_batch(images: list) -> list:
+    """Détecte les objets sur un lot d'images (chemins ou tableaux) en une seule passe."""
+    if not images:
+        return []
+    model, device = get_yolo()
+    results = model(images, device=device, verbose=False)
+    return [_count_labels(result, model.names) for result in results]
+
 def detect_objects_yolo(image_path: str) -> Counter:
-    results = model(image_path, device=device)
-    objects = Counter()
-    for result in results:
-        for box in result.boxes:
-            cls_id = int(box.cls)
-            label = model.names[cls_id]
-            objects[label.lower()] += 1
-    return objects
+    return detect_objects_batch([image_path])[0]
 
 # Étape 2 : récupérer les synonymes traduits pour chaque objet
 def get_translated_synonyms_per_object(objects: set) -> dict:
-    obj_to_synonyms_fr = {}
-    for obj in objects:
-        synonyms = set()
-        for syn in wordnet.synsets(obj, pos=wordnet.NOUN):
-            if "person" in syn.lexname() or "group" in syn.lexname():
-                continue
-            for lemma in syn.lemmas():
-                word = lemma.name().replace("_", " ").lower()
-                if word.isalpha():
-                    synonyms.add(word)
-        synonyms.add(obj)  # inclure l’objet lui-même
-        # Traduire tous les synonymes
-        translated = set()
-        for word in synonyms:
-            try:
-                translated.add(translator.translate(word).lower())
-            except:
-                translated.add(word)
-        obj_to_synonyms_fr[obj] = translated
-    return obj_to_synonyms_fr
+    # Les classes COCO sont servies par le lexique précalculé, sans appel réseau
+    lexicon = get_lexicon()
+    return {obj: lexicon.synonyms(obj) for obj in objects}
 
-# Étape 3 : chercher les synonymes dans le texte
+# Étape 3 : chercher les synonymes dans le texte (une seule passe, mots entiers)
 def count_mentions_in_text(texts: list, obj_to_synonyms_fr: dict) -> dict:
-    text_full = " ".join(texts).lower()
-    mention_counts = {obj: 0 for obj in obj_to_synonyms_fr}
-    for obj, synonyms in obj_to_synonyms_fr.items():
-        for synonym in synonyms:
-            count = text_full.count(synonym)
-            mention_counts[obj] += count
-            
-    return mention_counts
+    text_full = " ".join(texts)
+    return get_matcher(obj_to_synonyms_fr).count(text_full)
+
+# Variante de l'étape 3 : mentions lues dans l'index des documents déjà extraits, sans relire le texte
+def count_mentions_in_documents(document_ids: list, obj_to_synonyms_fr: dict) -> dict:
+    if text_index is None:
+        raise ValueError("Index de texte désactivé (TEXT_INDEX_DB vide)")
+    return text_index.count(obj_to_synonyms_fr, document_ids)
+
+def document_mentions(objects: list, document_ids: list = None, synonyms: dict = None) -> dict:
+    """Mentions par document et par page ; synonymes du lexique pour les objets sans synonymes fournis."""
+    if text_index is None:
+        raise ValueError("Index de texte désactivé (TEXT_INDEX_DB vide)")
+    obj_to_synonyms = dict(synonyms or {})
+    missing = [obj for obj in objects if obj not in obj_to_synonyms]
+    if missing:
+        obj_to_synonyms.update(get_translated_synonyms_per_object(set(missing)))
+    return {"synonyms": {obj: sorted(syns) for obj, syns in obj_to_synonyms.items()}, **text_index.count_mentions(obj_to_synonyms, document_ids)}
 
 # Étape 4 : regrouper les résultats
 def count_object_occurrences(image_paths: list, texts: list) -> dict:
+    detections = [detect_objects_yolo(image_path) for image_path in image_paths]
+    return summarize_occurrences(detections, texts)
+
+def translate_counts(detected: Counter) -> dict:
+    """Décompte d'une image avec les libellés français du lexique."""
+    lexicon = get_lexicon()
+    translated = Counter()
+    for obj, count in detected.items():
+        translated[lexicon.translate_label(obj)] += count
+    return dict(translated)
+
+def summarize_occurrences(detections: list, texts: list, document_ids: list = None) -> dict:
+    """
+    Croise des détections déjà calculées (un Counter par image) avec le texte,
+    ou avec l'index des documents document_ids s'ils sont fournis.
+    """
     result = {"result": {}}
     object_counts = defaultdict(lambda: {"occurence_text": 0, "occurence_image": 0})
     
     all_detected = Counter()
-    for image_path in image_paths:
-        detected = detect_objects_yolo(image_path)
+    for detected in detections:
         for obj, count in detected.items():
             all_detected[obj] += count
             object_counts[obj]["occurence_image"] += count
     
-    translated_synonyms = get_translated_synonyms_per_object(set(all_detected.keys()))
-    mention_counts = count_mentions_in_text(texts, translated_synonyms)
+    lexicon = get_lexicon()
+    with stage("synonyms"):
+        translated_synonyms = get_translated_synonyms_per_object(set(all_detected.keys()))
+    if document_ids:
+        with stage("index_lookup"):
+            mention_counts = count_mentions_in_documents(document_ids, translated_synonyms)
+    else:
+        with stage("text_matching"):
+            mention_counts = count_mentions_in_text(texts, translated_synonyms)
     
     for obj in all_detected:
         object_counts[obj]["occurence_text"] = mention_counts.get(obj, 0)
-        result["result"][translator.translate(obj).lower()] = {
+        result["result"][lexicon.translate_label(obj)] = {
             "occurence_text": object_counts[obj]["occurence_text"],
             "occurence_image": object_counts[obj]["occurence_image"]
         }
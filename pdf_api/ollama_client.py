@@ -0,0 +1,284 @@
+"""
+Client asynchrone partagé pour l'API Ollama.
+
+Une seule session aiohttp (pool de connexions) est ouverte au démarrage de l'application
+et fermée à l'arrêt ; chaque appel a son propre timeout, les erreurs transitoires sont
+rejouées avec un backoff exponentiel et le nombre d'appels simultanés par modèle est borné.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+import metrics
+from singleflight import SingleFlight
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "localhost")
+OLLAMA_PORT = os.getenv("OLLAMA_PORT", "11434")
+OLLAMA_BASE_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
+
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "10"))
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))
+OLLAMA_MODEL_CONCURRENCY = int(os.getenv("OLLAMA_MODEL_CONCURRENCY", "2"))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "20"))
+OLLAMA_HEALTH_TTL = float(os.getenv("OLLAMA_HEALTH_TTL", "10"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "3"))
+
+# Statuts HTTP considérés comme transitoires (Ollama en cours de démarrage, proxy...)
+RETRYABLE_STATUSES = {502, 503, 504}
+# Réponses portant les compteurs de jetons (eval_count, eval_duration...)
+GENERATION_PATHS = ("/api/generate", "/api/chat")
+
+
+class OllamaError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        timeout: float = OLLAMA_TIMEOUT,
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+        max_retries: int = OLLAMA_MAX_RETRIES,
+        retry_backoff: float = OLLAMA_RETRY_BACKOFF,
+        model_concurrency: int = OLLAMA_MODEL_CONCURRENCY,
+        pool_size: int = OLLAMA_POOL_SIZE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.model_concurrency = model_concurrency
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._model_slots: Dict[str, asyncio.Semaphore] = {}
+        self._health: Optional[Dict] = None
+        self._health_checked_at = 0.0
+        self._health_flight = SingleFlight("ollama_health")
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        # Ouverture paresseuse pour les scripts hors application (benchmarks, CLI)
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def _timeout(self, timeout: Optional[float]) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=timeout or self.timeout, connect=self.connect_timeout)
+
+    def model_slot(self, model: str) -> asyncio.Semaphore:
+        """Sémaphore limitant les générations simultanées pour un modèle."""
+        slot = self._model_slots.get(model)
+        if slot is None:
+            slot = self._model_slots[model] = asyncio.Semaphore(self.model_concurrency)
+        return slot
+
+    async def _backoff(self, attempt: int):
+        await asyncio.sleep(self.retry_backoff * (2 ** attempt) * (1 + random.random() / 2))
+
+    async def request(self, method: str, path: str, payload: Optional[Dict] = None, timeout: Optional[float] = None,
+                      retries: Optional[int] = None) -> Dict:
+        """Requête JSON non streamée avec rejeu des erreurs transitoires."""
+        started = time.perf_counter()
+        try:
+            data = await self._request(method, path, payload, timeout, self.max_retries if retries is None else retries)
+        except OllamaError:
+            metrics.ollama_errors.inc(endpoint=path)
+            raise
+        finally:
+            metrics.ollama_seconds.observe(time.perf_counter() - started, endpoint=path)
+        if path in GENERATION_PATHS and payload:
+            metrics.record_ollama_usage(payload.get("model", ""), data)
+        return data
+
+    async def _request(self, method: str, path: str, payload: Optional[Dict], timeout: Optional[float], max_retries: int) -> Dict:
+        session = await self.session()
+        url = f"{self.base_url}{path}"
+        for attempt in range(max_retries + 1):
+            try:
+                async with session.request(method, url, json=payload, timeout=self._timeout(timeout)) as response:
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+                    error_text = await response.text()
+                    if response.status not in RETRYABLE_STATUSES or attempt == max_retries:
+                        raise OllamaError(f"Erreur API : {response.status} - {error_text}", status=response.status)
+                    logger.warning(f"Ollama {path} : statut {response.status}, nouvel essai ({attempt + 1}/{max_retries})")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == max_retries:
+                    raise OllamaError(f"Erreur de connexion API : {type(e).__name__} - {str(e)}") from e
+                logger.warning(f"Ollama {path} : {type(e).__name__}, nouvel essai ({attempt + 1}/{max_retries})")
+            await self._backoff(attempt)
+
+    async def stream(self, path: str, payload: Dict, timeout: Optional[float] = None) -> AsyncIterator[Dict]:
+        """Requête streamée (NDJSON) ; seule l'ouverture de la connexion est rejouée."""
+        started = time.perf_counter()
+        try:
+            # aclosing : la fermeture de ce flux ferme aussitôt la connexion sous-jacente
+            async with contextlib.aclosing(self._stream(path, payload, timeout)) as events:
+                async for data in events:
+                    if data.get("done") and path in GENERATION_PATHS:
+                        metrics.record_ollama_usage(payload.get("model", ""), data)
+                    yield data
+        except OllamaError:
+            metrics.ollama_errors.inc(endpoint=path)
+            raise
+        finally:
+            metrics.ollama_seconds.observe(time.perf_counter() - started, endpoint=path)
+
+    async def _stream(self, path: str, payload: Dict, timeout: Optional[float]) -> AsyncIterator[Dict]:
+        session = await self.session()
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await session.post(url, json=payload, timeout=self._timeout(timeout))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise OllamaError(f"Erreur de connexion API : {type(e).__name__} - {str(e)}") from e
+                await self._backoff(attempt)
+                continue
+            if response.status in RETRYABLE_STATUSES and attempt < self.max_retries:
+                response.release()
+                await self._backoff(attempt)
+                continue
+            break
+
+        # La réponse est fermée à la sortie, y compris en cas d'annulation du consommateur
+        async with response:
+            if response.status != 200:
+                raise OllamaError(f"Erreur API : {response.status} - {await response.text()}", status=response.status)
+            try:
+                async for line in response.content:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Ligne de flux Ollama illisible : {line[:200]!r}")
+                        continue
+                    if "error" in data:
+                        raise OllamaError(data["error"])
+                    yield data
+            except (asyncio.CancelledError, GeneratorExit):
+                # Consommateur annulé : la connexion est coupée (et non rendue au pool),
+                # ce qui interrompt aussi le téléchargement ou la génération côté Ollama
+                response.close()
+                raise
+
+    async def generate(self, model: str, prompt: str, images: Optional[List[str]] = None, options: Optional[Dict] = None,
+                       timeout: Optional[float] = None, **extra) -> Dict:
+        payload = {"model": model, "prompt": prompt, "stream": False, **extra}
+        if images:
+            payload["images"] = images
+        if options:
+            payload["options"] = options
+        async with self.model_slot(model):
+            return await self.request("POST", "/api/generate", payload, timeout)
+
+    async def chat(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                   timeout: Optional[float] = None, **extra) -> Dict:
+        payload = {"model": model, "messages": messages, "stream": False, **extra}
+        if options:
+            payload["options"] = options
+        async with self.model_slot(model):
+            return await self.request("POST", "/api/chat", payload, timeout)
+
+    async def generate_stream(self, model: str, prompt: str, images: Optional[List[str]] = None,
+                              options: Optional[Dict] = None, timeout: Optional[float] = None, **extra) -> AsyncIterator[Dict]:
+        """Flux des fragments générés ; le dernier message porte "done": true et les durées."""
+        payload = {"model": model, "prompt": prompt, "stream": True, **extra}
+        if images:
+            payload["images"] = images
+        if options:
+            payload["options"] = options
+        async with self.model_slot(model):
+            async for data in self.stream("/api/generate", payload, timeout):
+                yield data
+
+    async def chat_stream(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                          timeout: Optional[float] = None, **extra) -> AsyncIterator[Dict]:
+        payload = {"model": model, "messages": messages, "stream": True, **extra}
+        if options:
+            payload["options"] = options
+        async with self.model_slot(model):
+            async for data in self.stream("/api/chat", payload, timeout):
+                yield data
+
+    async def tags(self, timeout: Optional[float] = 10) -> List[Dict]:
+        data = await self.request("GET", "/api/tags", timeout=timeout)
+        return data.get("models", [])
+
+    async def health(self, ttl: float = OLLAMA_HEALTH_TTL) -> Dict:
+        """
+        Sonde /api/version (sans rejeu, timeout court), mise en cache ttl secondes ;
+        les sondes concurrentes partagent le même appel.
+        """
+        if self._health is not None and time.monotonic() - self._health_checked_at < ttl:
+            return self._health
+
+        async def probe():
+            started = time.perf_counter()
+            try:
+                data = await self.request("GET", "/api/version", timeout=OLLAMA_HEALTH_TIMEOUT, retries=0)
+                result = {"status": "ok", "version": data.get("version")}
+            except OllamaError as e:
+                result = {"status": "error", "message": str(e)}
+            result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            result["checked_at"] = time.time()
+            self._health, self._health_checked_at = result, time.monotonic()
+            metrics.ollama_up.set(1 if result["status"] == "ok" else 0)
+            return result
+
+        return await self._health_flight.do("health", probe)
+
+    async def pull(self, model: str) -> AsyncIterator[Dict]:
+        """Flux de progression d'un téléchargement de modèle (sans limite de durée totale)."""
+        async for data in self.stream("/api/pull", {"name": model, "stream": True}, timeout=24 * 3600):
+            yield data
+
+
+def stream_timings(final: Dict, started: float, first_token_at: Optional[float]) -> Dict:
+    """Métadonnées de durée d'une génération streamée (durées Ollama en ns converties en ms)."""
+    timings = {
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "time_to_first_token_ms": round((first_token_at - started) * 1000, 2) if first_token_at else None,
+    }
+    for key in ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration"):
+        if key in final:
+            timings[f"{key}_ms"] = round(final[key] / 1e6, 2)
+    for key in ("prompt_eval_count", "eval_count"):
+        if key in final:
+            timings[key] = final[key]
+    if final.get("eval_count") and final.get("eval_duration"):
+        timings["tokens_per_second"] = round(final["eval_count"] / (final["eval_duration"] / 1e9), 2)
+    return timings
+
+
+# Client partagé par tous les modules du worker
+ollama_client = OllamaClient()
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from executors import cpu_pool, io_pool
+from extraction import extract_page, file_sha256, fingerprint_document
+from image_sink import IMAGE_SINK, PUBLIC_BASE_URL, get_image_sink
+from metrics import stage
+from detections import DETECTION_MODEL, detect_cached
+from document_store import document_store
+from objects import decode_image_bytes
+from result_cache import make_key
+from text_index import text_index
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal d'envois d'images simultanés et de pages en cours de traitement
+UPLOAD_CONCURRENCY = int(os.getenv("PDF_UPLOAD_CONCURRENCY", "8"))
+MAX_PAGES_IN_FLIGHT = int(os.getenv("PDF_MAX_PAGES_IN_FLIGHT", "8"))
+
+
+async def _process_image(image: Dict, upload_semaphore: asyncio.Semaphore, detect: bool) -> Dict:
+    async with upload_semaphore:
+        with stage("image_store"):
+            url = await io_pool.run(get_image_sink().store, image["image"], image["ext"], image["sha256"])
+    result = {"url": url, "sha256": image["sha256"]}
+    if detect:
+        try:
+            # Images déjà vues (dans ce PDF ou un autre) servies par le cache de détections
+            result["objects"] = dict(await detect_cached(image["sha256"], lambda: decode_image_bytes(image["image"])))
+        except ValueError as e:
+            result["objects"] = {}
+            result["error"] = str(e)
+    return result
+
+
+class _DocumentImages:
+    """Déduplication des images d'un document par xref puis par contenu : stockage et détection uniques."""
+
+    def __init__(self, upload_semaphore: asyncio.Semaphore, detect: bool):
+        self.upload_semaphore = upload_semaphore
+        self.detect = detect
+        self._by_xref: Dict[int, asyncio.Task] = {}
+        self._by_hash: Dict[str, asyncio.Task] = {}
+
+    def get(self, image: Dict) -> asyncio.Task:
+        task = self._by_xref.get(image["xref"]) or self._by_hash.get(image["sha256"])
+        if task is None:
+            task = asyncio.ensure_future(_process_image(image, self.upload_semaphore, self.detect))
+            self._by_hash[image["sha256"]] = task
+        self._by_xref[image["xref"]] = task
+        return task
+
+    def cancel(self):
+        for task in self._by_hash.values():
+            task.cancel()
+
+
+async def _process_page(pdf_path: str, page_num: int, images: _DocumentImages) -> Dict:
+    started = time.perf_counter()
+    try:
+        with stage("pdf_page_extract"):
+            page = await cpu_pool.run(extract_page, pdf_path, page_num)
+        # shield : une image partagée entre pages ne doit pas être annulée par l'échec d'une autre page
+        results = await asyncio.gather(*(asyncio.shield(images.get(image)) for image in page["images"]))
+    except Exception as e:
+        logger.error(f"Erreur lors du traitement de la page {page_num + 1} : {e}")
+        return {"type": "error", "page": page_num + 1, "message": str(e)}
+    return {
+        "type": "page",
+        "page": page_num + 1,
+        "text": page["text"],
+        "images": [{"xref": image["xref"], **result} for image, result in zip(page["images"], results)],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "reused": False,
+    }
+
+
+class _DocumentIndexer:
+    """Alimente l'index de texte au fil des pages, sauf si le document y figure déjà en entier."""
+
+    def __init__(self, doc_hash: str):
+        self.doc_hash = doc_hash
+        self.enabled = text_index is not None
+
+    async def start(self):
+        if self.enabled:
+            self.enabled = not await io_pool.run(text_index.has_document, self.doc_hash)
+
+    async def add(self, event: Dict):
+        if not self.enabled:
+            return
+        try:
+            await io_pool.run(text_index.add_page, self.doc_hash, event["page"], event["text"])
+        except sqlite3.Error as e:
+            logger.warning(f"Indexation du document {self.doc_hash[:12]} abandonnée : {e}")
+            self.enabled = False
+
+    async def finish(self, pages: int):
+        if self.enabled:
+            try:
+                await io_pool.run(text_index.finish_document, self.doc_hash, pages)
+            except sqlite3.Error as e:
+                logger.warning(f"Indexation du document {self.doc_hash[:12]} abandonnée : {e}")
+
+
+def store_variant(detect: bool) -> str:
+    """Réglages qui changent le résultat d'une page : détection, modèle, destination des images."""
+    return make_key("pdf_page", detect=detect, model=DETECTION_MODEL if detect else None, sink=IMAGE_SINK, base_url=PUBLIC_BASE_URL)
+
+
+def _stored_page_event(page_num: int, xrefs: List[int], result: Dict) -> Dict:
+    # Les xrefs changent quand le PDF est réécrit : ceux du document courant remplacent ceux enregistrés
+    return {
+        "type": "page",
+        "page": page_num + 1,
+        "text": result["text"],
+        "images": [{"xref": xref, **image} for xref, image in zip(xrefs, result["images"])],
+        "reused": True,
+    }
+
+
+async def stored_document(doc_hash: str, detect: bool = True) -> Optional[Dict]:
+    """Résultat complet d'un document déjà traité, recherché par le SHA-256 du fichier."""
+    if document_store is None:
+        return None
+    document = await io_pool.run(document_store.get_document, doc_hash, store_variant(detect))
+    if document is None:
+        return None
+    return {
+        "document_hash": doc_hash,
+        "pages": [_stored_page_event(num, page["xrefs"], page["result"]) for num, page in enumerate(document["pages"])],
+    }
+
+
+async def process_pdf(pdf_path: str, detect: bool = True) -> AsyncIterator[Dict]:
+    """
+    Traite un PDF page par page et produit un événement dès qu'une page est prête.
+
+    Un document déjà traité (même SHA-256) est servi depuis le magasin de documents ; sinon seules
+    les pages dont l'empreinte est inconnue sont recalculées, les autres sont émises d'emblée
+    (champ "reused"). Les pages sont analysées par le pool de processus (cpu_pool), les images
+    envoyées avec une concurrence bornée ; l'ordre des événements suit l'ordre de fin de traitement.
+    """
+    started = time.perf_counter()
+    variant = store_variant(detect)
+    doc_hash = await io_pool.run(file_sha256, pdf_path)
+    stats = {"pages": 0, "images": 0, "errors": 0, "reused": 0, "recomputed": 0}
+    # Texte des pages indexé pour /analyze et /index/mentions (identifiant : document_hash)
+    indexer = _DocumentIndexer(doc_hash)
+    await indexer.start()
+
+    # Magasin SQLite : lectures et écritures dans io_pool, hors de la boucle d'événements
+    document = await io_pool.run(document_store.get_document, doc_hash, variant) if document_store is not None else None
+    if document is not None:
+        yield {"type": "document", "pages": len(document["pages"]), "document_hash": doc_hash, "known": True}
+        for page_num, page in enumerate(document["pages"]):
+            event = _stored_page_event(page_num, page["xrefs"], page["result"])
+            stats["pages"] += 1
+            stats["reused"] += 1
+            stats["images"] += len(event["images"])
+            await indexer.add(event)
+            yield event
+        await indexer.finish(stats["pages"])
+        yield {"type": "done", **stats, "document_hash": doc_hash, "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+        return
+
+    with stage("pdf_fingerprint"):
+        fingerprints = await cpu_pool.run(fingerprint_document, pdf_path)
+    page_count = len(fingerprints)
+    stored = {}
+    if document_store is not None:
+        stored = await io_pool.run(document_store.get_pages, [page["fingerprint"] for page in fingerprints], variant)
+    yield {"type": "document", "pages": page_count, "document_hash": doc_hash, "known": False}
+
+    # Pages inchangées : reprises du magasin sans extraction, envoi ni détection
+    to_compute = []
+    for page_num, page in enumerate(fingerprints):
+        result = stored.get(page["fingerprint"])
+        if result is None:
+            to_compute.append(page_num)
+            continue
+        event = _stored_page_event(page_num, page["xrefs"], result)
+        stats["pages"] += 1
+        stats["reused"] += 1
+        stats["images"] += len(event["images"])
+        await indexer.add(event)
+        yield event
+
+    images = _DocumentImages(asyncio.Semaphore(UPLOAD_CONCURRENCY), detect)
+    pending = set()
+    next_index = 0
+    try:
+        while next_index < len(to_compute) or pending:
+            while next_index < len(to_compute) and len(pending) < MAX_PAGES_IN_FLIGHT:
+                pending.add(asyncio.create_task(_process_page(pdf_path, to_compute[next_index], images)))
+                next_index += 1
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                event = task.result()
+                if event["type"] == "error":
+                    stats["errors"] += 1
+                else:
+                    stats["pages"] += 1
+                    stats["recomputed"] += 1
+                    stats["images"] += len(event["images"])
+                    if document_store is not None:
+                        await io_pool.run(document_store.put_page, fingerprints[event["page"] - 1]["fingerprint"], variant, {
+                            "text": event["text"],
+                            "images": [{k: v for k, v in image.items() if k != "xref"} for image in event["images"]],
+                        })
+                    await indexer.add(event)
+                yield event
+    finally:
+        # Client déconnecté ou erreur : ne pas laisser de travail orphelin
+        for task in pending:
+            task.cancel()
+        images.cancel()
+
+    # Document enregistré seulement si toutes ses pages ont un résultat
+    if not stats["errors"]:
+        if document_store is not None:
+            await io_pool.run(document_store.put_document, doc_hash, variant, fingerprints)
+        await indexer.finish(page_count)
+    yield {"type": "done", **stats, "document_hash": doc_hash, "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
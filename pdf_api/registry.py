@@ -0,0 +1,111 @@
+"""
+Registre des ressources lourdes (modèle YOLO, WordNet, lexique) chargées paresseusement.
+
+Rien n'est chargé à l'import : chaque ressource l'est au premier usage, ou par la tâche de
+préchauffage lancée en arrière-plan au démarrage. Les données NLTK sont lues depuis NLTK_DATA
+(fournies par l'image Docker), sans aucun téléchargement.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+NLTK_DATA = os.getenv("NLTK_DATA")
+
+
+class LazyResource:
+    """Ressource chargée une seule fois, de façon thread-safe, avec son état et sa durée de chargement."""
+
+    def __init__(self, name: str, loader: Callable):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def get(self):
+        if self.state == "ready":
+            return self._value
+        with self._lock:
+            if self.state != "ready":
+                self.state = "loading"
+                started = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.state = "error"
+                    self.error = f"{type(e).__name__} - {str(e)}"
+                    logger.error(f"Échec du chargement de {self.name} : {self.error}")
+                    raise
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                self.error = None
+                self.state = "ready"
+                logger.info(f"{self.name} chargé en {self.load_seconds} s")
+        return self._value
+
+    def describe(self) -> Dict:
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+
+def _load_yolo():
+    # Taille, runtime et précision configurés dans detection_backend (YOLO_VARIANT, YOLO_RUNTIME...)
+    from detection_backend import get_backend
+    return get_backend().load()
+
+
+def _load_wordnet():
+    import nltk
+    from nltk.corpus import wordnet
+
+    if NLTK_DATA and NLTK_DATA not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA)
+    # Lève LookupError si les corpus ne sont pas fournis : pas de nltk.download au runtime
+    wordnet.ensure_loaded()
+    return wordnet
+
+
+def _load_lexicon():
+    from lexicon import get_lexicon
+    return get_lexicon()
+
+
+resources: Dict[str, LazyResource] = {
+    "yolo": LazyResource("yolo", _load_yolo),
+    "wordnet": LazyResource("wordnet", _load_wordnet),
+    "lexicon": LazyResource("lexicon", _load_lexicon),
+}
+
+
+def get_yolo():
+    """(modèle, dispositif) YOLO, chargés au premier appel."""
+    return resources["yolo"].get()
+
+
+def get_wordnet():
+    return resources["wordnet"].get()
+
+
+async def warm_up(names: Iterable[str] = ("lexicon", "wordnet", "yolo")):
+    """Charge les ressources hors de la boucle d'événements ; les erreurs sont journalisées, pas propagées."""
+    for name in names:
+        try:
+            await asyncio.to_thread(resources[name].get)
+        except Exception:
+            pass
+
+
+def readiness(names: Iterable[str] = None) -> Dict:
+    """État des ressources attendues par ce processus (toutes par défaut)."""
+    selected = {name: resources[name] for name in (names or resources)}
+    states = {name: resource.describe() for name, resource in selected.items()}
+    return {"ready": all(resource.ready for resource in selected.values()), "resources": states}
@@ -0,0 +1,244 @@
+"""
+Cache borné des résultats LLM / traduction.
+
+Niveau mémoire : LRU avec TTL et budget en octets, propre au processus.
+Niveau disque (optionnel) : base SQLite en mode WAL sous DATA_DIR, partagée par les
+workers uvicorn et conservée entre redémarrages. Depuis la boucle d'événements, utiliser
+get_async / set_async : le niveau disque est alors consulté dans io_pool.
+Les valeurs doivent être sérialisables en JSON.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from executors import io_pool
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# Chemin vide : pas de niveau disque
+CACHE_DB_PATH = os.getenv("LLM_CACHE_DB", os.path.join(DATA_DIR, "llm_cache.sqlite"))
+CACHE_DISK_MAX_BYTES = int(os.getenv("LLM_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+# Entrées supprimées par requête lors du nettoyage du niveau disque
+_PRUNE_BATCH = 256
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(namespace: str, **parts) -> str:
+    """Clé stable : espace de noms + hash de toutes les composantes (modèle, version du prompt, options...)."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class _DiskTier:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[tuple]:
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def set(self, key: str, raw: str, expires_at: float) -> int:
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, raw, len(raw), expires_at, now),
+        )
+        self._writes += 1
+        # Le nettoyage n'est fait que périodiquement pour garder les écritures rapides
+        return self.prune() if self._writes % 64 == 0 else 0
+
+    def prune(self) -> int:
+        conn = self._connect()
+        removed = conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        excess = total - self.max_bytes
+        # Éviction par lots via l'index sur accessed_at, sans relire toute la table
+        while excess > 0:
+            rows = conn.execute("SELECT key, size FROM cache ORDER BY accessed_at LIMIT ?", (_PRUNE_BATCH,)).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                victims.append(key)
+                excess -= size
+            conn.execute(f"DELETE FROM cache WHERE key IN ({','.join('?' * len(victims))})", victims)
+            removed += len(victims)
+        return removed
+
+    def stats(self) -> Dict:
+        entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl: float = CACHE_TTL,
+        db_path: Optional[str] = CACHE_DB_PATH,
+        disk_max_bytes: int = CACHE_DISK_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0, "disk_evictions": 0}
+        self._disk = None
+        if db_path:
+            try:
+                self._disk = _DiskTier(db_path, disk_max_bytes)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Cache disque désactivé ({db_path}) : {e}")
+
+    def _count(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] += n
+
+    def _remember(self, key: str, value: Any, size: int, expires_at: float):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._counters["evictions"] += 1
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, expires_at = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+                del self._entries[key]
+                self._bytes -= size
+                self._counters["expirations"] += 1
+        return None
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        if self._disk is not None:
+            try:
+                row = self._disk.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Lecture du cache disque impossible : {e}")
+                row = None
+            if row is not None:
+                raw, expires_at = row
+                value = json.loads(raw)
+                self._remember(key, value, len(raw), expires_at)
+                self._count("disk_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._memory_get(key)
+        return value if value is not None else self._disk_get(key)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """Comme get ; le niveau disque (SQLite, bloquant) est lu dans io_pool."""
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        if self._disk is None:
+            self._count("misses")
+            return None
+        return await io_pool.run(self._disk_get, key)
+
+    def _memory_set(self, key: str, value: Any, ttl: Optional[float]) -> tuple:
+        raw = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        self._remember(key, value, len(raw), expires_at)
+        self._count("sets")
+        return raw, expires_at
+
+    def _disk_set(self, key: str, raw: str, expires_at: float):
+        try:
+            self._count("disk_evictions", self._disk.set(key, raw, expires_at))
+        except sqlite3.Error as e:
+            logger.warning(f"Écriture du cache disque impossible : {e}")
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raw, expires_at = self._memory_set(key, value, ttl)
+        if self._disk is not None:
+            self._disk_set(key, raw, expires_at)
+
+    async def set_async(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Comme set ; l'écriture sur disque (et le nettoyage périodique) est faite dans io_pool."""
+        raw, expires_at = self._memory_set(key, value, ttl)
+        if self._disk is not None:
+            await io_pool.run(self._disk_set, key, raw, expires_at)
+
+    def stats(self, disk: bool = True) -> Dict:
+        """disk : inclure la taille du niveau disque (requête SQLite bloquante)."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes,
+                          "max_entries": self.max_entries, "max_bytes": self.max_bytes, "ttl": self.ttl})
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0
+        if disk and self._disk is not None:
+            try:
+                stats["disk"] = self._disk.stats()
+            except sqlite3.Error as e:
+                stats["disk"] = {"error": str(e)}
+        return stats
+
+
+# Cache partagé par /describe, /resumer et /translate
+llm_cache = ResultCache()
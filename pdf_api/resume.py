@@ -1,19 +1,31 @@
+import asyncio
+import hashlib
 import os
-import requests
-import torch
+import re
+import time
+from typing import AsyncIterator, Dict, List
 
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "ollama")
-OLLAMA_PORT = os.getenv("OLLAMA_PORT", "11434")
-OLLAMA_BASE_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
+from ollama_client import ollama_client, stream_timings
+from result_cache import llm_cache, make_key, text_hash
 
-# Initialize a persistent session
-session = requests.Session()
+SUMMARY_MODEL = "gemma3:4b"
+SUMMARY_OPTIONS = {"num_ctx": 2048, "temperature": 0.7}
+# À incrémenter à chaque modification des prompts : invalide le cache
+PROMPT_VERSION = 1
 
-def resumer(text: str = "") -> str:
-    if not text.strip():
-        return "Aucun texte fourni pour le résumé."
-    
-    prompt = f"""
+# Budget par morceau pour le mode map-reduce : num_ctx moins le prompt et la réponse
+CHARS_PER_TOKEN = float(os.getenv("SUMMARY_CHARS_PER_TOKEN", "4"))
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "1400"))
+MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+# Niveaux de résumés intermédiaires au-delà desquels on renonce (le modèle ne raccourcit plus)
+MAX_MAP_LEVELS = 3
+
+def summary_cache_key(text: str, mode: str = "single") -> str:
+    return make_key("resumer", text=text_hash(text), model=SUMMARY_MODEL, mode=mode,
+                    prompt_version=PROMPT_VERSION, options=SUMMARY_OPTIONS)
+
+def build_prompt(text: str) -> str:
+    return f"""
     Tu es un assistant qui doit résumer un texte. Fournis un résumé **clair, concis et informatif** en **10% de text original** par des conjonctions.
     Texte à résumer :
     {text}
@@ -23,31 +35,245 @@ def resumer(text: str = "") -> str:
  - ni introduction ni conclusion
     """
 
-    payload = {
-        "model": "gemma3:4b",
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False,
-        "options": {"num_ctx": 2048, "temperature": 0.7}
-    }
+def build_chunk_prompt(chunk: str) -> str:
+    return f"""
+    Tu es un assistant qui résume un extrait d'un long document. Résume cet extrait en conservant les faits, chiffres et noms importants.
+    Extrait :
+    {chunk}
+[important]
+ - le résumé doit etre en francais
+ - environ 20% de la longueur de l'extrait
+ - ni introduction ni conclusion
+    """
+
+def build_reduce_prompt(partials: List[str], target_words: int) -> str:
+    joined = "\n\n".join(partials)
+    return f"""
+    Tu es un assistant qui doit résumer un document à partir des résumés successifs de ses parties (dans l'ordre).
+    Fournis un résumé final **clair, concis et informatif** d'environ {target_words} mots, relié par des conjonctions.
+    Résumés des parties :
+    {joined}
+[important]
+ - la description doit etre en francais
+ - ne répète pas les mêmes informations
+ - ni introduction ni conclusion
+    """
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def _hard_split(text: str, max_chars: int) -> List[str]:
+    """Coupe un passage sans ponctuation exploitable, de préférence sur une espace."""
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+def split_chunks(text: str, max_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """
+    Découpe le texte en morceaux d'au plus max_tokens (estimés), sur les paragraphes puis les phrases.
+
+    Les frontières dépendent du contenu (hash du paragraphe) et non de la seule position :
+    après une modification locale du document, les morceaux suivants retombent sur les
+    mêmes frontières et leurs résumés restent en cache.
+    """
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    min_chars = max_chars // 2
+    # (texte, séparateur avec l'unité suivante) : "\n\n" en fin de paragraphe, " " entre phrases
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            units.append((paragraph, "\n\n"))
+            continue
+        sentence = ""
+        for part in re.split(r"(?<=[.!?])\s+", paragraph):
+            if sentence and len(sentence) + len(part) + 1 > max_chars:
+                units.append((sentence, " "))
+                sentence = ""
+            if len(part) > max_chars:
+                # La phrase en cours a été émise juste avant : l'ordre du texte est conservé
+                *pieces, part = _hard_split(part, max_chars)
+                units.extend((piece, " ") for piece in pieces)
+            sentence = f"{sentence} {part}" if sentence else part
+        if sentence:
+            units.append((sentence, "\n\n"))
+
+    chunks = []
+    current = ""
+    separator = ""
+    for unit, next_separator in units:
+        if current and len(current) + len(separator) + len(unit) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}{separator}{unit}" if current else unit
+        separator = next_separator
+        # Frontière « naturelle » : un paragraphe sur quatre environ, selon son contenu
+        if len(current) >= min_chars and hashlib.md5(unit.encode("utf-8")).digest()[0] % 4 == 0:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def _chat(prompt: str) -> str:
+    result = await ollama_client.chat(
+        SUMMARY_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        options=SUMMARY_OPTIONS
+    )
+    if 'message' in result and 'content' in result['message']:
+        return result['message']['content']
+    raise Exception("Format de réponse inattendu d'Ollama.")
+
+async def _summarize_chunk(chunk: str, semaphore: asyncio.Semaphore) -> str:
+    cache_key = make_key("resumer_chunk", text=text_hash(chunk), model=SUMMARY_MODEL,
+                         prompt_version=PROMPT_VERSION, options=SUMMARY_OPTIONS)
+    cached = await llm_cache.get_async(cache_key)
+    if cached is not None:
+        return cached
+    async with semaphore:
+        summary = await _chat(build_chunk_prompt(chunk))
+    await llm_cache.set_async(cache_key, summary)
+    return summary
+
+async def _map(text: str, on_progress=None) -> List[str]:
+    """Résume les morceaux en parallèle ; les résumés intermédiaires trop longs sont résumés à leur tour."""
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+    chunks = split_chunks(text)
+    level = 0
+    while True:
+        done = 0
+
+        async def summarize(chunk):
+            nonlocal done
+            summary = await _summarize_chunk(chunk, semaphore)
+            done += 1
+            if on_progress:
+                on_progress({"type": "progress", "stage": "map", "level": level, "done": done, "total": len(chunks)})
+            return summary
+
+        print(f"[INFO] Résumé map-reduce : niveau {level}, {len(chunks)} morceaux")
+        partials = await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+        combined = "\n\n".join(partials)
+        if len(partials) == 1 or estimate_tokens(combined) <= CHUNK_TOKENS:
+            return partials
+        if level >= MAX_MAP_LEVELS:
+            # Le prompt de réduction dépasserait num_ctx : Ollama le tronquerait sans le signaler
+            raise ValueError(
+                f"Résumés intermédiaires encore trop longs après {MAX_MAP_LEVELS + 1} niveaux "
+                f"({estimate_tokens(combined)} jetons estimés pour {CHUNK_TOKENS} au plus)"
+            )
+        chunks = split_chunks(combined)
+        level += 1
+
+def resolve_mode(text: str, mode: str = "auto") -> str:
+    if mode == "auto":
+        return "map_reduce" if estimate_tokens(text) > CHUNK_TOKENS else "single"
+    return mode
+
+def _target_words(text: str) -> int:
+    return max(30, len(text.split()) // 10)
+
+async def resumer(text: str = "", mode: str = "auto") -> str:
+    """
+    Résume un texte. mode="single" : un seul appel ; mode="map_reduce" : résumé hiérarchique
+    des morceaux ; mode="auto" : map-reduce dès que le texte dépasse le budget d'un morceau.
+    """
+    if not text.strip():
+        return "Aucun texte fourni pour le résumé."
+
+    mode = resolve_mode(text, mode)
+    cache_key = summary_cache_key(text, mode)
+    cached = await llm_cache.get_async(cache_key)
+    if cached is not None:
+        print("[INFO] Résumé récupéré du cache.")
+        return cached
 
     try:
-        print("[INFO] Envoi de la requête à Ollama (modèle : gemma3:4b)...")
-        response = session.post(
-            f"{OLLAMA_BASE_URL}/api/chat",
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            # timeout=300
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"Erreur Ollama (status {response.status_code}) : {response.text}")
-
-        result = response.json()
-        if 'message' in result and 'content' in result['message']:
-            print("[INFO] Résumé généré avec succès.")
-            return result['message']['content']
+        print(f"[INFO] Envoi de la requête à Ollama (modèle : {SUMMARY_MODEL}, mode : {mode})...")
+        if mode == "map_reduce":
+            partials = await _map(text)
+            summary = await _chat(build_reduce_prompt(partials, _target_words(text)))
         else:
-            raise Exception("Format de réponse inattendu d'Ollama.")
+            summary = await _chat(build_prompt(text))
+        print("[INFO] Résumé généré avec succès.")
+        await llm_cache.set_async(cache_key, summary)
+        return summary
+    except Exception as e:
+        print(f"[ERROR] Erreur lors de la génération du résumé : {e}")
+        return f"Erreur lors de la génération du résumé : {e}"
+
+async def resumer_stream(text: str, mode: str = "auto") -> AsyncIterator[Dict]:
+    """
+    Résumé streamé : événements "progress" (mode map-reduce), "token", puis "done"
+    avec le résumé complet et les durées.
+    """
+    if not text.strip():
+        yield {"type": "error", "message": "Aucun texte fourni pour le résumé."}
+        return
+
+    mode = resolve_mode(text, mode)
+    cache_key = summary_cache_key(text, mode)
+    cached = await llm_cache.get_async(cache_key)
+    if cached is not None:
+        yield {"type": "done", "summary": cached, "model_used": SUMMARY_MODEL, "mode": mode, "cached": True, "timings": {}}
+        return
+
+    started = time.perf_counter()
+    first_token_at = None
+    parts = []
+    try:
+        if mode == "map_reduce":
+            progress = asyncio.Queue()
+            map_task = asyncio.create_task(_map(text, on_progress=progress.put_nowait))
+            try:
+                while not map_task.done() or not progress.empty():
+                    getter = asyncio.ensure_future(progress.get())
+                    await asyncio.wait({getter, map_task}, return_when=asyncio.FIRST_COMPLETED)
+                    if getter.done():
+                        yield getter.result()
+                    else:
+                        getter.cancel()
+                partials = map_task.result()
+            finally:
+                map_task.cancel()
+            prompt = build_reduce_prompt(partials, _target_words(text))
+        else:
+            prompt = build_prompt(text)
+
+        async for chunk in ollama_client.chat_stream(
+            SUMMARY_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            options=SUMMARY_OPTIONS
+        ):
+            token = chunk.get("message", {}).get("content", "")
+            if token:
+                first_token_at = first_token_at or time.perf_counter()
+                parts.append(token)
+                yield {"type": "token", "token": token}
+            if chunk.get("done"):
+                summary = "".join(parts)
+                await llm_cache.set_async(cache_key, summary)
+                yield {
+                    "type": "done",
+                    "summary": summary,
+                    "model_used": SUMMARY_MODEL,
+                    "mode": mode,
+                    "cached": False,
+                    "timings": stream_timings(chunk, started, first_token_at)
+                }
+                return
     except Exception as e:
         print(f"[ERROR] Erreur lors de la génération du résumé : {e}")
-        return f"Erreur lors de la génération du résumé : {e}"
\ No newline at end of file
+        yield {"type": "error", "message": f"Erreur lors de la génération du résumé : {e}"}
+        return
+    yield {"type": "error", "message": "Flux Ollama interrompu avant la fin du résumé"}
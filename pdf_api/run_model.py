@@ -1,30 +1,19 @@
-import os
-import requests
-from dotenv import load_dotenv
+from typing import Optional
 
-load_dotenv()
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "localhost")
-OLLAMA_PORT = os.getenv("OLLAMA_PORT", "11434")
-OLLAMA_BASE_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
+from ollama_client import ollama_client, OllamaError
 
-def run_model(model_name: str) -> bool:
+async def run_model(model_name: str, keep_alive: Optional[int] = None) -> bool:
     try:
         print(f"⏳ Préchargement du modèle {model_name}...")
-        response = requests.post(
-            f"{OLLAMA_BASE_URL}/api/generate",
-            json={
-                "model": model_name,
-                "prompt": "Hello! This is a warmup request.",
-                "stream": False,
-                "options": {"num_predict": 1}  # Limiter la génération pour accélérer
-            }
+        extra = {"keep_alive": keep_alive} if keep_alive is not None else {}
+        await ollama_client.generate(
+            model_name,
+            "Hello! This is a warmup request.",
+            options={"num_predict": 1},  # Limiter la génération pour accélérer
+            **extra
         )
-        response.raise_for_status()
-        result = response.json()
         print(f"✅ Modèle {model_name} préchargé avec succès")
         return True
-    except requests.exceptions.RequestException as e:
+    except OllamaError as e:
         print(f"❌ Erreur lors du préchargement du modèle {model_name}: {e}")
         return False
-
-
@@ -0,0 +1,45 @@
+"""
+Regroupement des calculs identiques concurrents (« single-flight »).
+
+Le premier appelant d'une clé lance le calcul ; ceux qui arrivent pendant qu'il est en
+cours attendent le même résultat (ou la même exception) au lieu de le recalculer.
+Un appelant annulé (client déconnecté) n'annule pas le calcul des autres.
+La portée est le processus : entre workers, ce sont les caches qui prennent le relais.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._counters = {"calls": 0, "shared": 0}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        self._counters["calls"] += 1
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self._counters["shared"] += 1
+        return await asyncio.shield(task)
+
+    async def wait(self, key: Hashable):
+        """Attend le calcul en cours pour cette clé (KeyError s'il n'y en a pas)."""
+        return await asyncio.shield(self._calls[key])
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Marque l'exception comme consommée si tous les appelants sont partis
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._calls), **self._counters}
@@ -0,0 +1,55 @@
+#!/bin/bash
+# Démarrage du conteneur : serveur d'inférence YOLO unique (INFERENCE_MODE=server),
+# puis uvicorn avec ${WORKERS} workers clients de ce serveur.
+#
+# uvicorn n'est lancé qu'une fois la socket du serveur joignable (modèle chargé). Si l'un
+# des deux processus s'arrête (plantage, OOM), l'autre est arrêté et le script sort en
+# erreur : la politique de redémarrage du conteneur relance l'ensemble.
+set -e
+
+if [ "${INFERENCE_MODE:-local}" != "server" ]; then
+    exec uvicorn main:app --host 0.0.0.0 --port 8000 --workers "${WORKERS:-1}"
+fi
+
+SOCKET="${INFERENCE_SOCKET:-${DATA_DIR:-/app/data}/inference.sock}"
+START_TIMEOUT="${INFERENCE_START_TIMEOUT:-300}"
+
+python inference_server.py &
+server=$!
+uvicorn=""
+
+stop() {
+    kill -TERM "$server" $uvicorn 2>/dev/null || true
+    wait || true
+}
+trap 'stop; exit 143' TERM INT
+
+# Connexion réelle : une socket restée d'un arrêt précédent sous DATA_DIR ne suffit pas
+elapsed=0
+until python -c 'import socket, sys; socket.socket(socket.AF_UNIX).connect(sys.argv[1])' "$SOCKET" 2>/dev/null; do
+    if ! kill -0 "$server" 2>/dev/null; then
+        echo "[ERROR] Le serveur d'inférence s'est arrêté pendant son démarrage" >&2
+        exit 1
+    fi
+    if [ "$elapsed" -ge "$START_TIMEOUT" ]; then
+        echo "[ERROR] Serveur d'inférence injoignable après ${START_TIMEOUT} s ($SOCKET)" >&2
+        stop
+        exit 1
+    fi
+    sleep 1
+    elapsed=$((elapsed + 1))
+done
+
+uvicorn main:app --host 0.0.0.0 --port 8000 --workers "${WORKERS:-1}" &
+uvicorn=$!
+
+# Premier des deux processus arrêté : le conteneur s'arrête
+status=0
+wait -n || status=$?
+if kill -0 "$server" 2>/dev/null; then
+    echo "[ERROR] uvicorn arrêté (code $status), arrêt du serveur d'inférence" >&2
+else
+    echo "[ERROR] Serveur d'inférence arrêté (code $status), arrêt d'uvicorn" >&2
+fi
+stop
+exit $((status == 0 ? 1 : status))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules à plat dans pdf_api/ ; aucun index ni cache par défaut sous /app/data pendant les tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TEXT_INDEX_DB", "")
+os.environ.setdefault("DOCUMENT_STORE_DB", "")
@@ -0,0 +1,37 @@
+import pytest
+
+from document_store import DocumentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DocumentStore(str(tmp_path / "documents.sqlite"), max_bytes=700)
+
+
+def put_document(store, doc_hash, fingerprints):
+    for fingerprint in fingerprints:
+        store.put_page(fingerprint, "v", {"text": "x" * 200, "images": []})
+    store.put_document(doc_hash, "v", [{"fingerprint": fingerprint, "xrefs": []} for fingerprint in fingerprints])
+
+
+def test_prune_evicts_oldest_pages_and_their_documents(store):
+    put_document(store, "old", ["a", "b"])
+    put_document(store, "shared", ["b", "c"])
+    put_document(store, "new", ["d", "e"])
+
+    # Pages a et b les moins récemment utilisées
+    store.get_pages(["c", "d", "e"], "v")
+    assert store.prune() == 2
+
+    stats = store.stats()
+    assert stats["bytes"] <= store.max_bytes
+    assert stats["documents"] == 1
+    assert stats["documents_pruned"] == 2
+    assert store.get_document("old", "v") is None
+    assert store.get_document("new", "v") is not None
+
+
+def test_prune_under_budget_keeps_everything(store):
+    put_document(store, "doc", ["a"])
+    assert store.prune() == 0
+    assert store.stats()["documents"] == 1
@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+from jobs import JobQueue, SQLiteJobStore
+
+
+def test_stale_heartbeat_fails_active_jobs_of_a_previous_boot(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite"))
+    now = time.time()
+    job = {"kind": "resumer", "priority": 5, "progress": 0.0, "params": {}, "cancel_requested": False, "created_at": now - 600}
+    # Même hôte et même PID qu'un worker vivant : seul l'horodatage compte
+    store.create({**job, "id": "old", "status": "running", "owner": "host:7:a", "heartbeat_at": now - 600})
+    store.create({**job, "id": "alive", "status": "running", "owner": "host:7:b", "heartbeat_at": now - 600})
+    store.heartbeat("host:7:b", now)
+
+    assert store.fail_orphans(now - 60) == 1
+    assert store.get("old")["status"] == "failed"
+    assert store.get("alive")["status"] == "running"
+
+
+def test_progress_is_written_before_the_final_state(tmp_path):
+    async def handler(ctx, steps):
+        for step in range(steps):
+            ctx.progress(step * 10, f"étape {step}")
+            await asyncio.sleep(0)
+        return {"steps": steps}
+
+    async def scenario():
+        queue = JobQueue(store=SQLiteJobStore(str(tmp_path / "jobs.sqlite")), workers=1)
+        queue.register("count", handler)
+        await queue.start()
+        try:
+            job = await queue.submit("count", {"steps": 5})
+            for _ in range(200):
+                state = await queue.get(job["id"])
+                if state["status"] == "completed":
+                    return state
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+
+    state = asyncio.run(scenario())
+    assert state["status"] == "completed"
+    assert (state["progress"], state["message"], state["result"]) == (100.0, "Terminé", {"steps": 5})
+    assert state["heartbeat_at"] is not None
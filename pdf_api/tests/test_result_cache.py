@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, _DiskTier
+
+
+@pytest.fixture
+def disk(tmp_path):
+    return _DiskTier(str(tmp_path / "cache.sqlite"), max_bytes=1000)
+
+
+def test_prune_evicts_least_recently_used_in_batches(disk, monkeypatch):
+    monkeypatch.setattr(result_cache, "_PRUNE_BATCH", 2)
+    for i in range(10):
+        disk.set(f"k{i}", "x" * 200, expires_at=2e9)
+    assert disk.get("k0") is not None
+
+    assert disk.prune() == 5
+    assert disk.stats()["bytes"] <= disk.max_bytes
+    assert disk.get("k0") is not None
+    assert disk.get("k1") is None
+
+
+def test_async_access_reads_through_the_disk_tier(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+
+    async def scenario():
+        await ResultCache(db_path=path).set_async("key", {"value": 1})
+        # Nouvelle instance : mémoire vide, valeur relue sur disque
+        cache = ResultCache(db_path=path)
+        return await cache.get_async("key"), await cache.get_async("absent"), cache.stats()
+
+    value, absent, stats = asyncio.run(scenario())
+    assert value == {"value": 1}
+    assert absent is None
+    assert (stats["disk_hits"], stats["misses"]) == (1, 1)
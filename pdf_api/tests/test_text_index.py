@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from matcher import MentionMatcher
+from text_index import TextIndex
+
+SYNONYMS = {
+    "handbag": ["sac à main"],
+    "bag": ["sac"],
+    "car": ["voiture", "voiture de sport", "auto"],
+    "person": ["personne", "homme"],
+    "wallet": ["porte-monnaie"],
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return TextIndex(str(tmp_path / "text_index.sqlite"))
+
+
+def matcher_counts(pages):
+    matcher = MentionMatcher(SYNONYMS)
+    totals = {obj: 0 for obj in SYNONYMS}
+    for text in pages:
+        for obj, count in matcher.count(text).items():
+            totals[obj] += count
+    return totals
+
+
+def index_pages(index, doc_id, pages):
+    for page, text in enumerate(pages, 1):
+        index.add_page(doc_id, page, text)
+    index.finish_document(doc_id, len(pages))
+
+
+def test_punctuation_breaks_multi_word_synonyms(index):
+    text = "Il pose son sac. À main droite, une voiture ; de sport, non. Des sacs à main."
+    index_pages(index, "doc", [text])
+    assert index.count(SYNONYMS, ["doc"]) == matcher_counts([text])
+    assert index.count(SYNONYMS, ["doc"])["handbag"] == 1
+
+
+def test_hyphenated_synonym(index):
+    text = "Un porte-monnaie, deux porte-monnaies et une porte monnaie."
+    index_pages(index, "doc", [text])
+    assert index.count(SYNONYMS, ["doc"]) == matcher_counts([text])
+
+
+def test_matches_mention_matcher_on_punctuated_text(index):
+    words = ("sac", "sacs", "à", "main", "voiture", "voitures", "de", "sport", "auto", "autos",
+             "homme", "l'homme", "personnes", "porte-monnaie", "achat", "Éléphant", "VOITURE")
+    separators = (" ", " ", " ", ", ", ". ", " ; ", " - ", "\n", " (", ") ", "’")
+    rng = random.Random(7)
+    for doc in range(5):
+        pages = [
+            "".join(rng.choice(words) + rng.choice(separators) for _ in range(300))
+            for _ in range(3)
+        ]
+        index_pages(index, f"doc{doc}", pages)
+        assert index.count(SYNONYMS, [f"doc{doc}"]) == matcher_counts(pages)
+
+
+def test_counts_per_document_and_page(index):
+    index_pages(index, "a", ["Une voiture.", "Rien ici.", "Un sac à main et une auto."])
+    index_pages(index, "b", ["Deux voitures."])
+    result = index.count_mentions(SYNONYMS)
+    assert result["total"]["car"] == 3
+    assert set(result["documents"]["a"]["pages"]) == {1, 3}
+    assert result["documents"]["a"]["pages"][3]["handbag"] == 1
+    assert result["documents"]["b"]["total"]["car"] == 1
@@ -0,0 +1,267 @@
+"""
+Index inversé du texte extrait des documents, pour compter les mentions d'objets sans relire le texte.
+
+Le texte de chaque page est normalisé comme par matcher.fold (minuscules, accents retirés) puis
+découpé en mots ; pour chaque mot l'index conserve, par document et par page, les positions
+(rang du mot dans la page). La position avance d'un cran supplémentaire quand deux mots
+sont séparés par autre chose que des espaces (ponctuation) : seuls des mots séparés par
+des espaces sont consécutifs, comme dans l'expression régulière du matcher, qui relie les
+mots d'un synonyme par \s+. Un synonyme de plusieurs mots est retrouvé par ces positions
+relatives ("porte-monnaie" : deux mots séparés par une ponctuation).
+
+Le décompte suit les règles de matcher.MentionMatcher : mots entiers, formes du pluriel,
+et pour des formes qui se chevauchent, la plus longue à la première position.
+Différence connue : une expression n'est pas recherchée à cheval sur deux pages.
+
+L'index est alimenté par pdf_pipeline pendant l'extraction (identifiant du document : SHA-256
+du PDF) et stocké dans SQLite (WAL) sous DATA_DIR, partagé par les workers uvicorn et les
+processus du pool CPU.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from matcher import fold, variants
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+# Chemin vide : pas d'index
+TEXT_INDEX_DB = os.getenv("TEXT_INDEX_DB", os.path.join(DATA_DIR, "text_index.sqlite"))
+TEXT_INDEX_MAX_DOCUMENTS = int(os.getenv("TEXT_INDEX_MAX_DOCUMENTS", "10000"))
+# Limite de paramètres d'une requête SQLite
+_BATCH = 500
+# À incrémenter si le calcul des positions change : l'index existant est alors reconstruit
+INDEX_VERSION = 2
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> Iterator[Tuple[str, int]]:
+    """Mots normalisés et leur position ; une ponctuation entre deux mots compte pour une position."""
+    folded = fold(text)
+    position = -1
+    end = 0
+    for match in _WORD.finditer(folded):
+        gap = folded[end:match.start()]
+        position += 1 if not gap or gap.isspace() else 2
+        end = match.end()
+        yield match.group(), position
+
+
+def _forms(obj_to_synonyms: Dict[str, Iterable[str]]) -> Dict[Tuple[Tuple[str, int], ...], List[str]]:
+    """Formes recherchées (mots et positions relatives au premier) -> objets auxquels elles appartiennent."""
+    owners: Dict[Tuple[Tuple[str, int], ...], List[str]] = {}
+    for obj, synonyms in obj_to_synonyms.items():
+        for synonym in synonyms:
+            for form in variants(synonym):
+                tokens = list(tokenize(form))
+                words = tuple((word, position - tokens[0][1]) for word, position in tokens)
+                if words:
+                    objects = owners.setdefault(words, [])
+                    if obj not in objects:
+                        objects.append(obj)
+    return owners
+
+
+def _count_page(positions: Dict[str, array], owners: Dict[Tuple[Tuple[str, int], ...], List[str]], counts: Dict[str, int]):
+    # Occurrences candidates (position, longueur, forme), puis sélection comme le ferait l'expression
+    # régulière du matcher : de gauche à droite, la plus longue, sans chevauchement
+    candidates = []
+    sets = {}
+    for words in owners:
+        first = positions.get(words[0][0])
+        if first is None or any(word not in positions for word, _ in words[1:]):
+            continue
+        for word, _ in words[1:]:
+            if word not in sets:
+                sets[word] = set(positions[word])
+        length = words[-1][1] + 1
+        for start in first:
+            if all(start + offset in sets[word] for word, offset in words[1:]):
+                candidates.append((start, -length, words))
+    candidates.sort()
+    end = -1
+    for start, negative_length, words in candidates:
+        if start < end:
+            continue
+        end = start - negative_length
+        for obj in owners[words]:
+            counts[obj] += 1
+
+
+class TextIndex:
+    def __init__(self, path: str = TEXT_INDEX_DB, max_documents: int = TEXT_INDEX_MAX_DOCUMENTS):
+        self.path = path
+        self.max_documents = max_documents
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._create_tables(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection):
+        if conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            # Positions calculées autrement par une version précédente : index reconstruit au fil des PDF
+            conn.execute("DROP TABLE IF EXISTS postings")
+            conn.execute("DROP TABLE IF EXISTS documents")
+            conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id TEXT PRIMARY KEY, pages INTEGER NOT NULL,"
+            " complete INTEGER NOT NULL DEFAULT 0, indexed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " token TEXT NOT NULL, doc_id TEXT NOT NULL, page INTEGER NOT NULL, positions BLOB NOT NULL,"
+            " PRIMARY KEY (token, doc_id, page)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS postings_document ON postings (doc_id, page)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def has_document(self, doc_id: str) -> bool:
+        row = self._connect().execute("SELECT complete FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return bool(row and row[0])
+
+    def add_page(self, doc_id: str, page: int, text: str):
+        """Indexe (ou réindexe) une page ; page numérotée à partir de 1."""
+        positions: Dict[str, array] = defaultdict(lambda: array("I"))
+        for token, position in tokenize(text):
+            positions[token].append(position)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM postings WHERE doc_id = ? AND page = ?", (doc_id, page))
+            conn.executemany(
+                "INSERT INTO postings (token, doc_id, page, positions) VALUES (?, ?, ?, ?)",
+                [(token, doc_id, page, values.tobytes()) for token, values in positions.items()],
+            )
+            conn.execute(
+                "INSERT INTO documents (doc_id, pages, complete, indexed_at) VALUES (?, ?, 0, ?)"
+                " ON CONFLICT (doc_id) DO UPDATE SET pages = MAX(pages, excluded.pages), indexed_at = excluded.indexed_at",
+                (doc_id, page, time.time()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def finish_document(self, doc_id: str, pages: int):
+        """Marque le document comme entièrement indexé et supprime les plus anciens au-delà de la limite."""
+        conn = self._connect()
+        conn.execute("UPDATE documents SET complete = 1, pages = ? WHERE doc_id = ?", (pages, doc_id))
+        excess = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] - self.max_documents
+        if excess > 0:
+            for (old,) in conn.execute("SELECT doc_id FROM documents ORDER BY indexed_at LIMIT ?", (excess,)).fetchall():
+                self.remove_document(old)
+
+    def remove_document(self, doc_id: str):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def documents(self, doc_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        conn = self._connect()
+        if doc_ids is None:
+            rows = conn.execute("SELECT doc_id, pages, complete, indexed_at FROM documents").fetchall()
+        else:
+            rows = []
+            for start in range(0, len(doc_ids), _BATCH):
+                batch = doc_ids[start:start + _BATCH]
+                rows += conn.execute(
+                    f"SELECT doc_id, pages, complete, indexed_at FROM documents WHERE doc_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+        return {row[0]: {"pages": row[1], "complete": bool(row[2]), "indexed_at": row[3]} for row in rows}
+
+    def _postings(self, tokens: List[str], doc_ids: Optional[List[str]]):
+        conn = self._connect()
+        for start in range(0, len(tokens), _BATCH):
+            batch = tokens[start:start + _BATCH]
+            query = f"SELECT token, doc_id, page, positions FROM postings WHERE token IN ({','.join('?' * len(batch))})"
+            if doc_ids is None:
+                yield from conn.execute(query, batch)
+                continue
+            for doc_start in range(0, len(doc_ids), _BATCH):
+                docs = doc_ids[doc_start:doc_start + _BATCH]
+                yield from conn.execute(f"{query} AND doc_id IN ({','.join('?' * len(docs))})", (*batch, *docs))
+
+    def count_mentions(self, obj_to_synonyms: Dict[str, Iterable[str]], doc_ids: Optional[List[str]] = None) -> Dict:
+        """
+        Mentions de chaque objet (par ses synonymes) dans les documents donnés (tous si None).
+
+        Returns:
+            {"total": {objet: n}, "documents": {doc_id: {"total": {...}, "pages": {page: {...}}}}}
+            (seules les pages contenant au moins une mention sont listées)
+        """
+        owners = _forms(obj_to_synonyms)
+        objects = list(obj_to_synonyms)
+        pages: Dict[Tuple[str, int], Dict[str, array]] = defaultdict(dict)
+        tokens = sorted({word for words in owners for word, _ in words})
+        for token, doc_id, page, raw in self._postings(tokens, doc_ids):
+            values = array("I")
+            values.frombytes(raw)
+            pages[(doc_id, page)][token] = values
+
+        total = {obj: 0 for obj in objects}
+        documents: Dict[str, Dict] = {}
+        for (doc_id, page), positions in sorted(pages.items()):
+            counts = {obj: 0 for obj in objects}
+            _count_page(positions, owners, counts)
+            if not any(counts.values()):
+                continue
+            document = documents.setdefault(doc_id, {"total": {obj: 0 for obj in objects}, "pages": {}})
+            document["pages"][page] = counts
+            for obj, count in counts.items():
+                document["total"][obj] += count
+                total[obj] += count
+        return {"total": total, "documents": documents}
+
+    def count(self, obj_to_synonyms: Dict[str, Iterable[str]], doc_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Même résultat que matcher.get_matcher(...).count(texte) sur le texte des documents."""
+        return self.count_mentions(obj_to_synonyms, doc_ids)["total"]
+
+    def stats(self) -> Dict:
+        conn = self._connect()
+        documents, complete = conn.execute("SELECT COUNT(*), COALESCE(SUM(complete), 0) FROM documents").fetchone()
+        postings = conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+        return {"path": self.path, "documents": documents, "complete": complete, "postings": postings, "max_documents": self.max_documents}
+
+
+def get_text_index(path: str = TEXT_INDEX_DB) -> Optional[TextIndex]:
+    if not path:
+        return None
+    try:
+        return TextIndex(path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Index de texte indisponible ({path}) : {e}")
+        return None
+
+
+text_index = get_text_index()
@@ -1,6 +1,16 @@
+import asyncio
 import logging
-from deep_translator import GoogleTranslator
+import os
 import re
+import threading
+from typing import List, Optional
+
+from deep_translator import GoogleTranslator
+
+from executors import io_pool
+from metrics import stage
+from ollama_client import ollama_client
+from result_cache import llm_cache, make_key, text_hash
 
 def capitalize_after_period(text):
     # Lowercase entire text first
@@ -16,9 +26,144 @@ def capitalize_after_period(text):
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def translate_to_french(text: str) -> str:
+# Limite de caractères par segment (Google Translator accepte 5000)
+MAX_SEGMENT_LENGTH = int(os.getenv("TRANSLATION_MAX_SEGMENT_LENGTH", "4500"))
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_OLLAMA_MODEL = os.getenv("TRANSLATION_OLLAMA_MODEL", "gemma3:4b")
+TRANSLATION_LOCAL_LATENCY_MS = float(os.getenv("TRANSLATION_LOCAL_LATENCY_MS", "0"))
+
+# Une phrase : jusqu'à une ponctuation finale suivie d'un espace, un saut de ligne ou la fin du texte
+_SENTENCE_RE = re.compile(r".+?(?:[.!?…]+(?=\s)|\n|$)\s*", re.S)
+
+
+class TranslationBackend:
+    """Traduction d'un segment de texte anglais vers le français ; None si aucune traduction n'est obtenue."""
+    name = "base"
+
+    async def translate(self, text: str) -> Optional[str]:
+        raise NotImplementedError
+
+
+class GoogleBackend(TranslationBackend):
+    name = "google"
+
+    def __init__(self):
+        # GoogleTranslator garde une session HTTP : une instance par thread du pool
+        self._local = threading.local()
+
+    def _translate_sync(self, text: str) -> str:
+        translator = getattr(self._local, "translator", None)
+        if translator is None:
+            translator = self._local.translator = GoogleTranslator(source='en', target='fr')  # Forcer la langue source à l'anglais
+        return translator.translate(text)
+
+    async def translate(self, text: str) -> str:
+        return await io_pool.run(self._translate_sync, text)
+
+
+class OllamaBackend(TranslationBackend):
+    name = "ollama"
+
+    def __init__(self, model: str = TRANSLATION_OLLAMA_MODEL):
+        self.model = model
+        self.name = f"ollama:{model}"
+
+    async def translate(self, text: str) -> Optional[str]:
+        result = await ollama_client.chat(
+            self.model,
+            messages=[
+                {"role": "system", "content": "Traduis le texte de l'utilisateur de l'anglais vers le français. Réponds uniquement par la traduction, sans commentaire."},
+                {"role": "user", "content": text},
+            ],
+            options={"temperature": 0}
+        )
+        # Réponse vide : pas de traduction (le segment d'origine est conservé et rien n'est mis en cache)
+        return result.get("message", {}).get("content", "").strip() or None
+
+
+class LocalBackend(TranslationBackend):
+    """Substitut hors ligne pour les tests de charge : renvoie le texte après une latence simulée."""
+    name = "local"
+
+    def __init__(self, latency_ms: float = TRANSLATION_LOCAL_LATENCY_MS):
+        self.latency = latency_ms / 1000
+
+    async def translate(self, text: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return text
+
+
+def get_backend(name: str = TRANSLATION_BACKEND) -> TranslationBackend:
+    if name == "ollama":
+        return OllamaBackend()
+    if name == "local":
+        return LocalBackend()
+    return GoogleBackend()
+
+
+backend = get_backend()
+
+
+def _hard_split(unit: str, max_length: int) -> List[str]:
+    """Découpe une phrase trop longue sur les espaces, ou à la limite exacte à défaut."""
+    pieces = []
+    while len(unit) > max_length:
+        cut = unit.rfind(" ", 0, max_length)
+        if cut <= 0:
+            cut = max_length
+        pieces.append(unit[:cut])
+        unit = unit[cut:]
+    if unit:
+        pieces.append(unit)
+    return pieces
+
+
+def split_segments(text: str, max_length: int = MAX_SEGMENT_LENGTH) -> List[str]:
+    """Regroupe des phrases entières en segments d'au plus max_length caractères (aucun segment vide)."""
+    segments = []
+    current = ""
+    for match in _SENTENCE_RE.finditer(text):
+        for unit in _hard_split(match.group(), max_length):
+            if current and len(current) + len(unit) > max_length:
+                segments.append(current)
+                current = ""
+            current += unit
+    if current:
+        segments.append(current)
+    return segments
+
+
+async def _translate_segment(segment: str, index: int, total: int, semaphore: asyncio.Semaphore) -> str:
+    # Les espaces de bord sont conservés tels quels : le traducteur les supprime
+    core = segment.strip()
+    if not core:
+        return segment
+    leading = segment[:len(segment) - len(segment.lstrip())]
+    trailing = segment[len(segment.rstrip()):]
+
+    # Mémoïsation par segment : le texte répété d'un document à l'autre n'est traduit qu'une fois
+    cache_key = make_key("translate_segment", text=text_hash(core), source="en", target="fr", backend=backend.name)
+    translated = await llm_cache.get_async(cache_key)
+    if translated is None:
+        async with semaphore:
+            logger.info(f"Traduction du segment {index + 1}/{total} (longueur : {len(segment)} caractères)")
+            with stage(f"translate_{backend.name.split(':')[0]}"):
+                translated = await backend.translate(core)
+        if not translated:
+            logger.warning(f"Le segment {index + 1} n'a pas été traduit (réponse vide)")
+            return segment  # Conserver le segment original si la traduction échoue
+        await llm_cache.set_async(cache_key, translated)
+    return leading + translated + trailing
+
+
+async def translate_to_french(text: str) -> str:
     """
-    Traduit un texte en français en utilisant Google Translator, en gérant les textes longs.
+    Traduit un texte en français avec le backend configuré, en gérant les textes longs.
+
+    Le texte est découpé en segments de phrases entières, traduits en parallèle (concurrence
+    bornée) puis recombinés dans l'ordre d'origine.
 
     Args:
         text (str): Le texte à traduire.
@@ -34,41 +179,29 @@ def translate_to_french(text: str) -> str:
         logger.error("Le texte est vide ou contient uniquement des espaces")
         raise ValueError("Le texte ne peut pas être vide")
 
+    cache_key = make_key("translate", text=text_hash(text), source="en", target="fr", backend=backend.name)
+    cached = await llm_cache.get_async(cache_key)
+    if cached is not None:
+        logger.info("Traduction récupérée du cache")
+        return cached
+
     try:
         logger.info(f"Longueur du texte d'entrée : {len(text)} caractères")
-        # Limite de caractères par segment (Google Translator)
-        max_length = 5000
-        # Diviser le texte en segments de moins de 5000 caractères
-        segments = []
-        current_segment = ""
-        for line in text.splitlines(keepends=True):
-            if len(current_segment) + len(line) <= max_length:
-                current_segment += line
-            else:
-                segments.append(current_segment)
-                current_segment = line
-        if current_segment:
-            segments.append(current_segment)
-
+        segments = split_segments(text)
         logger.info(f"Nombre de segments créés : {len(segments)}")
 
-        # Traduire chaque segment
-        translated_segments = []
-        for i, segment in enumerate(segments):
-            logger.info(f"Traduction du segment {i+1}/{len(segments)} (longueur : {len(segment)} caractères)")
-            translator = GoogleTranslator(source='en', target='fr')  # Forcer la langue source à l'anglais
-            translated_segment = translator.translate(segment)
-            if translated_segment is None:
-                logger.warning(f"Le segment {i+1} n'a pas été traduit (retourné None)")
-                translated_segment = segment  # Conserver le segment original si la traduction échoue
-            translated_segments.append(translated_segment)
-            logger.info(f"Segment {i+1} traduit avec succès")
+        semaphore = asyncio.Semaphore(TRANSLATION_CONCURRENCY)
+        # gather conserve l'ordre des segments quel que soit l'ordre de fin des traductions
+        translated_segments = await asyncio.gather(*(
+            _translate_segment(segment, i, len(segments), semaphore) for i, segment in enumerate(segments)
+        ))
 
         # Recombiner les segments traduits
         translated_text = "".join(translated_segments)
         logger.info(f"Longueur du texte traduit : {len(translated_text)} caractères")
         translated_text = capitalize_after_period(translated_text)
+        await llm_cache.set_async(cache_key, translated_text)
         return translated_text
     except Exception as e:
         logger.error(f"Erreur lors de la traduction : {str(e)}")
-        raise Exception(f"Erreur lors de la traduction : {str(e)}")
\ No newline at end of file
+        raise Exception(f"Erreur lors de la traduction : {str(e)}")